@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from http_client import HttpTransport
+from mock_api_server import MockAPIServer
+
+PAYLOAD = {"model": "deepseek-coder", "messages": [{"role": "user", "content": "x" * 2000}]}
+
+def bench_sequential(post, url, num_requests):
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        post(url, json=PAYLOAD).raise_for_status()
+    return (time.perf_counter() - start) / num_requests
+
+def bench_concurrent(post, url, num_requests, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for response in executor.map(lambda _: post(url, json=PAYLOAD), range(num_requests)):
+            response.raise_for_status()
+    return num_requests / (time.perf_counter() - start)
+
+async def bench_async(transport, url, num_requests):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(transport.apost(url, json=PAYLOAD) for _ in range(num_requests)))
+    for response in responses:
+        response.raise_for_status()
+    return num_requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call requests.post with the pooled transport")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated server latency in seconds')
+    args = parser.parse_args()
+
+    with MockAPIServer(latency=args.latency) as server:
+        transport = HttpTransport(pool_maxsize=args.pool_size)
+        rows = []
+
+        server.connections.clear()
+        latency = bench_sequential(requests.post, server.url, args.requests)
+        rows.append(("requests.post", "sequential", f"{latency * 1000:.2f} ms/req", len(server.connections)))
+
+        server.connections.clear()
+        latency = bench_sequential(transport.post, server.url, args.requests)
+        rows.append(("HttpTransport", "sequential", f"{latency * 1000:.2f} ms/req", len(server.connections)))
+
+        server.connections.clear()
+        throughput = bench_concurrent(requests.post, server.url, args.requests, args.concurrency)
+        rows.append(("requests.post", f"{args.concurrency} threads", f"{throughput:.0f} req/s", len(server.connections)))
+
+        server.connections.clear()
+        throughput = bench_concurrent(transport.post, server.url, args.requests, args.concurrency)
+        rows.append(("HttpTransport", f"{args.concurrency} threads", f"{throughput:.0f} req/s", len(server.connections)))
+
+        server.connections.clear()
+        throughput = asyncio.run(bench_async(transport, server.url, args.requests))
+        rows.append(("HttpTransport", "asyncio", f"{throughput:.0f} req/s", len(server.connections)))
+
+        transport.close()
+
+    print(f"{'client':<15} {'mode':<12} {'result':>14} {'connections':>12}")
+    for client, mode, result, connections in rows:
+        print(f"{client:<15} {mode:<12} {result:>14} {connections:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+def time_command(command, runs):
+    # Each run is a fresh interpreter, as for a real CLI invocation or worker process
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=SRC_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def slowest_imports(module, count):
+    # -X importtime reports "self | cumulative | name" in microseconds on stderr
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_DIR, capture_output=True, text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time of cli.py and of importing main")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list')
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, '-c', 'pass'], args.runs)
+    print(f"{'command':<24} {'median (ms)':>12} {'minus interpreter (ms)':>23}")
+    for label, command in (("python -c pass", [sys.executable, '-c', 'pass']),
+                           ("import main", [sys.executable, '-c', 'import main']),
+                           ("cli.py --help", [sys.executable, 'cli.py', '--help'])):
+        elapsed = baseline if label == "python -c pass" else time_command(command, args.runs)
+        print(f"{label:<24} {elapsed * 1000:>12.1f} {(elapsed - baseline) * 1000:>23.1f}")
+
+    print(f"\nSlowest imports of cli (cumulative ms):")
+    for cumulative, name in slowest_imports('cli', args.top):
+        print(f"{cumulative / 1000:>8.1f}  {name}")
+
+if __name__ == "__main__":
+    main()
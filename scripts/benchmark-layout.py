@@ -0,0 +1,45 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from layout import layout_design
+
+def load_performance_test():
+    # The test module has a hyphenated file name, so it is loaded by path
+    path = os.path.join(os.path.dirname(__file__), '..', 'tests', 'performance-test.py')
+    spec = importlib.util.spec_from_file_location("performance_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def as_analysis(network):
+    return {
+        "éléments_clés": [node["id"] for node in network["nodes"]],
+        "relations": [{"de": edge["source"], "à": edge["target"]} for edge in network["edges"]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the force-directed layout engine")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--edges-per-node', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    generate_complex_network = load_performance_test().generate_complex_network
+
+    print(f"{'nodes':>8} {'edges':>8} {'layout (s)':>11} {'nodes/s':>10}")
+    for size in args.sizes:
+        network = generate_complex_network(num_nodes=size, num_edges=size * args.edges_per_node)
+        analysis = as_analysis(network)
+        start = time.perf_counter()
+        positions = layout_design({}, analysis, iterations=args.iterations)
+        elapsed = time.perf_counter() - start
+        assert len(positions) == size
+        print(f"{size:>8} {len(network['edges']):>8} {elapsed:>11.2f} {size / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
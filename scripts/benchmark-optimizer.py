@@ -0,0 +1,88 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from xml.etree import ElementTree
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from optimizer import optimize_code
+from renderer import JS_RUNTIME, build_scene, iter_js, iter_svg
+
+def rendered(num_nodes, max_nodes, seed=0):
+    # Output of the local renderer, as step 7 receives it
+    rng = np.random.default_rng(seed)
+    positions = {f"n{i}": [float(x), float(y)] for i, (x, y) in enumerate(rng.uniform(0, 1000, (num_nodes, 2)))}
+    relations = [{"de": f"n{a}", "à": f"n{b}"} for a, b in rng.integers(0, num_nodes, (num_nodes * 2, 2)).tolist()]
+    scene = build_scene({"relations": relations, "hiérarchie": {"niveau1": ["n0", "n1", "n2"]}}, positions, max_nodes)
+    return "".join(iter_svg(scene)), "".join(iter_js(scene))
+
+def generated(num_nodes, seed=0):
+    """SVG and JavaScript written the way the generator agents write them: indented, commented,
+    full-precision coordinates, inline styles and one glyph group per node."""
+    rng = random.Random(seed)
+    nodes = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(num_nodes)]
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1000 1000" width="1000" height="1000">',
+             '  <!-- Edges -->', '  <g id="edges">']
+    for i in range(1, num_nodes):
+        (x1, y1), (x2, y2) = nodes[i], nodes[rng.randrange(i)]
+        lines.append(f'    <path d="M {x1:.6f} {y1:.6f} L {(x1 + x2) / 2:.6f} {(y1 + y2) / 2:.6f} L {x2:.6f} {y2:.6f}" '
+                     f'style="stroke: #999999; stroke-width: 1.000000; fill: none"/>')
+    lines += ['  </g>', '  <!-- Nodes -->', '  <g id="nodes">']
+    for i, (x, y) in enumerate(nodes):
+        lines += [f'    <g class="node" data-id="n{i}" transform="translate({x:.6f}, {y:.6f})">',
+                  f'      <circle cx="0" cy="0" r="8.000000" style="fill: #1f77b4; stroke: #ffffff; stroke-width: 1.5"/>',
+                  f'      <path d="M -4.000000 0.000000 L 4.000000 0.000000 M 0.000000 -4.000000 L 0.000000 4.000000" '
+                  f'style="stroke: #ffffff; stroke-width: 1.5"/>',
+                  f'    </g>']
+    lines += ['  </g>', '</svg>']
+    data = {"ids": [f"n{i}" for i in range(num_nodes)], "x": [x for x, _ in nodes], "y": [y for _, y in nodes]}
+    js = ("// Graph data\nvar GRAPH = " + json.dumps(data, indent=2) + ";\n\n"
+          + "\n".join("  " + line + "  // interaction" if line.strip() else line for line in JS_RUNTIME.splitlines()))
+    return "\n".join(lines), js
+
+def parse_time(svg, repeat=5):
+    # Time to build the DOM, the part of the first render that depends on the document's size and structure
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ElementTree.fromstring(svg)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def report(name, svg, js):
+    start = time.perf_counter()
+    result = optimize_code(svg, js)
+    elapsed = time.perf_counter() - start
+    optimized_svg, optimized_js = result["code_optimisé"]["svg"], result["code_optimisé"]["js"]
+    size = lambda text: len(text.encode('utf-8'))
+    compressed = lambda text: len(gzip.compress(text.encode('utf-8')))
+    elements = lambda svg_code: sum(1 for _ in ElementTree.fromstring(svg_code).iter())
+    print(f"{name:<18} {size(svg):>9} {size(optimized_svg):>9} {1 - size(optimized_svg) / size(svg):>6.0%} "
+          f"{compressed(svg):>8} {compressed(optimized_svg):>8} "
+          f"{size(js):>8} {size(optimized_js):>8} {1 - size(optimized_js) / size(js):>6.0%} "
+          f"{elements(svg):>7} {elements(optimized_svg):>7} "
+          f"{parse_time(svg) * 1000:>8.1f} {parse_time(optimized_svg) * 1000:>8.1f} {elapsed * 1000:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local SVG/JS optimizer (step 7): size reduction "
+                                                 "and DOM parse time before and after")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--max-nodes', type=int, default=2000, help='Level-of-detail limit of the renderer')
+    args = parser.parse_args()
+
+    print(f"{'input':<18} {'svg':>9} {'→':>9} {'saved':>6} {'svg.gz':>8} {'→':>8} {'js':>8} {'→':>8} {'saved':>6} "
+          f"{'elems':>7} {'→':>7} {'parse ms':>8} {'→':>8} {'opt ms':>8}")
+    for num_nodes in args.sizes:
+        report(f"rendered-{num_nodes}", *rendered(num_nodes, args.max_nodes))
+        report(f"generated-{num_nodes}", *generated(num_nodes))
+
+if __name__ == "__main__":
+    main()
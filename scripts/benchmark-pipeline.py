@@ -0,0 +1,52 @@
+import argparse
+import json
+import logging
+import sys
+
+from benchmark_harness import BASELINE_FILE, SCENARIOS, compare, load_baseline, run_scenario, save_baseline
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole pipeline offline against stand-in APIs and "
+                                                 "compare it with the recorded baseline")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario; the median wall time is kept')
+    parser.add_argument('--latency', type=float, default=None, help='Override the simulated API latency (seconds)')
+    parser.add_argument('--throughput', type=float, default=None,
+                        help='Override the simulated response throughput (bytes per second, 0 for unlimited)')
+    parser.add_argument('--no-stream', action='store_true', help='Ask for complete responses instead of streams')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Record these results as the new baseline instead of checking them')
+    args = parser.parse_args()
+
+    # The pipeline's own progress logs would drown the results
+    logging.disable(logging.WARNING)
+    baseline = load_baseline(args.baseline)
+    results = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        scenario = SCENARIOS[name]
+        if args.latency is not None:
+            scenario.latency = args.latency
+        if args.throughput is not None:
+            scenario.throughput = args.throughput
+        scenario.stream = scenario.stream and not args.no_stream
+        results[name] = run_scenario(scenario, args.repeat)
+        reference = baseline["scenarios"].get(name, {})
+        print(f"{name:<16} {results[name]['wall_s']:>8.3f}s (baseline {reference.get('wall_s', '-')}) "
+              f"{results[name]['api_requests']} API + {results[name]['github_requests']} GitHub requests, "
+              f"{results[name]['request_bytes']} bytes sent")
+        print("    " + json.dumps(results[name]["stages_ms"]))
+
+    if args.update_baseline:
+        baseline["scenarios"].update(results)
+        save_baseline(baseline, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
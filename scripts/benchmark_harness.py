@@ -0,0 +1,231 @@
+import base64
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional
+from unittest.mock import patch
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPTS_DIR, '..', 'src'))
+
+from mock_api_server import MockAPIServer
+
+BASELINE_FILE = os.path.join(SCRIPTS_DIR, 'benchmark-baseline.json')
+# Allowed relative increase of each metric before it counts as a regression
+DEFAULT_THRESHOLDS = {"wall_s": 0.25, "request_bytes": 0.05, "api_requests": 0.0, "github_requests": 0.0}
+
+
+def _load_dataset_module():
+    # The generator is a script with a hyphenated name, so it is loaded from its path
+    spec = importlib.util.spec_from_file_location("generate_large_dataset",
+                                                  os.path.join(SCRIPTS_DIR, 'generate-large-dataset.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+datasets = _load_dataset_module()
+
+
+class Scenario:
+    """One benchmarked pipeline run: a generated dataset and the behaviour of the stand-in APIs."""
+
+    def __init__(self, name: str, dataset: str, size: Dict[str, int], design_nodes: int = 50, images: int = 4,
+                 image_size: int = 64, code_bytes: int = 20000, latency: float = 0.05, throughput: float = 0.0,
+                 stream: bool = True, seed: int = 0):
+        self.name = name
+        self.dataset = dataset
+        self.size = size
+        self.design_nodes = design_nodes
+        self.images = images
+        self.image_size = image_size
+        self.code_bytes = code_bytes
+        self.latency = latency
+        self.throughput = throughput
+        self.stream = stream
+        self.seed = seed
+
+    def raw_data(self) -> str:
+        if self.dataset == "network":
+            data = datasets.generate_complex_network(self.size["nodes"], self.size["edges"], seed=self.seed)
+        else:
+            data = datasets.generate_large_dataset(self.size["users"], self.size["posts"], self.size["comments"],
+                                                   seed=self.seed)
+        return json.dumps(data)
+
+
+SCENARIOS = {scenario.name: scenario for scenario in [
+    Scenario("network-1k", "network", {"nodes": 1000, "edges": 5000}),
+    Scenario("network-10k", "network", {"nodes": 10000, "edges": 50000}, design_nodes=500),
+    Scenario("social-small", "social", {"users": 100, "posts": 500, "comments": 2000}),
+    Scenario("social-default", "social", {"users": 1000, "posts": 5000, "comments": 20000}, design_nodes=300),
+]}
+
+
+def _png_data_url(size: int, index: int) -> str:
+    from PIL import Image
+
+    # A different colour per image, so that every image has its own content digest
+    image = Image.new("RGB", (size, size), ((index * 53) % 256, (index * 97) % 256, (index * 193) % 256))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def agent_responses(scenario: Scenario) -> Dict[str, str]:
+    """Canned completion of every agent, sized by the scenario."""
+    rng = random.Random(scenario.seed)
+    nodes = [{"id": f"n{i}", "label": f"Nœud {i}"} for i in range(scenario.design_nodes)]
+    edges = [{"source": f"n{i}", "target": f"n{rng.randrange(i)}"} for i in range(1, scenario.design_nodes)]
+    circles = scenario.code_bytes // 40
+    svg = "<svg>" + "".join(f'<circle cx="{i}" cy="{i}" r="4"/>' for i in range(circles)) + "</svg>"
+    js = "".join(f"nodes[{i}].on('click', show);\n" for i in range(circles))
+    images = [{"id": f"image{i}", "content": _png_data_url(scenario.image_size, i)} for i in range(scenario.images)]
+    return {
+        "orchestrator": json.dumps({"plan": ["analyse", "design", "rendu"], "assignations": {},
+                                    "intégration": {}, "rapport_final": "ok"}),
+        "data_analyzer": json.dumps({"éléments_clés": [node["id"] for node in nodes],
+                                     "relations": [{"de": edge["source"], "à": edge["target"], "type": "lien"}
+                                                   for edge in edges],
+                                     "hiérarchie": {}, "attributs_visualisation": [], "structure_optimisée": {}},
+                                    ensure_ascii=False),
+        "graph_designer": json.dumps({"nœuds": nodes, "arêtes": edges, "style": {"thème": "clair"}},
+                                     ensure_ascii=False),
+        "svg_generator": svg,
+        "js_generator": js,
+        "image_generator": json.dumps({"images": images}),
+        "performance_optimizer": json.dumps({"code_optimisé": {"svg": svg, "js": js}}),
+        "quality_checker": json.dumps({"score": 8, "problèmes": [], "recommandations": []}, ensure_ascii=False),
+    }
+
+
+@contextlib.contextmanager
+def offline_pipeline(scenario: Scenario) -> Iterator[MockAPIServer]:
+    """Point the pipeline at a local stand-in for DeepSeek, Claude and GitHub for the duration of the block.
+
+    Agents whose template is not defined in main get a stand-in template, so
+    that every stage runs. Rate limits are lifted and caches are off, so
+    every run does the same work.
+    """
+    import main
+    import rate_limit
+    from context import AppContext
+    from http_client import set_transport
+    from image_store import GitHubImageStore, LocalImageStore
+
+    responses = agent_responses(scenario)
+    stand_ins = {name: main.Agent(name, f"[benchmark] {name}", use_claude=(name == "quality_checker"),
+                                  validate=None if name in main.CODE_AGENTS else main.output_validator(name))
+                 for name in responses if name not in main.agents}
+    templates = {agent.template: name for name, agent in list(main.agents.items()) + list(stand_ins.items())}
+
+    def respond(request: Dict[str, Any]) -> str:
+        # Agents send their template as the first message
+        messages = request.get("messages") or [{}]
+        return responses.get(templates.get(messages[0].get("content")), "{}")
+
+    with contextlib.ExitStack() as stack, tempfile.TemporaryDirectory() as mirror_dir:
+        server = stack.enter_context(MockAPIServer(latency=scenario.latency, throughput=scenario.throughput,
+                                                   respond=respond, stream_chunk_size=512))
+        stack.enter_context(patch.dict(main.agents, stand_ins))
+        stack.enter_context(patch.dict(rate_limit.PROVIDER_RPM, {"deepseek": 1e6, "claude": 1e6}))
+        for name, value in (("DEEPSEEK_API_URL", server.url), ("CLAUDE_API_URL", server.url),
+                            ("API_STREAM", scenario.stream), ("response_cache", None)):
+            stack.enter_context(patch.object(main, name, value))
+        rate_limit.set_gate_share(1.0)
+        main.set_context(AppContext("benchmark-token", "benchmark/repo", server.github_url))
+        main.set_image_store(GitHubImageStore(lambda: main.get_context().repo, "benchmark/repo", "main",
+                                              LocalImageStore(mirror_dir)))
+        try:
+            yield server
+        finally:
+            main.set_image_store(None)
+            main.set_context(None)
+            set_transport(None)
+            rate_limit.set_gate_share(1.0)
+
+
+def run_scenario(scenario: Scenario, repeat: int = 3, warmup: int = 1) -> Dict[str, Any]:
+    """Median wall time over `repeat` runs, with the request counts and stage timings of the last run.
+
+    The `warmup` runs before them are not measured: they pay for first
+    imports (NumPy, PIL, PyGithub) and connection setup.
+    """
+    import main
+    from tracing import Tracer, set_tracer
+
+    raw_data = scenario.raw_data()
+    timings = []
+    for run in range(warmup + repeat):
+        with offline_pipeline(scenario) as server:
+            tracer = Tracer()
+            set_tracer(tracer)
+            try:
+                start = time.perf_counter()
+                main.generate_interactive_graph(raw_data)
+                if run >= warmup:
+                    timings.append(time.perf_counter() - start)
+            finally:
+                set_tracer(None)
+            github_requests = sum(server.github.calls.values())
+            metrics = {
+                "api_requests": server.requests - github_requests,
+                "github_requests": github_requests,
+                "request_bytes": server.bytes_received,
+            }
+    api_spans = [span for span in tracer.spans if span.category == "api"]
+    return {
+        "wall_s": round(statistics.median(timings), 4),
+        **metrics,
+        "input_bytes": len(raw_data),
+        "input_tokens": sum(span.attrs.get("input_tokens", 0) for span in api_spans),
+        "output_tokens": sum(span.attrs.get("output_tokens", 0) for span in api_spans),
+        "stages_ms": {name[len("stage:"):]: round(stats["total_ms"], 1)
+                      for name, stats in tracer.summary().items() if name.startswith("stage:")},
+    }
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"thresholds": dict(DEFAULT_THRESHOLDS), "scenarios": {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_baseline(baseline: Dict[str, Any], path: str = BASELINE_FILE):
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, ensure_ascii=False, sort_keys=True)
+        file.write("\n")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    """Metrics that grew beyond their threshold relative to the baseline."""
+    thresholds = baseline.get("thresholds", DEFAULT_THRESHOLDS)
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        for metric, threshold in thresholds.items():
+            if metric not in metrics or metric not in reference:
+                continue
+            limit = reference[metric] * (1 + threshold)
+            if metrics[metric] > limit:
+                regressions.append(f"{name}: {metric} {metrics[metric]} > {limit:.4g} "
+                                   f"(baseline {reference[metric]}, threshold +{threshold:.0%})")
+    return regressions
+
+
+def run_offline(raw_data: str, scenario: Optional[Scenario] = None, **kwargs) -> Dict[str, Any]:
+    """generate_interactive_graph on the given data against the stand-in APIs."""
+    import main
+
+    with offline_pipeline(scenario or Scenario("custom", "custom", {}, latency=0.0)):
+        return main.generate_interactive_graph(raw_data, **kwargs)
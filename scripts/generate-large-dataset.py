@@ -1,71 +1,127 @@
+import argparse
 import json
+import os
 import random
 from datetime import datetime, timedelta
 
-def generate_large_dataset(num_users=1000, num_posts=5000, num_comments=20000):
-    users = []
-    posts = []
-    comments = []
-    relationships = []
+def iter_large_dataset(num_users=1000, num_posts=5000, num_comments=20000, seed=None):
+    """(section, record) pairs of a social dataset, section by section, without holding the records.
+
+    Users and posts are referred to by index, and friends are sampled from
+    the other users' indices, so memory stays constant whatever the size.
+    """
+    # With a seed, the dataset (dates included) is identical on every run
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1) if seed is not None else datetime.now()
 
     # Generate users
     for i in range(num_users):
-        users.append({
+        yield "users", {
             "id": f"user_{i}",
             "name": f"User {i}",
-            "joinDate": (datetime.now() - timedelta(days=random.randint(0, 1000))).isoformat()
-        })
+            "joinDate": (now - timedelta(days=rng.randint(0, 1000))).isoformat()
+        }
 
     # Generate posts
     for i in range(num_posts):
-        author = random.choice(users)
-        posts.append({
+        yield "posts", {
             "id": f"post_{i}",
-            "authorId": author["id"],
+            "authorId": f"user_{rng.randrange(num_users)}",
             "content": f"This is post number {i}",
-            "timestamp": (datetime.now() - timedelta(days=random.randint(0, 365))).isoformat(),
-            "likes": random.randint(0, 1000)
-        })
+            "timestamp": (now - timedelta(days=rng.randint(0, 365))).isoformat(),
+            "likes": rng.randint(0, 1000)
+        }
 
     # Generate comments
     for i in range(num_comments):
-        author = random.choice(users)
-        post = random.choice(posts)
-        comments.append({
+        author = rng.randrange(num_users)
+        post = rng.randrange(num_posts)
+        yield "comments", {
             "id": f"comment_{i}",
-            "authorId": author["id"],
-            "postId": post["id"],
+            "authorId": f"user_{author}",
+            "postId": f"post_{post}",
             "content": f"This is comment number {i}",
-            "timestamp": (datetime.now() - timedelta(days=random.randint(0, 365))).isoformat(),
-            "likes": random.randint(0, 100)
-        })
+            "timestamp": (now - timedelta(days=rng.randint(0, 365))).isoformat(),
+            "likes": rng.randint(0, 100)
+        }
 
     # Generate relationships (friendships)
-    for user in users:
-        num_friends = random.randint(1, 50)
-        friends = random.sample([u for u in users if u != user], num_friends)
-        for friend in friends:
-            relationships.append({
+    for i in range(num_users):
+        num_friends = min(rng.randint(1, 50), num_users - 1)
+        # Indices of the other users: skipping user i keeps the draw O(num_friends)
+        for friend in rng.sample(range(num_users - 1), num_friends):
+            yield "relationships", {
                 "type": "friend",
-                "from": user["id"],
-                "to": friend["id"]
-            })
-
-    # Combine all data
-    dataset = {
-        "users": users,
-        "posts": posts,
-        "comments": comments,
-        "relationships": relationships
-    }
+                "from": f"user_{i}",
+                "to": f"user_{friend + (friend >= i)}"
+            }
+
+def iter_complex_network(num_nodes, num_edges, seed=None):
+    rng = random.Random(seed)
+    for i in range(num_nodes):
+        yield "nodes", {"id": f"node{i}", "type": rng.choice(["user", "post", "comment"]),
+                        "value": rng.randint(1, 100)}
+
+    for _ in range(num_edges):
+        source = rng.randrange(num_nodes)
+        target = rng.randrange(num_nodes)
+        if source != target:
+            yield "edges", {
+                "source": f"node{source}",
+                "target": f"node{target}",
+                "weight": rng.uniform(0.1, 1.0),
+                "type": rng.choice(["friend", "like", "comment", "share"])
+            }
 
+def collect_sections(records):
+    dataset = {}
+    for section, record in records:
+        dataset.setdefault(section, []).append(record)
     return dataset
 
-# Generate the dataset
-large_dataset = generate_large_dataset()
+def generate_large_dataset(num_users=1000, num_posts=5000, num_comments=20000, seed=None):
+    dataset = collect_sections(iter_large_dataset(num_users, num_posts, num_comments, seed=seed))
+    return {section: dataset.get(section, []) for section in ("users", "posts", "comments", "relationships")}
+
+def generate_complex_network(num_nodes, num_edges, seed=None):
+    dataset = collect_sections(iter_complex_network(num_nodes, num_edges, seed=seed))
+    return {"nodes": dataset.get("nodes", []), "edges": dataset.get("edges", [])}
+
+def write_sections(records, file):
+    """Write (section, record) pairs, grouped by section, as one JSON object with a record per line."""
+    section = None
+    for name, record in records:
+        if name != section:
+            file.write("{\n" if section is None else "\n  ],\n")
+            file.write(f"  {json.dumps(name)}: [\n    ")
+            section = name
+        else:
+            file.write(",\n    ")
+        file.write(json.dumps(record))
+    file.write("{}\n" if section is None else "\n  ]\n}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a social dataset (users, posts, comments, friendships) "
+                                                 "or, with --network, a nodes/edges graph")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--network', nargs=2, type=int, metavar=('NODES', 'EDGES'),
+                        help='Generate a random network of NODES nodes and about EDGES edges instead')
+    parser.add_argument('--seed', type=int, default=None, help='Make the dataset reproducible')
+    parser.add_argument('--output', default='tests/data/large_real_dataset.json')
+    args = parser.parse_args()
+
+    if args.network:
+        records = iter_complex_network(*args.network, seed=args.seed)
+    else:
+        records = iter_large_dataset(args.users, args.posts, args.comments, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    # Records are written as they are generated, so any size fits in memory
+    with open(args.output, 'w') as f:
+        write_sections(records, f)
 
-# Save to file
-with open('tests/data/large_real_dataset.json', 'w') as f:
-    json.dump(large_dataset, f, indent=2)
+    print(f"Dataset generated and saved to {args.output}")
 
-print("Dataset generated and saved to tests/data/large_real_dataset.json")
+if __name__ == "__main__":
+    main()
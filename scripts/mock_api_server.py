@@ -0,0 +1,251 @@
+import base64
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+# Prefix of the GitHub API paths, i.e. the `base_url` given to PyGithub is server.github_url
+GITHUB_PREFIX = "/github"
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # Avoid Nagle/delayed-ACK stalls between the header and body writes
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length)
+        self.server.count_connection(self.client_address, len(payload))
+        return payload
+
+    def do_GET(self):
+        self.read_body()
+        self.handle_github("GET", {})
+
+    def do_PATCH(self):
+        self.handle_github("PATCH", json.loads(self.read_body() or b"{}"))
+
+    def do_POST(self):
+        payload = self.read_body()
+        request = json.loads(payload or b"{}")
+        if self.path.startswith(GITHUB_PREFIX):
+            self.handle_github("POST", request)
+            return
+        time.sleep(self.server.latency)
+        content = self.server.respond(request)
+        if isinstance(content, tuple):
+            status, message = content
+            self.send_json(status, {"error": {"message": message}})
+            return
+        # Rough token counts (4 bytes per token), in both the DeepSeek and the Claude field names
+        input_tokens, output_tokens = len(payload) // 4, len(content) // 4
+        usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                 "input_tokens": input_tokens, "output_tokens": output_tokens}
+        if request.get("stream"):
+            self.send_stream(content, usage)
+            return
+        self.send_json(200, {
+            "choices": [{"message": {"content": content}}],
+            "content": [{"text": content}],
+            "usage": usage,
+        })
+
+    def send_json(self, status: int, data: Any):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.server.pace(len(body))
+        self.wfile.write(body)
+
+    def send_chunk(self, data: bytes):
+        self.server.pace(len(data))
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_stream(self, content: str, usage: dict):
+        # Server-sent events with chunked transfer encoding; every event carries the
+        # delta in both the DeepSeek (OpenAI) and the Claude shapes
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = self.server.stream_chunk_size
+        for start in range(0, len(content), size):
+            piece = content[start:start + size]
+            event = {"type": "content_block_delta", "delta": {"text": piece},
+                     "choices": [{"delta": {"content": piece}}]}
+            self.send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            time.sleep(self.server.stream_delay)
+        final = {"type": "message_delta", "usage": usage, "choices": []}
+        self.send_chunk(f"data: {json.dumps(final)}\n\n".encode())
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def handle_github(self, method: str, request: Dict[str, Any]):
+        time.sleep(self.server.github_latency)
+        path = urlparse(self.path).path
+        match = re.match(rf"{GITHUB_PREFIX}/repos/([^/]+)/([^/]+)(/.*)?$", path)
+        if match is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        repo_url = f"{self.server.github_url}/repos/{match.group(1)}/{match.group(2)}"
+        status, data = self.server.github.handle(method, match.group(3) or "", request, repo_url)
+        self.send_json(status, data)
+
+
+class MockGitHub:
+    """In-memory repository answering the parts of the GitHub git data API used by the image store."""
+
+    def __init__(self, branch: str = "main"):
+        self.branch = branch
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.commits: Dict[str, Dict[str, Any]] = {}
+        self.refs: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        empty_tree = self._add_tree({})
+        self.refs[f"heads/{branch}"] = self._add_commit("Initial commit", empty_tree, [])
+
+    def _new_sha(self, kind: str) -> str:
+        return hashlib.sha1(f"{kind}{next(self._ids)}".encode()).hexdigest()
+
+    def _add_tree(self, entries: Dict[str, Dict[str, str]]) -> str:
+        sha = self._new_sha("tree")
+        self.trees[sha] = entries
+        return sha
+
+    def _add_commit(self, message: str, tree: str, parents: list) -> str:
+        sha = self._new_sha("commit")
+        self.commits[sha] = {"message": message, "tree": tree, "parents": parents}
+        return sha
+
+    def _ref_json(self, ref: str, repo_url: str) -> Dict[str, Any]:
+        sha = self.refs[ref]
+        return {"ref": f"refs/{ref}", "url": f"{repo_url}/git/refs/{ref}",
+                "object": {"sha": sha, "type": "commit", "url": f"{repo_url}/git/commits/{sha}"}}
+
+    def _commit_json(self, sha: str, repo_url: str) -> Dict[str, Any]:
+        commit = self.commits[sha]
+        return {"sha": sha, "url": f"{repo_url}/git/commits/{sha}", "message": commit["message"],
+                "tree": {"sha": commit["tree"], "url": f"{repo_url}/git/trees/{commit['tree']}"},
+                "parents": [{"sha": parent, "url": f"{repo_url}/git/commits/{parent}"}
+                            for parent in commit["parents"]]}
+
+    def _tree_json(self, sha: str, repo_url: str) -> Dict[str, Any]:
+        return {"sha": sha, "url": f"{repo_url}/git/trees/{sha}", "truncated": False,
+                "tree": [dict(entry, path=path) for path, entry in sorted(self.trees[sha].items())]}
+
+    def handle(self, method: str, path: str, request: Dict[str, Any], repo_url: str):
+        with self._lock:
+            endpoint = re.sub(r"/[0-9a-f]{40}$", "/{sha}", path) if method == "GET" else path
+            self.calls[f"{method} {endpoint}"] = self.calls.get(f"{method} {endpoint}", 0) + 1
+            if method == "GET" and path == "":
+                name = repo_url.rsplit("/repos/", 1)[1]
+                return 200, {"full_name": name, "name": name.split("/")[1], "url": repo_url,
+                             "default_branch": self.branch}
+            ref = re.match(r"/git/refs?/(.+)$", path)
+            if ref and ref.group(1) in self.refs:
+                if method == "PATCH":
+                    self.refs[ref.group(1)] = request["sha"]
+                return 200, self._ref_json(ref.group(1), repo_url)
+            commit = re.match(r"/git/commits/([0-9a-f]{40})$", path)
+            if method == "GET" and commit and commit.group(1) in self.commits:
+                return 200, self._commit_json(commit.group(1), repo_url)
+            tree = re.match(r"/git/trees/([0-9a-f]{40})$", path)
+            if method == "GET" and tree and tree.group(1) in self.trees:
+                return 200, self._tree_json(tree.group(1), repo_url)
+            if method == "POST" and path == "/git/blobs":
+                content = request["content"]
+                data = base64.b64decode(content) if request.get("encoding") == "base64" else content.encode()
+                sha = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+                self.blobs[sha] = data
+                return 201, {"sha": sha, "url": f"{repo_url}/git/blobs/{sha}"}
+            if method == "POST" and path == "/git/trees":
+                entries = dict(self.trees.get(request.get("base_tree"), {}))
+                for element in request["tree"]:
+                    entries[element["path"]] = {key: element[key] for key in ("mode", "type", "sha")}
+                return 201, self._tree_json(self._add_tree(entries), repo_url)
+            if method == "POST" and path == "/git/commits":
+                sha = self._add_commit(request["message"], request["tree"], list(request.get("parents", [])))
+                return 201, self._commit_json(sha, repo_url)
+            return 404, {"message": "Not Found"}
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """Local stand-in for the DeepSeek/Claude chat endpoints and the GitHub git data API.
+
+    `respond(request)` chooses the completion for each chat request (else
+    `content` is always returned), or an error as a (status, message)
+    tuple; `latency` delays every chat response and `throughput` (bytes
+    per second, 0 for unlimited) paces response bodies.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, content: str = "{}",
+                 stream_chunk_size: int = 16, stream_delay: float = 0.0,
+                 respond: Optional[Callable[[Dict[str, Any]], Union[str, Tuple[int, str]]]] = None,
+                 throughput: float = 0.0,
+                 github_latency: float = 0.0, branch: str = "main"):
+        super().__init__((host, port), MockAPIHandler)
+        self.latency = latency
+        self.content = content
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_delay = stream_delay
+        self.responder = respond
+        self.throughput = throughput
+        self.github_latency = github_latency
+        self.github = MockGitHub(branch)
+        self.connections = set()
+        self.requests = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def respond(self, request: Dict[str, Any]) -> Union[str, Tuple[int, str]]:
+        return self.responder(request) if self.responder is not None else self.content
+
+    def pace(self, num_bytes: int):
+        if self.throughput:
+            time.sleep(num_bytes / self.throughput)
+
+    def count_connection(self, client_address, num_bytes: int = 0):
+        with self._lock:
+            self.connections.add(client_address)
+            self.requests += 1
+            self.bytes_received += num_bytes
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
+
+    @property
+    def github_url(self) -> str:
+        return f"{self.base_url}{GITHUB_PREFIX}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,166 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+# Default number of API requests in flight across all worker processes
+BATCH_MAX_INFLIGHT = int(os.getenv('BATCH_MAX_INFLIGHT', '8'))
+SUMMARY_FILE = 'summary.json'
+
+
+class BatchJob:
+    def __init__(self, job_id: str, input_file: str, output_file: str):
+        self.job_id = job_id
+        self.input_file = input_file
+        self.output_file = output_file
+
+    @property
+    def manifest_file(self) -> str:
+        return f"{self.output_file}.manifest.json"
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"id": self.job_id, "input": self.input_file, "output": self.output_file}
+
+
+def is_batch_source(source: str) -> bool:
+    return os.path.isdir(source) or source.endswith('.jsonl') or glob.has_magic(source)
+
+
+def _job_id(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def discover_jobs(source: str, output_dir: str) -> List[BatchJob]:
+    """Jobs from a directory of .json files, a glob pattern, or a JSONL manifest.
+
+    Manifest lines are {"input": path} objects with optional "id" and
+    "output"; relative input paths are resolved against the manifest's directory.
+    """
+    jobs = []
+    if source.endswith('.jsonl') and not os.path.isdir(source):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                input_file = os.path.join(base_dir, entry["input"])
+                job_id = str(entry.get("id") or _job_id(input_file))
+                jobs.append(BatchJob(job_id, input_file,
+                                     entry.get("output") or os.path.join(output_dir, f"{job_id}.json")))
+    else:
+        pattern = os.path.join(source, '*.json') if os.path.isdir(source) else source
+        for input_file in sorted(glob.glob(pattern)):
+            job_id = _job_id(input_file)
+            jobs.append(BatchJob(job_id, input_file, os.path.join(output_dir, f"{job_id}.json")))
+
+    seen = set()
+    for job in jobs:
+        if job.output_file in seen:
+            raise ValueError(f"Several batch jobs write to {job.output_file}")
+        seen.add(job.output_file)
+    return jobs
+
+
+def _write_json_atomic(data: Any, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(inflight, workers: int, cache_path: Optional[str], cache_ttl: Optional[float],
+                 image_store: Optional[str]):
+    # Runs once in every worker process: the semaphore is shared by all of them
+    from http_client import HttpTransport, set_transport
+    from main import create_image_store, set_image_store, set_response_cache
+    from rate_limit import PRIORITY_BATCH, set_default_priority, set_gate_share
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    set_transport(HttpTransport(limiter=inflight))
+    # Each worker gets an equal share of the provider rate limits, and interactive runs go first
+    set_gate_share(1 / workers)
+    set_default_priority(PRIORITY_BATCH)
+    if cache_path:
+        from cache import create_response_cache
+        set_response_cache(create_response_cache(cache_path, ttl=cache_ttl))
+    if image_store:
+        set_image_store(create_image_store(image_store))
+
+
+def run_job(job: BatchJob, max_iterations: int = 3) -> Dict[str, Any]:
+    from data_loader import InputFile
+    from main import generate_interactive_graph
+    from manifest import RunManifest
+
+    start = time.perf_counter()
+    # A job that failed before resumes from the stages it completed
+    manifest = RunManifest.load(job.manifest_file) if os.path.exists(job.manifest_file) else RunManifest()
+    status = dict(job.as_dict())
+    try:
+        result = generate_interactive_graph(InputFile(job.input_file), max_iterations=max_iterations, manifest=manifest)
+        # The output file only appears once complete, it marks the job as done
+        _write_json_atomic(result, job.output_file)
+        status["status"] = "done"
+    except Exception as e:
+        logging.error(f"Batch job {job.job_id} failed: {str(e)}")
+        status.update(status="failed", error=str(e))
+    finally:
+        if manifest.stages:
+            manifest.save(job.manifest_file)
+    status.update(duration=round(time.perf_counter() - start, 3), reused_stages=len(manifest.reused))
+    return status
+
+
+def run_batch(jobs: List[BatchJob], output_dir: str, workers: Optional[int] = None,
+              max_inflight: int = BATCH_MAX_INFLIGHT, max_iterations: int = 3, force: bool = False,
+              cache_path: Optional[str] = None, cache_ttl: Optional[float] = None,
+              image_store: Optional[str] = None) -> Dict[str, Any]:
+    """Run jobs in a process pool and write `summary.json` to `output_dir`.
+
+    Jobs whose output already exists are skipped unless `force` is set, so
+    an interrupted batch can simply be started again.
+    """
+    start = time.perf_counter()
+    results = {}
+    pending = []
+    for job in jobs:
+        if not force and os.path.exists(job.output_file):
+            results[job.output_file] = dict(job.as_dict(), status="skipped")
+        else:
+            pending.append(job)
+    logging.info(f"Batch: {len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run")
+
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        inflight = multiprocessing.BoundedSemaphore(max_inflight)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(inflight, workers, cache_path, cache_ttl, image_store)) as executor:
+            futures = {executor.submit(run_job, job, max_iterations): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    results[job.output_file] = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. killed); the job can be retried later
+                    results[job.output_file] = dict(job.as_dict(), status="failed", error=str(e))
+                logging.info(f"Batch job {job.job_id}: {results[job.output_file]['status']} "
+                             f"({len(results)}/{len(jobs)})")
+
+    counts = {}
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    summary = {
+        "jobs": [results[job.output_file] for job in jobs],
+        "counts": counts,
+        "duration": round(time.perf_counter() - start, 3),
+    }
+    _write_json_atomic(summary, os.path.join(output_dir, SUMMARY_FILE))
+    return summary
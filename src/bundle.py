@@ -0,0 +1,254 @@
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+# Artifact compression: "gzip", "zstd" (needs the zstandard package) or "none"
+BUNDLE_COMPRESSION = os.getenv('BUNDLE_COMPRESSION', 'gzip')
+# Smaller artifacts are stored as they are, so they can be memory-mapped
+BUNDLE_COMPRESS_MIN_BYTES = int(os.getenv('BUNDLE_COMPRESS_MIN_BYTES', '4096'))
+BUNDLE_GZIP_LEVEL = 6
+BUNDLE_ZSTD_LEVEL = 3
+BUNDLE_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class BundleError(Exception):
+    pass
+
+
+def _zstandard():
+    # Optional dependency, only needed for zstd bundles
+    try:
+        import zstandard
+    except ImportError:
+        raise BundleError("zstd compression needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        # No timestamp in the header: the same result gives the same bytes
+        return gzip.compress(data, compresslevel=BUNDLE_GZIP_LEVEL, mtime=0)
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor(level=BUNDLE_ZSTD_LEVEL).compress(data)
+    return data
+
+
+def _write_atomic(path: str, content: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class BundleWriter:
+    """Writes a result as a bundle directory: `manifest.json` and one file per artifact.
+
+    Strings (the SVG and JavaScript code) are stored as UTF-8 text, other
+    values as compact JSON, compressed unless smaller than
+    `compress_min_bytes`. Artifacts are encoded and written on a background
+    thread as soon as they are given, and the manifest is rewritten after
+    each one, so a bundle can be read while the run goes on or after it failed.
+    Until `finish()`, the manifest still lists the artifacts of an earlier
+    bundle at the same path that were not rewritten yet; their files are
+    only deleted once the new bundle is complete.
+    """
+
+    def __init__(self, path: str, compression: Optional[str] = None, compress_min_bytes: Optional[int] = None):
+        self.path = path
+        self.compression = compression or BUNDLE_COMPRESSION
+        if self.compression not in _EXTENSIONS:
+            raise BundleError(f"Unknown bundle compression: {self.compression}")
+        if self.compression == "zstd":
+            _zstandard()
+        self.compress_min_bytes = BUNDLE_COMPRESS_MIN_BYTES if compress_min_bytes is None else compress_min_bytes
+        self.artifacts: Dict[str, Dict[str, Any]] = {}
+        self.fields: Optional[List[str]] = None
+        self._futures: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bundle")
+        os.makedirs(path, exist_ok=True)
+        self._previous = self._read_previous()
+
+    def _read_previous(self) -> Dict[str, Dict[str, Any]]:
+        # Artifacts of an earlier bundle at the same path; their files may have other names (compression)
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, 'r') as file:
+                previous = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable bundle manifest {manifest_path}: {e}")
+            return {}
+        if not isinstance(previous, dict) or previous.get("version") != BUNDLE_VERSION:
+            logging.warning(f"Ignoring bundle manifest {manifest_path} of another version")
+            return {}
+        artifacts = {}
+        for name, artifact in (previous.get("artifacts") or {}).items():
+            file_name = artifact.get("file") if isinstance(artifact, dict) else None
+            # Only plain file names inside the bundle are ever deleted
+            if (not isinstance(file_name, str) or os.path.basename(file_name) != file_name
+                    or file_name in ("", ".", "..", MANIFEST_FILE)):
+                logging.warning(f"Ignoring bundle artifact {name!r} with file {file_name!r}")
+                continue
+            artifacts[name] = artifact
+        return artifacts
+
+    def _remove_stale(self):
+        kept = {artifact["file"] for artifact in self.artifacts.values()}
+        for artifact in self._previous.values():
+            if artifact["file"] not in kept:
+                try:
+                    os.remove(os.path.join(self.path, artifact["file"]))
+                except OSError:
+                    pass
+        self._previous = {}
+
+    def write(self, name: str, value: Any):
+        """Queue an artifact; it replaces an earlier one of the same name."""
+        self._futures.append(self._executor.submit(self._write, name, value))
+
+    def _write(self, name: str, value: Any):
+        if isinstance(value, str):
+            kind, extension, data = "text", ".txt", value.encode('utf-8')
+        else:
+            kind, extension = "json", ".json"
+            data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        compression = self.compression if len(data) >= self.compress_min_bytes else "none"
+        stored = _compress(data, compression)
+        file_name = f"{name}{extension}{_EXTENSIONS[compression]}"
+        previous = self.artifacts.get(name)
+        _write_atomic(os.path.join(self.path, file_name), stored)
+        if previous is not None and previous["file"] != file_name:
+            os.remove(os.path.join(self.path, previous["file"]))
+        self.artifacts[name] = {"file": file_name, "format": kind, "compression": compression,
+                                "size": len(data), "stored_size": len(stored),
+                                "sha256": hashlib.sha256(data).hexdigest()}
+        self._save_manifest()
+        logging.debug(f"Bundle artifact {name}: {len(data)} bytes, {len(stored)} stored")
+
+    def _save_manifest(self):
+        artifacts = self.artifacts if self.fields is not None else {**self._previous, **self.artifacts}
+        manifest = {"version": BUNDLE_VERSION, "complete": self.fields is not None, "artifacts": artifacts}
+        if self.fields is not None:
+            manifest["fields"] = self.fields
+        _write_atomic(os.path.join(self.path, MANIFEST_FILE),
+                      json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    def _wait(self):
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def finish(self, fields: Iterable[str]):
+        """Wait for the queued artifacts and mark the bundle complete; `fields` orders the result."""
+        self._wait()
+        self.fields = list(fields)
+        missing = [field for field in self.fields if field not in self.artifacts]
+        if missing:
+            raise BundleError(f"Bundle {self.path} has no artifact for {missing}")
+        self._executor.submit(self._save_manifest).result()
+        self._remove_stale()
+
+    def close(self):
+        try:
+            self._wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'BundleWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Bundle:
+    """Lazy reader of a bundle: only the artifacts asked for are read, and each one once.
+
+    `bundle["svg_code"]` returns the decoded value; `open(name)` streams the
+    stored bytes and `mmap(name)` maps an uncompressed artifact without
+    reading it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise BundleError(f"{path} is not a bundle (no {MANIFEST_FILE})")
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise BundleError(f"Bundle {path} has unsupported version {manifest.get('version')}")
+        self.complete = manifest.get("complete", False)
+        self.artifacts: Dict[str, Dict[str, Any]] = manifest.get("artifacts", {})
+        self.fields: List[str] = manifest.get("fields") or list(self.artifacts)
+        self._values: Dict[str, Any] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.artifacts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.fields)
+
+    def _artifact(self, name: str) -> Dict[str, Any]:
+        if name not in self.artifacts:
+            raise KeyError(name)
+        return self.artifacts[name]
+
+    def open(self, name: str) -> BinaryIO:
+        """The artifact's (decompressed) bytes as a binary stream."""
+        artifact = self._artifact(name)
+        path = os.path.join(self.path, artifact["file"])
+        if artifact["compression"] == "gzip":
+            return gzip.open(path, 'rb')
+        if artifact["compression"] == "zstd":
+            return _zstandard().ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return open(path, 'rb')
+
+    def mmap(self, name: str) -> mmap.mmap:
+        artifact = self._artifact(name)
+        if artifact["compression"] != "none":
+            raise BundleError(f"Artifact {name} is compressed ({artifact['compression']}), use open() or load()")
+        with open(os.path.join(self.path, artifact["file"]), 'rb') as file:
+            if artifact["size"] == 0:
+                raise BundleError(f"Artifact {name} is empty")
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_bytes(self, name: str) -> bytes:
+        with self.open(name) as stream:
+            return stream.read()
+
+    def load(self, name: str) -> Any:
+        if name not in self._values:
+            artifact = self._artifact(name)
+            data = self.read_bytes(name)
+            self._values[name] = data.decode('utf-8') if artifact["format"] == "text" else json.loads(data)
+        return self._values[name]
+
+    def __getitem__(self, name: str) -> Any:
+        return self.load(name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: self.load(name) for name in self.fields}
+
+    def export_json(self, path: str):
+        """Write the result as a single JSON file, as produced before bundles existed."""
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+def is_bundle(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
@@ -1,16 +1,24 @@
 import argparse
 import json
 import logging
+import os
 from typing import Dict, Any
 
-from main import generate_interactive_graph, LearnEverythingError
+from batch import BATCH_MAX_INFLIGHT, SUMMARY_FILE, discover_jobs, is_batch_source, run_batch
+from bundle import BUNDLE_COMPRESSION, BundleWriter
+from cache import create_response_cache
+from data_loader import InputFile
+from main import (generate_interactive_graph, create_image_store, set_image_store, set_response_cache,
+                  LearnEverythingError)
+from manifest import RunManifest
+from tracing import Tracer, set_tracer
 
 def setup_logging():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_data_from_file(file_path: str) -> str:
-    with open(file_path, 'r') as file:
-        return file.read()
+def load_data_from_file(file_path: str) -> InputFile:
+    # The pipeline streams structured data from the file and reads the text only if an agent needs it
+    return InputFile(file_path)
 
 def save_result_to_file(result: Dict[str, Any], file_path: str):
     with open(file_path, 'w') as file:
@@ -18,23 +26,104 @@ def save_result_to_file(result: Dict[str, Any], file_path: str):
 
 def run_cli():
     parser = argparse.ArgumentParser(description="Learn Everything: Interactive Graph Generator")
-    parser.add_argument('input_file', help='Path to the input JSON file containing raw data')
-    parser.add_argument('--output', help='Path to save the output JSON file', default='output.json')
+    parser.add_argument('input_file', help='Path to the input JSON file containing raw data, or for a batch '
+                                           'a directory of JSON files, a glob pattern or a JSONL list of inputs')
+    parser.add_argument('--output', default=None,
+                        help='Output bundle directory, or single JSON file if the path ends with .json '
+                             '(default: output; batch: output directory)')
+    parser.add_argument('--format', choices=['bundle', 'json'], default=None,
+                        help='Output format (default: json for a path ending with .json, bundle otherwise)')
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default=BUNDLE_COMPRESSION,
+                        help='Compression of the bundle artifacts (zstd needs the zstandard package)')
+    parser.add_argument('--export-json', metavar='FILE',
+                        help='Also save the whole result as a single JSON file, as written before bundles')
     parser.add_argument('--max-iterations', type=int, default=3, help='Maximum number of iterations for each step')
+    parser.add_argument('--cache-dir', default=os.getenv('RESPONSE_CACHE_DIR', '.cache/learn-anything'),
+                        help='Directory of the on-disk agent response cache')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='Expire cached responses after this many seconds')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the APIs, ignoring cached responses')
+    parser.add_argument('--since', metavar='MANIFEST',
+                        help='Manifest of a previous run; stages whose inputs are unchanged reuse its outputs')
+    parser.add_argument('--manifest', help='Path to save the run manifest (default: <output>.manifest.json)')
+    parser.add_argument('--image-store', choices=['github', 'local'],
+                        help='Where generated images are stored (default: $IMAGE_STORE or github)')
+    parser.add_argument('--jobs', type=int, default=None, help='Batch: number of worker processes (default: CPUs)')
+    parser.add_argument('--max-inflight', type=int, default=BATCH_MAX_INFLIGHT,
+                        help='Batch: maximum API requests in flight across all workers')
+    parser.add_argument('--force', action='store_true', help='Batch: run again jobs whose output already exists')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Record timing spans of the run: JSON lines if FILE ends with .jsonl, '
+                             'otherwise a Chrome trace (chrome://tracing, Perfetto, speedscope)')
     args = parser.parse_args()
 
     setup_logging()
+    if is_batch_source(args.input_file):
+        run_batch_cli(args)
+        return
+    args.output = args.output or 'output'
+    output_format = args.format or ('json' if args.output.endswith('.json') else 'bundle')
+    cache = None
+    if not args.no_cache:
+        cache = create_response_cache(os.path.join(args.cache_dir, 'responses.sqlite'), ttl=args.cache_ttl)
+        set_response_cache(cache)
+    if args.image_store:
+        set_image_store(create_image_store(args.image_store))
     logging.info(f"Starting Learn Everything with input file: {args.input_file}")
+    manifest_path = args.manifest or f"{args.output}.manifest.json"
+    manifest = RunManifest.load(args.since) if args.since else RunManifest()
+    tracer = Tracer() if args.trace else None
+    set_tracer(tracer)
+    bundle = None
 
     try:
         raw_data = load_data_from_file(args.input_file)
-        result = generate_interactive_graph(raw_data, max_iterations=args.max_iterations)
-        save_result_to_file(result, args.output)
+        if output_format == 'bundle':
+            # Each result field is written (compressed) as soon as its stage completes
+            bundle = BundleWriter(args.output, compression=args.compression)
+        result = generate_interactive_graph(raw_data, max_iterations=args.max_iterations, manifest=manifest,
+                                            bundle=bundle)
+        if bundle is None:
+            save_result_to_file(result, args.output)
+        if args.export_json:
+            save_result_to_file(result, args.export_json)
         logging.info(f"Process completed successfully. Output saved to {args.output}")
     except LearnEverythingError as e:
         logging.error(f"Learn Everything Error: {str(e)}")
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
+    finally:
+        if bundle is not None:
+            try:
+                bundle.close()
+            except Exception as e:
+                logging.error(f"Output bundle could not be written: {str(e)}")
+        # Saved even after a failure so that completed stages are reused next time
+        if manifest.stages:
+            manifest.save(manifest_path)
+            logging.info(f"Run manifest saved to {manifest_path} ({len(manifest.reused)} stages reused)")
+        if cache is not None:
+            logging.info(f"Response cache: {cache.report()}")
+        if tracer is not None:
+            save_trace(tracer, args.trace)
+            set_tracer(None)
+
+def save_trace(tracer: Tracer, file_path: str, top: int = 10):
+    tracer.write(file_path)
+    logging.info(f"Trace saved to {file_path} ({len(tracer.spans)} spans). Slowest spans by total time:")
+    for name, stats in list(tracer.summary().items())[:top]:
+        logging.info(f"  {name}: {stats['count']} x, {stats['total_ms']:.0f} ms total, {stats['max_ms']:.0f} ms max")
+
+def run_batch_cli(args):
+    if args.trace:
+        logging.warning("--trace only applies to single runs, ignoring it in batch mode")
+    output_dir = args.output or 'batch-output'
+    jobs = discover_jobs(args.input_file, output_dir)
+    cache_path = None if args.no_cache else os.path.join(args.cache_dir, 'responses.sqlite')
+    summary = run_batch(jobs, output_dir, workers=args.jobs, max_inflight=args.max_inflight,
+                        max_iterations=args.max_iterations, force=args.force, cache_path=cache_path,
+                        cache_ttl=args.cache_ttl, image_store=args.image_store)
+    logging.info(f"Batch completed in {summary['duration']:.1f}s: {summary['counts']}. "
+                 f"Summary saved to {os.path.join(output_dir, SUMMARY_FILE)}")
 
 if __name__ == "__main__":
     run_cli()
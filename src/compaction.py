@@ -0,0 +1,167 @@
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+# Token budget of one request (template and input) per provider
+PROVIDER_INPUT_TOKENS = {
+    "deepseek": int(os.getenv('DEEPSEEK_INPUT_TOKENS', '100000')),
+    "claude": int(os.getenv('CLAUDE_INPUT_TOKENS', '150000')),
+}
+# Lists of at least this many records sharing the same keys are sent as a table
+TABULATE_MIN_RECORDS = int(os.getenv('TABULATE_MIN_RECORDS', '4'))
+# Sampling to fit a budget never keeps fewer items per list than this
+MIN_LIST_ITEMS = 5
+
+# What each agent needs from its input. `omit` drops fields the agent has no
+# use for (None drops a value whole, a nested spec applies to a dict or to
+# each record of a list); only fields known to be redundant are listed, as
+# free-form inputs such as the graph design keep whatever the designer put
+# in them. `tabulate` sends records as tables, to agents whose template
+# explains the encoding. `max_list_items` samples long lists (the
+# orchestrator only plans from the structure of the data) and `lossy`
+# allows sampling lists further when the input exceeds the budget (fewer
+# illustrated nodes is acceptable); agents that must see every element fail
+# instead.
+AGENT_INPUT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "orchestrator": {"tabulate": True, "max_list_items": 20, "lossy": True},
+    "data_analyzer": {"tabulate": True},
+    # Nodes are illustrated, edges are not
+    "image_generator": {"omit": {key: None for key in ("arêtes", "edges", "liens")}, "lossy": True},
+    # The images themselves are attached as thumbnails; their base64 content is not sent twice
+    "quality_checker": {"omit": {"images": {"content": None}}},
+}
+
+
+class PromptBudgetError(Exception):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    # About 4 bytes of UTF-8 per token for JSON and code: close enough to budget requests
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+class _Omitted(str):
+    """Marker closing a list cut by prune(), e.g. "... (+30)"; tabulate() moves the count to the table."""
+
+    def __new__(cls, count: int):
+        marker = super().__new__(cls, f"... (+{count})")
+        marker.count = count
+        return marker
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def omit_fields(value: Any, omit: Dict[str, Any]) -> Any:
+    """Copy of `value` without the keys dropped by `omit`, applied to each record of a list."""
+    if isinstance(value, list):
+        return [omit_fields(item, omit) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: child if key not in omit else omit_fields(child, omit[key])
+            for key, child in value.items() if key not in omit or omit[key] is not None}
+
+
+def prune(value: Any, max_list_items: Optional[int] = None) -> Any:
+    """Copy of `value` without empty fields (null, "", [], {}), with lists cut to `max_list_items`."""
+    def walk(item):
+        if isinstance(item, dict):
+            pruned = {}
+            for key, child in item.items():
+                child = walk(child)
+                if not _is_empty(child):
+                    pruned[key] = child
+            return pruned
+        if isinstance(item, list):
+            if max_list_items is not None and len(item) > max_list_items:
+                return [walk(child) for child in item[:max_list_items]] + [_Omitted(len(item) - max_list_items)]
+            return [walk(child) for child in item]
+        return item
+    return walk(value)
+
+
+def tabulate(value: Any, min_records: int = TABULATE_MIN_RECORDS) -> Any:
+    """Lists of records with identical keys become {"colonnes": keys, "lignes": rows}.
+
+    Keys such as "authorId" or "postId" are then written once per list
+    instead of once per record; the conversion is lossless. A list cut by
+    prune() keeps its table, with the number of records left out as "omis".
+    """
+    if isinstance(value, dict):
+        return {key: tabulate(child, min_records) for key, child in value.items()}
+    if isinstance(value, list):
+        records, omitted = value, None
+        if value and isinstance(value[-1], _Omitted):
+            records, omitted = value[:-1], value[-1].count
+        if (len(records) >= min_records and all(isinstance(record, dict) for record in records)
+                and records[0] and all(record.keys() == records[0].keys() for record in records)):
+            columns = list(records[0])
+            table = {"colonnes": columns,
+                     "lignes": [[tabulate(record[column], min_records) for column in columns] for record in records]}
+            if omitted is not None:
+                table["omis"] = omitted
+            return table
+        return [tabulate(child, min_records) for child in value]
+    return value
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _longest_list(value: Any) -> int:
+    if isinstance(value, dict):
+        return max((_longest_list(child) for child in value.values()), default=0)
+    if isinstance(value, list):
+        return max([len(value)] + [_longest_list(child) for child in value])
+    return 0
+
+
+def _parse(data: Any) -> Tuple[Any, bool]:
+    # JSON passed as text (raw data, chunks, serialised designs) is compacted like structured data
+    if isinstance(data, str):
+        stripped = data.lstrip()
+        if stripped[:1] in ('{', '['):
+            try:
+                return json.loads(data), True
+            except json.JSONDecodeError:
+                pass
+        return data, False
+    return data, True
+
+
+def compact_input(agent_name: str, data: Any, budget: int, overhead: int = 0) -> Tuple[str, bool]:
+    """The text sent to an agent for `data`, within `budget` tokens including `overhead` (the template).
+
+    Returns the text and whether lists had to be sampled to fit. Raises
+    PromptBudgetError when the input cannot fit without losing data the
+    agent needs.
+    """
+    value, structured = _parse(data)
+    if not structured:
+        text = str(value)
+        if estimate_tokens(text) + overhead > budget:
+            raise PromptBudgetError(f"Input of {agent_name} is about {estimate_tokens(text) + overhead} tokens, "
+                                    f"over the budget of {budget}")
+        return text, False
+
+    profile = AGENT_INPUT_PROFILES.get(agent_name, {})
+    if "omit" in profile:
+        value = omit_fields(value, profile["omit"])
+    max_items = profile.get("max_list_items")
+    sampled = False
+    while True:
+        pruned = prune(value, max_items)
+        text = compact_json(tabulate(pruned) if profile.get("tabulate") else pruned)
+        tokens = estimate_tokens(text) + overhead
+        if tokens <= budget:
+            return text, sampled
+        # Halve the longest lists until the input fits
+        longest = _longest_list(value) if max_items is None else max_items
+        smaller = max(MIN_LIST_ITEMS, longest // 2)
+        if not profile.get("lossy") or smaller >= longest:
+            raise PromptBudgetError(f"Input of {agent_name} is about {tokens} tokens, over the budget of {budget}")
+        max_items = smaller
+        sampled = True
@@ -0,0 +1,45 @@
+import threading
+from typing import Any, Optional
+
+
+class AppContext:
+    """Clients shared by the pipeline, each built on first use and then cached.
+
+    Nothing here is imported or contacted until it is needed, so importing
+    the pipeline (CLI startup, tests, worker processes) stays fast and works
+    offline.
+    """
+
+    def __init__(self, github_token: Optional[str] = None, repo_name: Optional[str] = None,
+                 github_base_url: Optional[str] = None):
+        self.github_token = github_token
+        self.repo_name = repo_name
+        # GitHub Enterprise, or a local stand-in such as scripts/mock_api_server.py
+        self.github_base_url = github_base_url
+        self._github = None
+        self._repo = None
+        self._lock = threading.Lock()
+
+    @property
+    def github(self) -> Any:
+        with self._lock:
+            if self._github is None:
+                from github import Github
+                if self.github_base_url:
+                    self._github = Github(self.github_token, base_url=self.github_base_url)
+                else:
+                    self._github = Github(self.github_token)
+            return self._github
+
+    @property
+    def repo(self) -> Any:
+        github = self.github
+        with self._lock:
+            if self._repo is None:
+                self._repo = github.get_repo(self.repo_name)
+            return self._repo
+
+    @property
+    def transport(self):
+        from http_client import get_transport
+        return get_transport()
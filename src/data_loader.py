@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any, Iterator, TextIO, Tuple, Union
+
+# Characters read from the input per refill of the streaming reader
+READ_CHUNK_CHARS = int(os.getenv('READ_CHUNK_CHARS', str(1 << 20)))
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that can continue a number: a number ending the buffer may be cut
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class InputFile:
+    """Input dataset left on disk.
+
+    Structured data is streamed from the file by the local analysis; the
+    text is only read in full by the stages that send it to an agent.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._fingerprint = None
+
+    def open(self) -> TextIO:
+        return open(self.path, 'r', encoding='utf-8')
+
+    def read(self) -> str:
+        with self.open() as file:
+            return file.read()
+
+    def fingerprint(self) -> str:
+        # Hashed in blocks, so that run manifests do not need the text in memory
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            with open(self.path, 'rb') as file:
+                for block in iter(lambda: file.read(READ_CHUNK_CHARS), b''):
+                    digest.update(block)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __repr__(self) -> str:
+        return f"InputFile({self.path!r}, {self.size} bytes)"
+
+
+RawData = Union[str, InputFile]
+
+
+def read_text(raw_data: RawData) -> str:
+    return raw_data.read() if isinstance(raw_data, InputFile) else raw_data
+
+
+def input_size(raw_data: RawData) -> int:
+    return raw_data.size if isinstance(raw_data, InputFile) else len(raw_data)
+
+
+class JSONStreamReader:
+    """Reads the top-level object or list of a JSON document one value at a time.
+
+    Only the value being decoded (one record of a list) is held in memory,
+    along with a read buffer of about READ_CHUNK_CHARS characters.
+    """
+
+    def __init__(self, file: TextIO, chunk_size: int = READ_CHUNK_CHARS):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what was consumed before appending, so the buffer stays about one chunk long
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or "" at the end of the input."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        while True:
+            # Whitespace is skipped inline rather than through peek(): this runs once per record
+            pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                if (self.eof or not isinstance(value, (int, float))
+                        or _NUMBER_TAIL.match(self.buffer, end).end() < len(self.buffer)):
+                    self.pos = end
+                    return value
+            # The value continues in the next chunk; reading as much as is already
+            # buffered keeps the retries linear for values larger than a chunk
+            self.pos = pos
+            self._fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def _separator(self, closing: str) -> bool:
+        # True after a comma, False at the closing bracket
+        pos = _WHITESPACE.match(self.buffer, self.pos).end()
+        if pos < len(self.buffer):
+            self.pos = pos
+            char = self.buffer[pos]
+        else:
+            char = self.peek()
+        if char not in (',', closing):
+            raise json.JSONDecodeError(f"Expecting ',' or '{closing}'", self.buffer, self.pos)
+        self.pos += 1
+        return char == ','
+
+    def elements(self) -> Iterator[Any]:
+        """Each element of a top-level list."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+        else:
+            while True:
+                yield self.value()
+                if not self._separator(']'):
+                    break
+        if self.peek():
+            raise json.JSONDecodeError("Extra data", self.buffer, self.pos)
+
+    def items(self) -> Iterator[Tuple[str, Any, bool]]:
+        """(key, value, False) for each member of the top-level object, except
+        that list members yield (key, element, True) for each of their elements."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+        else:
+            while True:
+                key = self.value()
+                if not isinstance(key, str):
+                    raise json.JSONDecodeError("Expecting property name", self.buffer, self.pos)
+                self.expect(':')
+                if self.peek() == '[':
+                    self.pos += 1
+                    if self.peek() == ']':
+                        self.pos += 1
+                    else:
+                        while True:
+                            yield key, self.value(), True
+                            if not self._separator(']'):
+                                break
+                else:
+                    yield key, self.value(), False
+                if not self._separator('}'):
+                    break
+        if self.peek():
+            raise json.JSONDecodeError("Extra data", self.buffer, self.pos)
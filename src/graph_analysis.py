@@ -0,0 +1,281 @@
+import json
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from data_loader import JSONStreamReader, RawData
+
+# Number of items kept per list in the summaries sent to the LLM agents
+SUMMARY_MAX_ITEMS = 100
+
+
+class GraphArrays:
+    """Integer-indexed view of a structured dataset: node ids/types plus edge arrays.
+
+    Each id string is stored once, in `ids` and `index`; edges are two flat
+    C int arrays of node indices and types are codes into a shared list of
+    labels, so a million edges take a few tens of MB instead of a list of
+    dicts per record.
+    """
+
+    __slots__ = ("ids", "index", "attributes", "labels", "_label_codes", "_types", "_edge_types",
+                 "_sources", "_targets")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.attributes = set()
+        # Label 0 is the empty type
+        self.labels: List[str] = [""]
+        self._label_codes: Dict[str, int] = {"": 0}
+        self._types = array('I')
+        self._edge_types = array('I')
+        self._sources = array('i')
+        self._targets = array('i')
+
+    def _code(self, label: str) -> int:
+        code = self._label_codes.get(label)
+        if code is None:
+            code = self._label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def add_node(self, node_id: Any, node_type: str = "") -> int:
+        node_id = str(node_id)
+        i = self.index.get(node_id)
+        if i is None:
+            i = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self._types.append(self._code(node_type))
+        elif node_type and not self._types[i]:
+            self._types[i] = self._code(node_type)
+        return i
+
+    def add_edge(self, source: Any, target: Any, edge_type: str = ""):
+        self._sources.append(self.add_node(source))
+        self._targets.append(self.add_node(target))
+        self._edge_types.append(self._code(edge_type))
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self._sources)
+
+    def node_type(self, i: int) -> str:
+        return self.labels[self._types[i]]
+
+    def edge_type(self, e: int) -> str:
+        return self.labels[self._edge_types[e]]
+
+    def _label_counts(self, codes: array) -> Dict[str, int]:
+        # Counts of the non-empty labels, in order of first appearance
+        if not codes:
+            return {}
+        values, first, counts = np.unique(np.frombuffer(codes, dtype=np.uintc), return_index=True,
+                                          return_counts=True)
+        return {self.labels[values[i]]: int(counts[i]) for i in np.argsort(first).tolist() if values[i]}
+
+    def node_type_counts(self) -> Dict[str, int]:
+        return self._label_counts(self._types)
+
+    def edge_type_counts(self) -> Dict[str, int]:
+        return self._label_counts(self._edge_types)
+
+    def edges(self):
+        if not self._sources:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return (np.frombuffer(self._sources, dtype=np.intc).astype(np.int64),
+                np.frombuffer(self._targets, dtype=np.intc).astype(np.int64))
+
+
+def _edge_endpoints(record: Dict) -> Optional[tuple]:
+    for source_key, target_key in (("source", "target"), ("from", "to"), ("de", "à")):
+        if source_key in record and target_key in record:
+            return record[source_key], record[target_key]
+    return None
+
+
+def _build_graph(records: Iterable[Tuple[str, Any]]) -> Optional[GraphArrays]:
+    """GraphArrays from the (list key, record) pairs of a dataset, or None if they hold no graph.
+
+    Records listed under "nodes" and "edges" are nodes and edges with an
+    optional "type". Other lists are entity records keyed by entity type,
+    linked by `xxxId` foreign keys and by relationship records with from/to
+    endpoints.
+    """
+    graph = GraphArrays()
+    node_records = False
+    for key, record in records:
+        if not isinstance(record, dict):
+            continue
+        if key == "nodes":
+            if "id" in record:
+                node_records = True
+                graph.add_node(record["id"], str(record.get("type", "")))
+                graph.attributes.update(name for name in record if name != "id")
+            continue
+        endpoints = _edge_endpoints(record)
+        if key == "edges":
+            if endpoints:
+                graph.add_edge(*endpoints, str(record.get("type", "")))
+            continue
+        if endpoints and "id" not in record:
+            graph.add_edge(*endpoints, str(record.get("type", key)))
+            continue
+        if "id" not in record:
+            continue
+        graph.add_node(record["id"], key)
+        for name, value in record.items():
+            if name.endswith("Id") and isinstance(value, (str, int)):
+                graph.add_edge(record["id"], value, name[:-2])
+            elif name != "id":
+                graph.attributes.add(name)
+    # Listed nodes form a graph even without edges; entities must be linked
+    return graph if graph.num_nodes and (graph.num_edges or node_records) else None
+
+
+def extract_graph(data: Any) -> Optional[GraphArrays]:
+    """Build a GraphArrays from nodes/edges or entity/relationship JSON, or None if unstructured."""
+    if not isinstance(data, dict):
+        return None
+    return _build_graph((key, record) for key, records in data.items() if isinstance(records, list)
+                        for record in records)
+
+
+def load_graph(raw_data: RawData) -> Optional[GraphArrays]:
+    """Same as extract_graph(json.loads(text)), streaming the records of an input file.
+
+    Text already in memory is parsed whole, which is faster; a file is read
+    one record at a time, so that memory holds the compact graph rather
+    than the parsed dataset. Raises json.JSONDecodeError on invalid JSON.
+    """
+    if isinstance(raw_data, str):
+        return extract_graph(json.loads(raw_data))
+    with raw_data.open() as file:
+        reader = JSONStreamReader(file)
+        if reader.peek() != '{':
+            # A list or plain text: no graph, as with extract_graph
+            return None
+        return _build_graph((key, record) for key, record, element in reader.items() if element)
+
+
+def pagerank(num_nodes: int, sources: np.ndarray, targets: np.ndarray, damping: float = 0.85,
+             iterations: int = 50, tolerance: float = 1e-8) -> np.ndarray:
+    if num_nodes == 0:
+        return np.zeros(0)
+    out_degree = np.bincount(sources, minlength=num_nodes).astype(float)
+    dangling = out_degree == 0
+    safe_out_degree = np.where(dangling, 1.0, out_degree)
+    ranks = np.full(num_nodes, 1.0 / num_nodes)
+    for _ in range(iterations):
+        spread = np.bincount(targets, weights=(ranks / safe_out_degree)[sources], minlength=num_nodes)
+        new_ranks = (1 - damping) / num_nodes + damping * (spread + ranks[dangling].sum() / num_nodes)
+        if np.abs(new_ranks - ranks).sum() < tolerance:
+            return new_ranks
+        ranks = new_ranks
+    return ranks
+
+
+def label_propagation(num_nodes: int, sources: np.ndarray, targets: np.ndarray,
+                      iterations: int = 10) -> np.ndarray:
+    """Community label per node; ties go to the smallest label so the result is deterministic."""
+    nodes = np.arange(num_nodes)
+    # Undirected neighbourhoods, plus a self vote to damp oscillations
+    u = np.concatenate([sources, targets, nodes])
+    v = np.concatenate([targets, sources, nodes])
+    labels = nodes.copy()
+    for _ in range(iterations):
+        # Count (node, neighbour label) pairs with a single sort of a combined key
+        keys, counts = np.unique(u * num_nodes + labels[v], return_counts=True)
+        run_nodes, run_labels = keys // num_nodes, keys % num_nodes
+        node_starts = np.flatnonzero(np.r_[True, run_nodes[1:] != run_nodes[:-1]])
+        best_count = np.repeat(np.maximum.reduceat(counts, node_starts), np.diff(np.r_[node_starts, len(keys)]))
+        # Runs are sorted by label within a node, so the first best run gives the smallest label
+        candidates = np.flatnonzero(counts == best_count)
+        candidate_nodes = run_nodes[candidates]
+        chosen = candidates[np.r_[True, candidate_nodes[1:] != candidate_nodes[:-1]]]
+        new_labels = labels.copy()
+        new_labels[run_nodes[chosen]] = run_labels[chosen]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    # Renumber communities 0..k-1 by first appearance
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_index), dtype=np.int64)
+    rank[np.argsort(first_index)] = np.arange(len(first_index))
+    return rank[inverse]
+
+
+def analyze_graph(graph: GraphArrays, top_k: int = 20) -> Dict[str, Any]:
+    """Local equivalent of the data_analyzer agent, emitting the same schema."""
+    n = graph.num_nodes
+    sources, targets = graph.edges()
+    degree = np.bincount(sources, minlength=n) + np.bincount(targets, minlength=n)
+    degree_centrality = degree / max(n - 1, 1)
+    # Relations are read as undirected links (friendship, authorship...) when ranking
+    ranks = pagerank(n, np.concatenate([sources, targets]), np.concatenate([targets, sources]))
+    communities = label_propagation(n, sources, targets)
+
+    # Most central elements first; stable sort keeps input order among ties
+    order = np.argsort(-ranks, kind="stable")
+    edge_order = np.argsort(-(ranks[sources] + ranks[targets]), kind="stable")
+
+    # Hierarchy tiers by rank: top 10% hubs, next 40%, then the periphery
+    ids = graph.ids
+    ranked_ids = [ids[i] for i in order.tolist()]
+    hub_count, core_count = int(np.ceil(n * 0.1)), int(np.ceil(n * 0.5))
+    hierarchy = {
+        "niveau1": ranked_ids[:hub_count],
+        "niveau2": ranked_ids[hub_count:core_count],
+        "niveau3": ranked_ids[core_count:],
+    }
+
+    community_sizes = np.bincount(communities) if n else np.zeros(0, dtype=np.int64)
+    community_order = np.argsort(-community_sizes, kind="stable")[:top_k]
+    community_centres = {}
+    for i, community in zip(order.tolist(), communities[order].tolist()):
+        community_centres.setdefault(community, ids[i])
+
+    return {
+        "éléments_clés": ranked_ids,
+        "relations": [{"de": ids[source], "à": ids[target], "type": graph.edge_type(e) or "lien"}
+                      for e, source, target in zip(edge_order.tolist(), sources[edge_order].tolist(),
+                                                   targets[edge_order].tolist())],
+        "hiérarchie": hierarchy,
+        "attributs_visualisation": sorted(graph.attributes) + ["degré", "centralité", "communauté"],
+        "structure_optimisée": {
+            "statistiques": {
+                "nœuds": n,
+                "relations": graph.num_edges,
+                "communautés": int(len(community_sizes)),
+                "degré_moyen": float(degree.mean()) if n else 0.0,
+            },
+            "types_de_nœuds": graph.node_type_counts(),
+            "types_de_relations": graph.edge_type_counts(),
+            "centralité": [{"id": ids[i], "pagerank": round(float(ranks[i]), 6),
+                            "degré": int(degree[i]), "centralité_degré": round(float(degree_centrality[i]), 6)}
+                           for i in order[:top_k]],
+            "communautés": [{"id": int(c), "taille": int(community_sizes[c]), "centre": community_centres[int(c)]}
+                            for c in community_order],
+        },
+    }
+
+
+def summarize_analysis(analysis: Dict[str, Any], max_items: int = SUMMARY_MAX_ITEMS) -> Dict[str, Any]:
+    """Truncate the long lists of an analysis for LLM prompts, recording the full counts."""
+    summary = dict(analysis)
+    for key in ("éléments_clés", "relations"):
+        values = analysis.get(key)
+        if isinstance(values, list) and len(values) > max_items:
+            summary[key] = values[:max_items]
+            summary[f"{key}_total"] = len(values)
+    hierarchy = analysis.get("hiérarchie")
+    if isinstance(hierarchy, dict):
+        summary["hiérarchie"] = {level: members[:max_items] if isinstance(members, list) else members
+                                 for level, members in hierarchy.items()}
+    return summary
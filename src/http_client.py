@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+# Pool configuration (per process)
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))  # number of hosts kept warm
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '8'))  # connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '300'))
+
+
+class _Permit:
+    """A limiter slot, acquired on creation and released once however many times it is released."""
+
+    def __init__(self, limiter: Any):
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        limiter.__enter__()
+        self._held = True
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self.limiter.__exit__(None, None, None)
+
+
+class HttpTransport:
+    """Keep-alive HTTP transport shared by all API calls.
+
+    `pool_maxsize` caps the connections opened to a single host; with
+    `pool_block` set, extra requests wait for a free connection instead of
+    opening (and then discarding) new ones. Async callers are served by an
+    executor of the same size, so in-flight requests never exceed the pool.
+    An optional `limiter` (any semaphore, e.g. one shared by several
+    processes) caps in-flight requests further; a streamed response holds
+    its permit until its body is read to the end or it is closed.
+    """
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 pool_block: bool = True, limiter: Any = None):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = limiter
+        # requests is only imported once a transport is needed, keeping module import cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> 'requests.Response':
+        kwargs.setdefault("timeout", self.timeout)
+        if self.limiter is None:
+            return self.session.request(method, url, **kwargs)
+        permit = _Permit(self.limiter)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except BaseException:
+            permit.release()
+            raise
+        if not kwargs.get("stream"):
+            # The body has already been read
+            permit.release()
+            return response
+        # urllib3 gives the connection back through release_conn() once the body is
+        # exhausted, and requests' close() ends with it too
+        raw_release = response.raw.release_conn
+
+        def release_conn():
+            try:
+                raw_release()
+            finally:
+                permit.release()
+        response.raw.release_conn = release_conn
+        return response
+
+    def post(self, url: str, **kwargs) -> 'requests.Response':
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> 'requests.Response':
+        return self.request("GET", url, **kwargs)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_maxsize, thread_name_prefix="http")
+            return self._executor
+
+    async def run_async(self, func: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), contextvars.copy_context().run, func, *args)
+
+    async def apost(self, url: str, **kwargs) -> 'requests.Response':
+        return await self.run_async(lambda: self.post(url, **kwargs))
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+
+_transport: Optional[HttpTransport] = None
+_transport_lock = threading.Lock()
+
+def get_transport() -> HttpTransport:
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
+
+def set_transport(transport: Optional[HttpTransport]):
+    global _transport
+    with _transport_lock:
+        if _transport is not None and _transport is not transport:
+            _transport.close()
+        _transport = transport
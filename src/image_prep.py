@@ -0,0 +1,106 @@
+import base64
+import logging
+import os
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from image_store import content_digest
+
+# Longest side, in pixels, of the images the quality checker receives
+QA_IMAGE_MAX_SIDE = int(os.getenv('QA_IMAGE_MAX_SIDE', '512'))
+# Total size of the (base64) images sent in one quality check request
+QA_IMAGE_MAX_BYTES = int(os.getenv('QA_IMAGE_MAX_BYTES', str(4 << 20)))
+QA_JPEG_QUALITY = 85
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class PreparedImage:
+    """A generated image, decoded once: the PNG that is stored and the thumbnail the quality checker sees."""
+
+    __slots__ = ("png", "thumbnail", "media_type")
+
+    def __init__(self, png: bytes, thumbnail: bytes, media_type: str):
+        self.png = png
+        self.thumbnail = thumbnail
+        self.media_type = media_type
+
+
+def decode_data_url(image_data: str) -> bytes:
+    return base64.b64decode(image_data.split(',')[1])
+
+
+def _encode(image, format: str, **options) -> bytes:
+    buffered = BytesIO()
+    image.save(buffered, format=format, **options)
+    return buffered.getvalue()
+
+
+def _open(content: bytes):
+    from PIL import Image
+
+    image = Image.open(BytesIO(content))
+    image.load()
+    return image
+
+
+def to_png(content: bytes, image=None) -> bytes:
+    # PNG sources are stored as they are; other formats are converted
+    if content.startswith(PNG_SIGNATURE):
+        if image is None:
+            _open(content)
+        return content
+    return _encode(image if image is not None else _open(content), "PNG")
+
+
+def make_thumbnail(image, png: bytes, max_side: int = QA_IMAGE_MAX_SIDE) -> Tuple[bytes, str]:
+    """The image scaled down to `max_side`, as PNG or, for opaque images, JPEG when that is smaller."""
+    from PIL import Image
+
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        png = _encode(image, "PNG")
+    if image.mode in ("RGB", "L"):
+        jpeg = _encode(image, "JPEG", quality=QA_JPEG_QUALITY)
+        if len(jpeg) < len(png):
+            return jpeg, "image/jpeg"
+    return png, "image/png"
+
+
+def prepare_image(image_data: str, max_side: int = QA_IMAGE_MAX_SIDE) -> PreparedImage:
+    """Decode a data URL from the image generator into its PNG and thumbnail."""
+    content = decode_data_url(image_data)
+    image = _open(content)
+    png = to_png(content, image)
+    return PreparedImage(png, *make_thumbnail(image, png, max_side))
+
+
+def prepare_png(png: bytes, max_side: int = QA_IMAGE_MAX_SIDE) -> PreparedImage:
+    """Thumbnail of an image already stored as PNG."""
+    return PreparedImage(png, *make_thumbnail(_open(png), png, max_side))
+
+
+def qa_images(images: Iterable[Optional[PreparedImage]], max_bytes: int = QA_IMAGE_MAX_BYTES) -> List[Dict[str, str]]:
+    """Thumbnails for the quality checker, each distinct image once, within `max_bytes` of base64 in total.
+
+    Images that would exceed the budget are left out (a later, smaller one
+    may still fit) and reported in the log.
+    """
+    payload, seen, total, skipped = [], set(), 0, 0
+    for image in images:
+        if image is None:
+            continue
+        digest = content_digest(image.thumbnail)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        data = base64.b64encode(image.thumbnail).decode()
+        if total + len(data) > max_bytes:
+            skipped += 1
+            continue
+        total += len(data)
+        payload.append({"type": image.media_type, "data": data})
+    if skipped:
+        logging.warning(f"{skipped} images left out of the quality check: over the {max_bytes} bytes budget")
+    return payload
@@ -0,0 +1,207 @@
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+class ImageStoreError(Exception):
+    pass
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def source_digest(image_data: str) -> str:
+    return hashlib.sha256(image_data.encode('utf-8')).hexdigest()
+
+
+def git_blob_sha(content: bytes) -> str:
+    # SHA-1 that git (and GitHub) assign to a blob with this content
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def _write_atomic(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class SourceIndex:
+    """Maps the digest of a source image (as sent by the image generator) to the digest of its stored PNG.
+
+    One small file per source under `root`, so concurrent runs never rewrite a shared file.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, source_key: str) -> Path:
+        return self.root / source_key[:2] / source_key
+
+    def get(self, source_key: str) -> Optional[str]:
+        try:
+            return self._path(source_key).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set(self, source_key: str, digest: str):
+        path = self._path(source_key)
+        if self.get(source_key) != digest:
+            _write_atomic(path, digest.encode('ascii'))
+
+
+class ImageStore:
+    """Content-addressed PNG storage: images are stored under the SHA-256 of their bytes.
+
+    `lookup` finds an image whose source was already stored, so callers can
+    skip decoding and encoding it again; `put_many` stores PNGs and returns
+    their URLs by image id.
+    """
+
+    def __init__(self, index: Optional[SourceIndex] = None):
+        self.index = index
+
+    def url(self, digest: str) -> str:
+        raise NotImplementedError
+
+    def contains(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def read(self, digest: str) -> bytes:
+        raise NotImplementedError
+
+    def lookup(self, source_key: str) -> Optional[str]:
+        """Digest of the stored PNG for this source, or None."""
+        digest = self.index.get(source_key) if self.index is not None else None
+        return digest if digest is not None and self.contains(digest) else None
+
+    def _store(self, pngs: Dict[str, bytes]):
+        raise NotImplementedError
+
+    def put_many(self, pngs: Dict[str, bytes], sources: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        digests = {image_id: content_digest(png) for image_id, png in pngs.items()}
+        by_digest = {}
+        for image_id, digest in digests.items():
+            by_digest.setdefault(digest, pngs[image_id])
+        self._store(by_digest)
+        if self.index is not None:
+            for image_id, source_key in (sources or {}).items():
+                if image_id in digests:
+                    self.index.set(source_key, digests[image_id])
+        return {image_id: self.url(digest) for image_id, digest in digests.items()}
+
+
+class LocalImageStore(ImageStore):
+    """Images written under `root` as `<xx>/<sha256>.png`; existing files are never rewritten."""
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        super().__init__(SourceIndex(os.path.join(root, 'sources')))
+        self.root = Path(root)
+        self.base_url = base_url.rstrip('/') if base_url else None
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.png"
+
+    def url(self, digest: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{digest[:2]}/{digest}.png"
+        return self.path(digest).resolve().as_uri()
+
+    def contains(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def read(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def _store(self, pngs: Dict[str, bytes]):
+        written = 0
+        for digest, png in pngs.items():
+            if not self.contains(digest):
+                _write_atomic(self.path(digest), png)
+                written += 1
+        logging.info(f"Stored {written} new images in {self.root} ({len(pngs) - written} already present)")
+
+
+class GitHubImageStore(ImageStore):
+    """Images committed to `assets/images/<sha256>.png` on a branch, all new ones in a single commit.
+
+    Blobs are created through the git data API and checked against their
+    locally computed SHA-1; paths already on the branch are skipped. Uploaded
+    images are mirrored in a local store so later runs can reuse them offline.
+    """
+
+    def __init__(self, get_repo: Callable[[], Any], repo_name: str, branch: str, mirror: LocalImageStore,
+                 workers: int = 4, prefix: str = 'assets/images'):
+        super().__init__(mirror.index)
+        self.get_repo = get_repo
+        self.repo_name = repo_name
+        self.branch = branch
+        self.mirror = mirror
+        self.workers = workers
+        self.prefix = prefix
+        # Commits move the branch one after the other: concurrent runs in a process
+        # would otherwise commit on the same parent and the second ref update would fail
+        self._commit_lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return f"{self.prefix}/{digest}.png"
+
+    def url(self, digest: str) -> str:
+        return f"https://raw.githubusercontent.com/{self.repo_name}/{self.branch}/{self.path(digest)}"
+
+    def contains(self, digest: str) -> bool:
+        # The mirror only receives images once their commit is on the branch
+        return self.mirror.contains(digest)
+
+    def read(self, digest: str) -> bytes:
+        return self.mirror.read(digest)
+
+    def _store(self, pngs: Dict[str, bytes]):
+        missing = {digest: png for digest, png in pngs.items() if not self.mirror.contains(digest)}
+        if not missing:
+            return
+        with self._commit_lock:
+            self._commit(missing, len(pngs))
+        self.mirror._store(missing)
+
+    def _commit(self, missing: Dict[str, bytes], total: int):
+        from github import InputGitTreeElement
+
+        repo = self.get_repo()
+        try:
+            ref = repo.get_git_ref(f"heads/{self.branch}")
+            base_commit = repo.get_git_commit(ref.object.sha)
+            existing = {element.path for element in repo.get_git_tree(base_commit.tree.sha, recursive=True).tree}
+            new = {digest: png for digest, png in missing.items() if self.path(digest) not in existing}
+
+            def create_blob(item):
+                digest, png = item
+                blob = repo.create_git_blob(base64.b64encode(png).decode(), "base64")
+                if blob.sha != git_blob_sha(png):
+                    raise ImageStoreError(f"Uploaded blob does not match local content for {self.path(digest)}")
+                return InputGitTreeElement(self.path(digest), "100644", "blob", sha=blob.sha)
+
+            if new:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-upload") as executor:
+                    elements = list(executor.map(create_blob, sorted(new.items())))
+                tree = repo.create_git_tree(elements, base_commit.tree)
+                commit = repo.create_git_commit(f"Add {len(elements)} images", tree, [base_commit])
+                ref.edit(commit.sha)
+                logging.info(f"Uploaded {len(elements)} images in commit {commit.sha} "
+                             f"({total - len(new)} already present)")
+        except ImageStoreError:
+            raise
+        except Exception as e:
+            raise ImageStoreError(f"Failed to upload images: {str(e)}")
@@ -0,0 +1,213 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Cells per side of the grid used to approximate long-range repulsion
+LAYOUT_GRID_SIZE = 16
+# Nodes processed per block when computing repulsion, bounding peak memory
+LAYOUT_BLOCK_SIZE = 8192
+# Coarsening stops once a level has fewer nodes than this
+LAYOUT_COARSEST_SIZE = 64
+
+
+def _repulsion(positions: np.ndarray, k: float, grid_size: int) -> np.ndarray:
+    """Grid approximation of all-pairs repulsion.
+
+    Nodes are binned into grid cells and each node is pushed away from the
+    centre of mass of every cell, weighted by the number of nodes in it,
+    which makes the cost O(n * cells) instead of O(n^2).
+    """
+    n = len(positions)
+    low = positions.min(axis=0)
+    span = np.maximum(positions.max(axis=0) - low, 1e-9)
+    cells = np.minimum(((positions - low) / span * grid_size).astype(np.int64), grid_size - 1)
+    cell_index = cells[:, 0] * grid_size + cells[:, 1]
+
+    num_cells = grid_size * grid_size
+    mass = np.bincount(cell_index, minlength=num_cells).astype(float)
+    occupied = np.flatnonzero(mass)
+    mass = mass[occupied]
+    centres = np.stack([
+        np.bincount(cell_index, weights=positions[:, 0], minlength=num_cells)[occupied],
+        np.bincount(cell_index, weights=positions[:, 1], minlength=num_cells)[occupied],
+    ], axis=1) / mass[:, None]
+
+    displacement = np.empty_like(positions)
+    centre_norms = (centres ** 2).sum(axis=1)
+    min_distance_sq = (k * 0.01) ** 2
+    for start in range(0, n, LAYOUT_BLOCK_SIZE):
+        block = positions[start:start + LAYOUT_BLOCK_SIZE]
+        # Squared distances to every cell centre via |p|^2 + |c|^2 - 2 p.c (one BLAS product)
+        distance_sq = (block ** 2).sum(axis=1)[:, None] + centre_norms[None, :] - 2 * block @ centres.T
+        # Fruchterman-Reingold repulsion k^2 / d along the unit vector (p - c) / d
+        weights = mass * (k * k) / np.maximum(distance_sq, min_distance_sq)
+        displacement[start:start + LAYOUT_BLOCK_SIZE] = block * weights.sum(axis=1)[:, None] - weights @ centres
+    return displacement
+
+
+def _attraction(positions: np.ndarray, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray,
+                k: float) -> np.ndarray:
+    n = len(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    dx, dy = x[sources] - x[targets], y[sources] - y[targets]
+    # Fruchterman-Reingold attraction d^2 / k along the unit vector delta / d, i.e. delta * d / k
+    scale = np.sqrt(dx * dx + dy * dy) * weights / k
+    displacement = np.empty_like(positions)
+    for axis, delta in enumerate((dx * scale, dy * scale)):
+        displacement[:, axis] = (np.bincount(targets, weights=delta, minlength=n)
+                                 - np.bincount(sources, weights=delta, minlength=n))
+    return displacement
+
+
+def force_directed(positions: np.ndarray, sources: np.ndarray, targets: np.ndarray, iterations: int = 50,
+                   size: float = 1000.0, grid_size: int = LAYOUT_GRID_SIZE,
+                   weights: Optional[np.ndarray] = None) -> np.ndarray:
+    n = len(positions)
+    if n < 2:
+        return positions
+    if weights is None:
+        weights = np.ones(len(sources))
+    k = size / np.sqrt(n)
+    temperature = size / 10
+    positions = positions.copy()
+    for _ in range(iterations):
+        displacement = (_repulsion(positions, k, grid_size)
+                        + _attraction(positions, sources, targets, weights, k))
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= 0.95
+    return positions
+
+
+def coarsen(num_nodes: int, sources: np.ndarray, targets: np.ndarray, rng: np.random.Generator,
+            rounds: int = 3) -> Tuple[np.ndarray, int]:
+    """Vectorised handshake matching: returns the coarse node of every node and the coarse node count.
+
+    Each round gives every remaining edge a random priority; an edge is
+    matched when it is the top-priority edge of both its endpoints.
+    """
+    matched = np.full(num_nodes, -1, dtype=np.int64)
+    coarse_count = 0
+    keep = sources != targets
+    edge_sources, edge_targets = sources[keep], targets[keep]
+    num_edges = len(edge_sources)
+    if num_edges:
+        # Incident edges grouped by node once; each round only changes the priorities
+        endpoints = np.concatenate([edge_sources, edge_targets])
+        order = np.argsort(endpoints, kind="stable")
+        incident_edges = np.concatenate([np.arange(num_edges)] * 2)[order]
+        sorted_endpoints = endpoints[order]
+        group_starts = np.flatnonzero(np.r_[True, sorted_endpoints[1:] != sorted_endpoints[:-1]])
+        group_nodes = sorted_endpoints[group_starts]
+    for _ in range(rounds if num_edges else 0):
+        live = (matched[edge_sources] < 0) & (matched[edge_targets] < 0)
+        if not live.any():
+            break
+        priority = np.where(live, rng.permutation(num_edges), -1)
+        best = np.full(num_nodes, -1, dtype=np.int64)
+        best[group_nodes] = np.maximum.reduceat(priority[incident_edges], group_starts)
+        winners = live & (best[edge_sources] == priority) & (best[edge_targets] == priority)
+        new_ids = np.arange(coarse_count, coarse_count + int(winners.sum()))
+        matched[edge_sources[winners]] = new_ids
+        matched[edge_targets[winners]] = new_ids
+        coarse_count += len(new_ids)
+    unmatched = np.flatnonzero(matched < 0)
+    matched[unmatched] = np.arange(coarse_count, coarse_count + len(unmatched))
+    return matched, coarse_count + len(unmatched)
+
+
+def compute_layout(num_nodes: int, sources: np.ndarray, targets: np.ndarray, size: float = 1000.0,
+                   iterations: int = 50, multilevel: bool = True, seed: int = 0) -> np.ndarray:
+    """Node coordinates in a `size` x `size` square, deterministic for a given seed."""
+    rng = np.random.default_rng(seed)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if num_nodes == 0:
+        return np.zeros((0, 2))
+
+    levels = [(num_nodes, sources, targets, np.ones(len(sources)), None)]
+    while multilevel and levels[-1][0] > LAYOUT_COARSEST_SIZE:
+        n, level_sources, level_targets, level_weights, _ = levels[-1]
+        parent, coarse_n = coarsen(n, level_sources, level_targets, rng)
+        if coarse_n > n * 0.9:
+            break
+        coarse_sources, coarse_targets = parent[level_sources], parent[level_targets]
+        keep = coarse_sources != coarse_targets
+        # Parallel coarse edges collapse into one edge carrying their total weight
+        keys, inverse = np.unique(coarse_sources[keep] * coarse_n + coarse_targets[keep], return_inverse=True)
+        coarse_weights = np.bincount(inverse, weights=level_weights[keep], minlength=len(keys))
+        levels.append((coarse_n, keys // coarse_n, keys % coarse_n, coarse_weights, parent))
+
+    # Lay out the coarsest level, then place every child on its parent and refine
+    n, level_sources, level_targets, level_weights, _ = levels[-1]
+    positions = force_directed(rng.uniform(0, size, (n, 2)), level_sources, level_targets, iterations, size,
+                               weights=level_weights)
+    for depth in range(len(levels) - 1, 0, -1):
+        parent = levels[depth][4]
+        n, level_sources, level_targets, level_weights, _ = levels[depth - 1]
+        jitter = rng.normal(0, size / np.sqrt(n) / 4, (n, 2))
+        positions = force_directed(positions[parent] + jitter, level_sources, level_targets,
+                                   max(iterations // 4, 5), size, weights=level_weights)
+
+    # Fit into the drawing area with a 5% margin
+    low = positions.min(axis=0)
+    span = np.maximum(positions.max(axis=0) - low, 1e-9)
+    return (positions - low) / span.max() * size * 0.9 + size * 0.05
+
+
+# Keys under which the graph designer may list nodes and edges
+DESIGN_NODE_KEYS = ("nœuds", "nodes")
+DESIGN_EDGE_KEYS = ("arêtes", "edges", "liens")
+
+
+def design_elements(graph_design: Any) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+    """Node ids and edges spelled out by the graph designer, or None if it gave no nodes."""
+    if not isinstance(graph_design, dict):
+        return None
+    nodes = next((graph_design[key] for key in DESIGN_NODE_KEYS if graph_design.get(key)), None)
+    edges = next((graph_design[key] for key in DESIGN_EDGE_KEYS if graph_design.get(key)), None)
+    if not isinstance(nodes, list) or not nodes:
+        return None
+    ids = [str(node.get("id")) if isinstance(node, dict) else str(node) for node in nodes]
+    pairs = []
+    for edge in edges if isinstance(edges, list) else []:
+        if isinstance(edge, dict):
+            source = edge.get("source", edge.get("de", edge.get("from")))
+            target = edge.get("target", edge.get("à", edge.get("to")))
+            if source is not None and target is not None:
+                pairs.append((str(source), str(target)))
+    return ids, pairs
+
+
+def analysis_elements(data_analysis: Any) -> Tuple[List[str], List[Tuple[str, str]]]:
+    data_analysis = data_analysis if isinstance(data_analysis, dict) else {}
+    ids = [str(element) for element in data_analysis.get("éléments_clés", [])]
+    pairs = [(str(relation.get("de")), str(relation.get("à")))
+             for relation in data_analysis.get("relations", []) if isinstance(relation, dict)]
+    return ids, pairs
+
+
+def layout_elements(ids: List[str], pairs: List[Tuple[str, str]], size: float = 1000.0,
+                    iterations: int = 50, precision: int = 1) -> Optional[Dict[str, List[float]]]:
+    """Precomputed {node id: [x, y]} positions; edge endpoints missing from `ids` are added."""
+    if not ids:
+        return None
+    ids = list(ids)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    for source, target in pairs:
+        for node_id in (source, target):
+            if node_id not in index:
+                index[node_id] = len(ids)
+                ids.append(node_id)
+    sources = np.array([index[source] for source, _ in pairs], dtype=np.int64)
+    targets = np.array([index[target] for _, target in pairs], dtype=np.int64)
+    positions = np.round(compute_layout(len(ids), sources, targets, size, iterations), precision)
+    return dict(zip(ids, positions.tolist()))
+
+
+def layout_design(graph_design: Any, data_analysis: Any, size: float = 1000.0,
+                  iterations: int = 50, precision: int = 1) -> Optional[Dict[str, List[float]]]:
+    """Precomputed {node id: [x, y]} positions for the SVG/JS generators."""
+    # Prefer nodes/edges spelled out by the graph designer, else those of the analysis
+    ids, pairs = design_elements(graph_design) or analysis_elements(data_analysis)
+    return layout_elements(ids, pairs, size, iterations, precision)
@@ -1,14 +1,32 @@
+import contextlib
+import contextvars
 import json
-import requests
 import logging
-import base64
-from github import Github, GithubException
-from io import BytesIO
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 import os
 
+# PyGithub, requests, PIL and the NumPy-based modules (graph_analysis, layout,
+# renderer) are imported where they are first used, so that importing this
+# module stays fast and needs no network
+from bundle import BundleWriter
+from cache import ResponseCache, make_cache_key
+from compaction import PROVIDER_INPUT_TOKENS, PromptBudgetError, compact_input, estimate_tokens
+from context import AppContext
+from data_loader import RawData, input_size, read_text
+from image_prep import prepare_image, prepare_png, qa_images
+from image_store import GitHubImageStore, ImageStore, ImageStoreError, LocalImageStore, source_digest
+from manifest import RunManifest, fingerprint
+from optimizer import OPTIMIZER_VERSION, optimize_code
+from partition import merge_analyses, partition_input
+from rate_limit import CircuitOpenError, get_gate, request_priority
+from routing import IMAGE_PROVIDERS, Route, parse_agent_routes, run_routes
+from scheduler import Stage, publish, run_stages
+from streaming import IncrementalJSONParser, StreamError, claude_deltas, collect_text, deepseek_deltas, iter_sse_data
+from tracing import current_span, span
+from validation import OutputError, check_schema, parse_output
+
 # Load environment variables
 load_dotenv()
 
@@ -16,14 +34,65 @@ load_dotenv()
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 REPO_NAME = os.getenv('REPO_NAME')
 BRANCH_NAME = os.getenv('BRANCH_NAME')
+GITHUB_API_URL = os.getenv('GITHUB_API_URL')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL')
 CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
 CLAUDE_API_URL = os.getenv('CLAUDE_API_URL')
-
-# Initialize GitHub API
-g = Github(GITHUB_TOKEN)
-repo = g.get_repo(REPO_NAME)
+DEEPSEEK_MODEL = "deepseek-coder"
+DEEPSEEK_TEMPERATURE = 0.7
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+MAX_CONCURRENT_STAGES = int(os.getenv('MAX_CONCURRENT_STAGES', '4'))
+# Inputs larger than this (in characters) are analysed chunk by chunk
+ANALYSIS_CHUNK_CHARS = int(os.getenv('ANALYSIS_CHUNK_CHARS', '60000'))
+ANALYSIS_MAX_WORKERS = int(os.getenv('ANALYSIS_MAX_WORKERS', '4'))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '4'))
+# Image storage: "github" (commits to REPO_NAME) or "local" (content-addressed files in IMAGE_STORE_DIR)
+IMAGE_STORE = os.getenv('IMAGE_STORE', 'github')
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'assets/images')
+IMAGE_BASE_URL = os.getenv('IMAGE_BASE_URL')
+# Local copy of the images uploaded to GitHub, so later runs skip them
+IMAGE_MIRROR_DIR = os.getenv('IMAGE_MIRROR_DIR', '.cache/learn-anything/images')
+# SVG/JS rendering: "llm", "local", or "auto" (local from RENDER_LOCAL_MIN_NODES nodes)
+RENDER_MODE = os.getenv('RENDER_MODE', 'auto')
+RENDER_LOCAL_MIN_NODES = int(os.getenv('RENDER_LOCAL_MIN_NODES', '200'))
+# Ask the svg_generator agent for a stylesheet when rendering locally
+STYLE_WITH_LLM = os.getenv('STYLE_WITH_LLM', 'false').lower() in ('1', 'true', 'yes')
+# Stage versions of the local code (graph_analysis.py, layout.py, renderer.py): bump one when its output
+# changes, so that outputs stored in a manifest are recomputed
+LOCAL_ANALYSIS_VERSION = "analysis-1"
+LAYOUT_VERSION = "layout-1"
+RENDERER_VERSION = "renderer-1"
+# Step 7: "local" (deterministic optimizer, no API call) or "llm" (performance_optimizer agent)
+OPTIMIZE_MODE = os.getenv('OPTIMIZE_MODE', 'local')
+# Receive completions as server-sent events, so that JSON fields can be handed on as they arrive
+API_STREAM = os.getenv('API_STREAM', 'true').lower() in ('1', 'true', 'yes')
+# Providers and models per agent, cheapest first, e.g. {"orchestrator": ["deepseek:deepseek-chat", "claude:..."]};
+# agents not listed use DeepSeek, or Claude for the quality checker
+AGENT_ROUTES = parse_agent_routes(os.getenv('AGENT_ROUTES', ''), providers=PROVIDER_INPUT_TOKENS)
+# Agents answering with code rather than JSON: their answers are not parsed before being accepted
+CODE_AGENTS = {"svg_generator", "js_generator"}
+# Shape of the JSON answers, checked before later stages use them (subset of JSON Schema, see validation.py).
+# Only what the pipeline reads is required; other fields are free
+AGENT_SCHEMAS = {
+    "orchestrator": {"type": "object"},
+    "data_analyzer": {"type": "object", "properties": {
+        "éléments_clés": {"type": "array"},
+        "relations": {"type": "array", "items": {"type": "object"}},
+        "hiérarchie": {"type": "object", "additionalProperties": {"type": "array"}}}},
+    "graph_designer": {"type": "object", "properties": {
+        key: {"type": "array"} for key in ("nœuds", "nodes", "arêtes", "edges", "liens")}},
+    "image_generator": {"type": "object", "required": ["images"], "properties": {
+        "images": {"type": "array", "items": {"type": "object", "required": ["id", "content"],
+                                              "properties": {"content": {"type": "string"}}}}}},
+    "performance_optimizer": {"type": "object", "required": ["code_optimisé"], "properties": {
+        "code_optimisé": {"type": "object", "required": ["svg", "js"],
+                          "properties": {"svg": {"type": "string"}, "js": {"type": "string"}}}}},
+    "quality_checker": {"type": "object"},
+}
+# Sent back to an agent whose answer could not be used, with the error
+RETRY_PROMPT = ("Votre réponse précédente est inutilisable : {error}. Répondez de nouveau, uniquement avec "
+                "l'objet JSON demandé, complet et sans texte autour.")
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,82 +101,148 @@ class LearnEverythingError(Exception):
     """Custom exception for Learn Everything application"""
     pass
 
-def call_deepseek_api(messages: List[Dict[str, str]]) -> str:
+# Clients (GitHub, HTTP) are created on first use, see AppContext
+context: AppContext = None
+
+def set_context(app_context: AppContext):
+    global context
+    context = app_context
+
+def get_context() -> AppContext:
+    global context
+    if context is None:
+        context = AppContext(GITHUB_TOKEN, REPO_NAME, GITHUB_API_URL)
+    return context
+
+def call_with_gate(provider: str, send):
+    # Rate limiting, retries with backoff and the circuit breaker are shared by all calls to a provider
+    try:
+        return get_gate(provider).call(send)
+    except CircuitOpenError as e:
+        raise LearnEverythingError(str(e))
+
+def post_json(provider: str, url: str, headers: Dict[str, str], data: Dict[str, Any]):
+    # Serialised once, so that retries resend the same bytes and the request size is known
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    current_span().set(request_bytes=len(body))
+    return call_with_gate(provider, lambda: get_context().transport.post(url, headers=headers, data=body,
+                                                                         stream=API_STREAM))
+
+def record_usage(usage: Dict[str, Any]):
+    # DeepSeek reports prompt/completion tokens, Claude input/output tokens
+    trace = current_span()
+    input_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+    output_tokens = usage.get("completion_tokens", usage.get("output_tokens"))
+    if input_tokens is not None:
+        trace.set(input_tokens=input_tokens)
+    if output_tokens is not None:
+        trace.set(output_tokens=output_tokens)
+
+def read_completion(response, deltas, extract, on_text=None) -> str:
+    # Streamed responses are read event by event; others (or servers ignoring `stream`) in one piece
+    trace = current_span()
+    usage = {}
+    try:
+        if "text/event-stream" in response.headers.get("Content-Type", ""):
+            def counted(lines):
+                for line in lines:
+                    trace.add(response_bytes=len(line) + 1)
+                    yield line
+            try:
+                text = collect_text(deltas(iter_sse_data(counted(response.iter_lines(chunk_size=None))), usage),
+                                    on_text)
+            except (StreamError, json.JSONDecodeError) as e:
+                raise LearnEverythingError(f"Streamed response could not be read: {str(e)}")
+        else:
+            trace.set(response_bytes=len(response.content))
+            body = response.json()
+            usage = body.get("usage") or {}
+            text = extract(body)
+            if on_text is not None:
+                on_text(text)
+    finally:
+        # Also when the stream fails, or a hedge that lost the race stops reading: the connection goes back
+        # to the pool instead of being held until garbage collection
+        response.close()
+    record_usage(usage)
+    return text
+
+def call_deepseek_api(messages: List[Dict[str, str]], on_text=None, model: str = None) -> str:
+    model = model or DEEPSEEK_MODEL
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
     }
     data = {
-        "model": "deepseek-coder",
+        "model": model,
         "messages": messages,
-        "temperature": 0.7
+        "temperature": DEEPSEEK_TEMPERATURE,
+        "stream": API_STREAM
     }
-    response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-    if response.status_code != 200:
-        raise LearnEverythingError(f"DeepSeek API call failed with status {response.status_code}: {response.text}")
-    return response.json()['choices'][0]['message']['content']
-
-def call_claude_api(messages: List[Dict[str, str]], images: List[Dict[str, bytes]] = None) -> str:
+    if API_STREAM:
+        # Token usage is only sent at the end of a stream when asked for
+        data["stream_options"] = {"include_usage": True}
+    with span("api:deepseek", "api", model=model, stream=API_STREAM):
+        response = post_json("deepseek", DEEPSEEK_API_URL, headers, data)
+        if response.status_code != 200:
+            with response:
+                raise LearnEverythingError(f"DeepSeek API call failed with status {response.status_code}: "
+                                           f"{response.text}")
+        return read_completion(response, deepseek_deltas, lambda body: body['choices'][0]['message']['content'],
+                               on_text)
+
+def call_claude_api(messages: List[Dict[str, str]], images: List[Dict[str, bytes]] = None, on_text=None,
+                    model: str = None) -> str:
+    model = model or CLAUDE_MODEL
     headers = {
         "Content-Type": "application/json",
         "X-API-Key": CLAUDE_API_KEY,
         "anthropic-version": "2023-06-01"
     }
     data = {
-        "model": "claude-3-sonnet-20240229",
+        "model": model,
         "max_tokens": 1024,
-        "messages": messages
+        "messages": messages,
+        "stream": API_STREAM
     }
     if images:
         data["images"] = images
     
-    response = requests.post(CLAUDE_API_URL, headers=headers, json=data)
-    if response.status_code != 200:
-        raise LearnEverythingError(f"Claude API call failed with status {response.status_code}: {response.text}")
-    return response.json()['content'][0]['text']
-
-def upload_image_to_github(image_data: str, image_id: str) -> Tuple[str, bytes]:
-    try:
-        # Decode base64 image
-        image_content = base64.b64decode(image_data.split(',')[1])
-        
-        # Open image with PIL
-        image = Image.open(BytesIO(image_content))
-        
-        # Convert to PNG
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        png_content = buffered.getvalue()
-        
-        # Prepare file content for GitHub
-        file_content = base64.b64encode(png_content).decode()
-        
-        # File path in the repository
-        file_path = f'assets/images/{image_id}.png'
-        
-        try:
-            # Check if file already exists
-            contents = repo.get_contents(file_path, ref=BRANCH_NAME)
-            repo.update_file(file_path, f"Update image {image_id}", file_content, contents.sha, branch=BRANCH_NAME)
-        except GithubException:
-            # If file doesn't exist, create it
-            repo.create_file(file_path, f"Add image {image_id}", file_content, branch=BRANCH_NAME)
-        
-        # Return the URL of the image on GitHub and the PNG content
-        return f"https://raw.githubusercontent.com/{REPO_NAME}/{BRANCH_NAME}/{file_path}", png_content
-    
-    except Exception as e:
-        logging.error(f"Error uploading image to GitHub: {str(e)}")
-        raise LearnEverythingError(f"Failed to upload image: {str(e)}")
-
-def get_image_from_github(image_url: str) -> bytes:
+    with span("api:claude", "api", model=model, stream=API_STREAM, images=len(images or [])):
+        response = post_json("claude", CLAUDE_API_URL, headers, data)
+        if response.status_code != 200:
+            with response:
+                raise LearnEverythingError(f"Claude API call failed with status {response.status_code}: "
+                                           f"{response.text}")
+        return read_completion(response, claude_deltas, lambda body: body['content'][0]['text'], on_text)
+
+# Image store used by handle_image_generation, built from the configuration on first use
+image_store: ImageStore = None
+
+def create_image_store(kind: str = None) -> ImageStore:
+    kind = kind or IMAGE_STORE
+    if kind == 'local':
+        return LocalImageStore(IMAGE_STORE_DIR, IMAGE_BASE_URL)
+    if kind == 'github':
+        return GitHubImageStore(lambda: get_context().repo, REPO_NAME, BRANCH_NAME, LocalImageStore(IMAGE_MIRROR_DIR), IMAGE_WORKERS)
+    raise LearnEverythingError(f"Unknown image store: {kind}")
+
+def set_image_store(store: ImageStore):
+    global image_store
+    image_store = store
+
+def get_image_store() -> ImageStore:
+    global image_store
+    if image_store is None:
+        image_store = create_image_store()
+    return image_store
+
+def store_images(png_images: Dict[str, bytes], sources: Dict[str, str] = None) -> Dict[str, str]:
     try:
-        response = requests.get(image_url)
-        response.raise_for_status()
-        return response.content
-    except requests.RequestException as e:
-        logging.error(f"Error retrieving image from GitHub: {str(e)}")
-        raise LearnEverythingError(f"Failed to retrieve image: {str(e)}")
+        return get_image_store().put_many(png_images, sources)
+    except ImageStoreError as e:
+        logging.error(f"Error storing images: {str(e)}")
+        raise LearnEverythingError(str(e))
 
 # Agent templates
 agent_templates = {
@@ -123,6 +258,9 @@ agent_templates = {
     7. Fournissez un rapport final sur le processus et le résultat.
 
     Données brutes: {data}
+    Les listes d'enregistrements aux mêmes clés sont transmises sous forme de table :
+    {{"colonnes": ["clé1", "clé2", ...], "lignes": [["valeur1", "valeur2", ...], ...]}}, une ligne par enregistrement,
+    et "omis": nombre d'enregistrements non transmis quand la liste a été échantillonnée.
 
     Répondez au format JSON suivant:
     {{
@@ -142,6 +280,9 @@ agent_templates = {
     5. Fournissez une structure de données optimisée pour la création de graphes.
 
     Données brutes: {data}
+    Les listes d'enregistrements aux mêmes clés sont transmises sous forme de table :
+    {{"colonnes": ["clé1", "clé2", ...], "lignes": [["valeur1", "valeur2", ...], ...]}}, une ligne par enregistrement,
+    et "omis": nombre d'enregistrements non transmis quand la liste a été échantillonnée.
 
     Répondez au format JSON suivant:
     {{
@@ -155,118 +296,483 @@ agent_templates = {
     # ... (autres templates pour chaque agent)
 }
 
+# Optional response cache consulted by every Agent.run (see set_response_cache)
+response_cache: ResponseCache = None
+
+def set_response_cache(cache: ResponseCache):
+    global response_cache
+    response_cache = cache
+
+def field_reader(agent_name: str, on_field, schema: Dict[str, Any] = None):
+    """(on_text, restart): on_text hands each top-level JSON field to `on_field` as it completes, unless it
+    departs from its property in `schema`; restart() starts over on a new answer."""
+    properties = (schema or {}).get("properties", {})
+    parsers = [IncrementalJSONParser()]
+
+    def on_text(chunk: str):
+        if not parsers:
+            return
+        try:
+            fields = parsers[0].feed(chunk)
+        except json.JSONDecodeError as e:
+            # Not valid JSON as it arrives: callers still get the full text at the end
+            logging.debug(f"Agent {agent_name}: incremental parsing stopped ({str(e)})")
+            parsers.clear()
+            return
+        for key, value in fields:
+            if key in properties:
+                try:
+                    check_schema(value, properties[key], f"$.{key}")
+                except OutputError as e:
+                    # The whole answer will be rejected; nothing is handed on from it
+                    logging.debug(f"Agent {agent_name}: field {key} held back ({str(e)})")
+                    continue
+            on_field(key, value)
+
+    def restart():
+        parsers[:] = [IncrementalJSONParser()]
+    return on_text, restart
+
 class Agent:
-    def __init__(self, name: str, template: str, use_claude: bool = False):
+    """An LLM role: a template, the routes (provider and model) that serve it, and an optional
+    `validate(text)` that raises ValueError on an unusable answer, so the next route is tried, and
+    returns what it parsed from a usable one."""
+
+    def __init__(self, name: str, template: str, use_claude: bool = False, routes: List[Route] = None,
+                 validate=None):
         self.name = name
         self.template = template
-        self.use_claude = use_claude
-
-    def run(self, data: Any, images: List[Dict[str, bytes]] = None) -> str:
+        self.routes = routes or AGENT_ROUTES.get(name) or [
+            Route("claude", CLAUDE_MODEL) if use_claude else Route("deepseek", DEEPSEEK_MODEL)]
+        self.validate = validate
+
+    def run(self, data: Any, images: List[Dict[str, bytes]] = None, on_field=None,
+            feedback: List[Dict[str, str]] = None) -> str:
+        """Full response text; `on_field(key, value)` also receives each top-level JSON field as it completes.
+
+        `feedback` messages follow the request, e.g. a rejected answer and the reason it was rejected.
+        """
+        return self.answer(data, images, on_field, feedback)[0]
+
+    def answer(self, data: Any, images: List[Dict[str, bytes]] = None, on_field=None,
+               feedback: List[Dict[str, str]] = None) -> Tuple[str, Any]:
+        """Like run(), with what `validate` returned for the answer: None when it was not validated
+        here (no validator, an answer served from the cache, or no route gave a usable one)."""
+        with span(f"agent:{self.name}", "agent", retry=bool(feedback)) as trace:
+            response, validated = self._run(data, images, on_field, trace, feedback)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # Inputs and outputs can be large, so they are only formatted (and truncated) when debugging
+            debug_agent_output(self.name, data if isinstance(data, str) else json.dumps(data, ensure_ascii=False),
+                               response)
+        return response, validated
+
+    def prepare_input(self, data: Any, trace) -> str:
+        # Compact JSON with only the fields the agent uses and no empty ones, within the token budget of every route
+        budget = min(PROVIDER_INPUT_TOKENS[route.provider] for route in self.routes)
+        overhead = estimate_tokens(self.template)
+        try:
+            content, sampled = compact_input(self.name, data, budget, overhead)
+        except PromptBudgetError as e:
+            raise LearnEverythingError(str(e))
+        if sampled:
+            logging.warning(f"Agent {self.name}: input sampled to fit the budget of {budget} tokens")
+        trace.set(input_tokens_estimate=estimate_tokens(content) + overhead, sampled=sampled)
+        return content
+
+    def _run(self, data: Any, images: List[Dict[str, bytes]], on_field, trace,
+             feedback: List[Dict[str, str]] = None) -> Tuple[str, Any]:
+        on_text = restart = None
+        if on_field is not None:
+            on_text, restart = field_reader(self.name, on_field, AGENT_SCHEMAS.get(self.name))
         messages = [
             {"role": "system", "content": self.template},
-            {"role": "user", "content": json.dumps(data) if isinstance(data, dict) else str(data)}
-        ]
-        if self.use_claude:
-            return call_claude_api(messages, images)
-        else:
-            return call_deepseek_api(messages)
+            {"role": "user", "content": self.prepare_input(data, trace)}
+        ] + list(feedback or [])
+        routes = self.routes
+        if images:
+            routes = [route for route in routes if route.provider in IMAGE_PROVIDERS]
+            if not routes:
+                raise LearnEverythingError(f"Agent {self.name}: no route accepts images")
+        cache = response_cache
+        if cache is not None:
+            # Keyed by the first route: whichever route answered, the answer stands for this request
+            if routes[0].provider == "claude":
+                key = make_cache_key(routes[0].model, self.template, messages[1]["content"], None, images)
+            else:
+                key = make_cache_key(routes[0].model, self.template, messages[1]["content"], DEEPSEEK_TEMPERATURE)
+            # A new attempt after a rejected answer is never served the (rejected) cached one
+            cached = cache.get(key) if not feedback else None
+            trace.set(cache="hit" if cached is not None else "miss")
+            if cached is not None:
+                logging.info(f"Agent {self.name}: response served from cache")
+                if on_text is not None:
+                    on_text(cached)
+                return cached, None
+
+        def call(route: Route, route_on_text) -> str:
+            if route.provider == "claude":
+                return call_claude_api(messages, images, on_text=route_on_text, model=route.model)
+            return call_deepseek_api(messages, on_text=route_on_text, model=route.model)
+
+        response, _, validated = run_routes(routes, call, self.validate, on_text, on_reject=restart)
+
+        # Only usable answers are kept; one obtained on a new attempt stands for the original request
+        if cache is not None and (self.validate is None or validated is not None):
+            cache.set(key, response)
+        return response, validated
+
+    async def arun(self, data: Any, images: List[Dict[str, bytes]] = None) -> str:
+        # Runs on the transport's executor, which is sized to the connection pool
+        return await get_context().transport.run_async(self.run, data, images)
+
+def output_validator(name: str):
+    schema = AGENT_SCHEMAS.get(name)
+    return lambda text: parse_output(text, schema)
 
 # Create agents
-agents = {name: Agent(name, template, use_claude=(name == "quality_checker")) 
+agents = {name: Agent(name, template, use_claude=(name == "quality_checker"),
+                      validate=None if name in CODE_AGENTS else output_validator(name))
           for name, template in agent_templates.items()}
 
+# Attempts per agent answer (the first included), set from max_iterations for a pipeline run
+_answer_attempts = contextvars.ContextVar('answer_attempts', default=3)
+
+@contextlib.contextmanager
+def answer_attempts(attempts: int):
+    token = _answer_attempts.set(max(1, attempts))
+    try:
+        yield
+    finally:
+        _answer_attempts.reset(token)
+
+def ask_json(name: str, data: Any, images: List[Dict[str, bytes]] = None, on_field=None) -> Any:
+    """Parsed answer of agent `name`, checked against its schema.
+
+    An answer that is not valid JSON is repaired locally first (markdown
+    fences, trailing commas, truncated output). When that fails, only this
+    agent is asked again, with the error, up to the run's max_iterations
+    attempts; the other stages keep their outputs.
+    """
+    agent = agents[name]
+    schema = AGENT_SCHEMAS.get(name)
+    attempts = _answer_attempts.get()
+    feedback, error = None, None
+    for attempt in range(1, attempts + 1):
+        # Fields of a rejected answer may have been handed on: the scheduler restarts the stages that used
+        # them when this answer's fields differ
+        text, validated = agent.answer(data, images, on_field=on_field, feedback=feedback)
+        try:
+            # The agent's validator usually parsed the answer already
+            value, repaired = validated if validated is not None else parse_output(text, schema)
+        except OutputError as e:
+            logging.warning(f"Agent {name}: unusable answer (attempt {attempt}/{attempts}): {str(e)}")
+            current_span().add(answer_retries=1)
+            error = e
+            feedback = [{"role": "assistant", "content": text},
+                        {"role": "user", "content": RETRY_PROMPT.format(error=str(e))}]
+            continue
+        if repaired:
+            logging.info(f"Agent {name}: answer repaired locally")
+            current_span().add(answer_repairs=1)
+        return value
+    raise LearnEverythingError(f"Agent {name}: no usable answer after {attempts} attempts: {str(error)}")
+
 def handle_image_generation(graph_design: Dict) -> Tuple[str, List[Dict[str, bytes]]]:
-    images_response = agents["image_generator"].run(json.dumps(graph_design))
-    images_data = json.loads(images_response)
-    
-    image_contents = []
+    images_data = ask_json("image_generator", graph_design)
+    store = get_image_store()
+
+    # Images generated identically by an earlier run are neither decoded nor stored again
+    sources, urls, stored = {}, {}, {}
     for image in images_data["images"]:
+        sources[image["id"]] = source_digest(image["content"])
+        digest = store.lookup(sources[image["id"]])
+        if digest is not None:
+            urls[image["id"]] = store.url(digest)
+            stored[image["id"]] = store.read(digest)
+
+    def prepare(image):
+        # One decode per image gives both the PNG to store and the quality checker's thumbnail
         try:
-            image_url, png_content = upload_image_to_github(image["content"], image["id"])
-            image["url"] = image_url
-            del image["content"]  # Remove base64 content to save space
-            
-            # Verify that we can retrieve the image
-            retrieved_content = get_image_from_github(image_url)
-            if retrieved_content != png_content:
-                raise LearnEverythingError(f"Retrieved image content does not match uploaded content for image {image['id']}")
-            
-            image_contents.append({"type": "image/png", "data": base64.b64encode(png_content).decode()})
-            logging.info(f"Image {image['id']} uploaded and verified successfully")
-        except LearnEverythingError as e:
+            if image["id"] in stored:
+                return prepare_png(stored[image["id"]])
+            return prepare_image(image["content"])
+        except Exception as e:
             logging.error(f"Error handling image {image['id']}: {str(e)}")
-    
+            return None
+
+    # Images with the same source are prepared once; preparation runs on a bounded pool
+    unique = {}
+    for image in images_data["images"]:
+        unique.setdefault(sources[image["id"]], image)
+    with span("images:prepare", "images", images=len(unique), reused=len(urls)), \
+            ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-prepare") as executor:
+        prepared_sources = dict(zip(unique, executor.map(prepare, unique.values())))
+    prepared = {image["id"]: prepared_sources[sources[image["id"]]] for image in images_data["images"]}
+    new_images = {image_id: image.png for image_id, image in prepared.items()
+                  if image is not None and image_id not in urls}
+
+    try:
+        if new_images:
+            with span("images:store", "images", images=len(new_images),
+                      bytes=sum(len(png) for png in new_images.values())):
+                urls.update(store_images(new_images, {image_id: sources[image_id] for image_id in new_images}))
+    except LearnEverythingError as e:
+        logging.error(f"Error handling images: {str(e)}")
+
+    for image in images_data["images"]:
+        if image["id"] not in urls:
+            continue
+        image["url"] = urls[image["id"]]
+        del image["content"]  # Remove base64 content to save space
+        logging.info(f"Image {image['id']} stored at {image['url']}")
+    with span("images:qa", "images") as trace:
+        image_contents = qa_images(prepared[image["id"]] for image in images_data["images"] if image["id"] in urls)
+        trace.set(images=len(image_contents), bytes=sum(len(image["data"]) for image in image_contents))
+
     return json.dumps(images_data), image_contents
 
-def generate_interactive_graph(raw_data: str, max_iterations: int = 3) -> Dict[str, Any]:
+def run_local_analysis(inputs: Dict[str, Any]) -> Dict:
+    from graph_analysis import analyze_graph, load_graph
+
+    # Structured inputs (nodes/edges, entities/relationships) are analysed locally,
+    # streamed record by record into a compact graph rather than parsed whole
+    try:
+        graph = load_graph(inputs["raw_data"])
+    except json.JSONDecodeError:
+        graph = None
+    if graph is None:
+        return None
+    logging.info(f"Local graph analysis: {graph.num_nodes} nodes, {graph.num_edges} edges")
+    return analyze_graph(graph)
+
+def run_orchestrator(inputs: Dict[str, Any]) -> Dict:
+    from graph_analysis import summarize_analysis
+
+    logging.info("Step 1: Orchestration")
+    local_analysis = inputs["local_analysis"]
+    if local_analysis is not None:
+        orchestrator_input = {"résumé_des_données": summarize_analysis(local_analysis)}
+    else:
+        orchestrator_input = read_text(inputs["raw_data"])
+    orchestrator_output = ask_json("orchestrator", orchestrator_input)
+    return orchestrator_output
+
+def analyze_in_chunks(raw_data: RawData, max_chars: int = None) -> Dict:
+    max_chars = max_chars or ANALYSIS_CHUNK_CHARS
+    chunks = partition_input(raw_data, max_chars)
+    logging.info(f"Analysing {input_size(raw_data)} characters of data in {len(chunks)} chunks")
+
+    # executor.map keeps chunk order, so the merge is deterministic whatever the completion order
+    with ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis") as executor:
+        # Each chunk runs in a copy of the caller's context, so its request priority applies
+        partials = list(executor.map(
+            lambda chunk: contextvars.copy_context().run(ask_json, "data_analyzer", chunk),
+            chunks))
+    return merge_analyses(partials)
+
+def run_data_analyzer(inputs: Dict[str, Any]) -> Dict:
+    logging.info("Step 2: Data Analysis")
+    raw_data = inputs["raw_data"]
+    if inputs["local_analysis"] is not None:
+        data_analysis_output = inputs["local_analysis"]
+    elif input_size(raw_data) > ANALYSIS_CHUNK_CHARS:
+        data_analysis_output = analyze_in_chunks(raw_data)
+    else:
+        data_analysis_output = ask_json("data_analyzer", read_text(raw_data))
+    return data_analysis_output
+
+def design_elements(graph_design: Any):
+    from layout import design_elements as elements
+    return elements(graph_design)
+
+def run_graph_designer(inputs: Dict[str, Any]) -> Dict:
+    from graph_analysis import summarize_analysis
+    from layout import DESIGN_EDGE_KEYS, DESIGN_NODE_KEYS
+
+    logging.info("Step 3: Graph Design")
+    partial = {}
+    published = []
+
+    def on_field(key: str, value: Any):
+        # Layout can start as soon as the nodes and edges are complete, while the rest streams in
+        partial[key] = value
+        if (not published and any(k in partial for k in DESIGN_NODE_KEYS)
+                and any(k in partial for k in DESIGN_EDGE_KEYS)):
+            published.append(key)
+            publish("elements", design_elements(partial))
+
+    graph_design_output = ask_json("graph_designer", summarize_analysis(inputs["data_analyzer"]), on_field=on_field)
+    return graph_design_output
+
+def run_layout(inputs: Dict[str, Any]) -> Dict[str, List[float]]:
+    from layout import analysis_elements, layout_elements
+
+    logging.info("Computing graph layout")
+    ids, pairs = inputs["graph_designer.elements"] or analysis_elements(inputs["data_analyzer"])
+    return layout_elements(ids, pairs)
+
+def generator_input(inputs: Dict[str, Any]) -> Dict:
+    # The generators draw at precomputed positions instead of inventing their own
+    if inputs["layout"] is None:
+        return inputs["graph_designer"]
+    return {"graph_design": inputs["graph_designer"], "positions": inputs["layout"]}
+
+def use_local_renderer(inputs: Dict[str, Any]) -> bool:
+    positions = inputs["layout"]
+    if positions is None or RENDER_MODE == "llm":
+        return False
+    return RENDER_MODE == "local" or len(positions) >= RENDER_LOCAL_MIN_NODES
+
+def request_stylesheet(graph_design: Dict) -> str:
+    # Optional LLM styling pass: only the CSS is generated, never the drawing itself
+    return agents["svg_generator"].run({
+        "graph_design": graph_design,
+        "tâche": "Fournissez uniquement une feuille de style CSS pour les classes .edge, .node, .cluster et .label"
+    })
+
+def local_scene(inputs: Dict[str, Any]):
+    from layout import analysis_elements
+    from renderer import build_scene
+
+    # The edges drawn are the ones laid out: the designer's, else the analysis relations (as in run_layout)
+    _, edges = design_elements(inputs["graph_designer"]) or analysis_elements(inputs["data_analyzer"])
+    return build_scene(inputs["data_analyzer"], inputs["layout"], edges=edges)
+
+def run_svg_generator(inputs: Dict[str, Any]) -> str:
+    from renderer import iter_svg
+
+    logging.info("Step 4: SVG Generation")
+    if use_local_renderer(inputs):
+        stylesheet = request_stylesheet(inputs["graph_designer"]) if STYLE_WITH_LLM else None
+        scene = local_scene(inputs)
+        svg_code = "".join(iter_svg(scene, stylesheet=stylesheet))
+    else:
+        svg_code = agents["svg_generator"].run(generator_input(inputs))
+    logging.info("SVG code generated successfully")
+    return svg_code
+
+def run_js_generator(inputs: Dict[str, Any]) -> str:
+    from renderer import iter_js
+
+    logging.info("Step 5: JavaScript Generation")
+    if use_local_renderer(inputs):
+        js_code = "".join(iter_js(local_scene(inputs)))
+    else:
+        js_code = agents["js_generator"].run(generator_input(inputs))
+    logging.info("JavaScript code generated successfully")
+    return js_code
+
+def run_image_generator(inputs: Dict[str, Any]) -> Tuple[Dict, List[Dict[str, bytes]]]:
+    logging.info("Step 6: Image Generation and Verification")
+    images_response, image_contents = handle_image_generation(inputs["graph_designer"])
+    return json.loads(images_response), image_contents
+
+def run_performance_optimizer(inputs: Dict[str, Any]) -> Dict:
+    logging.info("Step 7: Performance Optimization")
+    if OPTIMIZE_MODE == "llm":
+        optimized_code_json = ask_json("performance_optimizer", {
+            "svg_code": inputs["svg_generator"],
+            "js_code": inputs["js_generator"]
+        })
+    else:
+        optimized_code_json = optimize_code(inputs["svg_generator"], inputs["js_generator"])
+        sizes = optimized_code_json["tailles"]
+        current_span().set(svg_bytes_in=sizes["svg"]["avant"], svg_bytes_out=sizes["svg"]["après"],
+                           js_bytes_in=sizes["js"]["avant"], js_bytes_out=sizes["js"]["après"])
+        logging.info(f"SVG {sizes['svg']['avant']} -> {sizes['svg']['après']} bytes, "
+                     f"JavaScript {sizes['js']['avant']} -> {sizes['js']['après']} bytes")
+    logging.info("Code optimization completed")
+    return optimized_code_json
+
+def run_quality_checker(inputs: Dict[str, Any]) -> Dict:
+    logging.info("Step 8: Quality Check")
+    optimized_code_json = inputs["performance_optimizer"]
+    images_data, image_contents = inputs["image_generator"]
+    quality_check_data = {
+        "svg_code": optimized_code_json["code_optimisé"]["svg"],
+        "js_code": optimized_code_json["code_optimisé"]["js"],
+        "images": images_data["images"]
+    }
+    quality_report_json = ask_json("quality_checker", quality_check_data, image_contents)
+    logging.info("Quality report received")
+    return quality_report_json
+
+def agent_version(name: str) -> str:
+    # Stored stage outputs are invalidated when the agent's template changes
+    return fingerprint(agent_templates.get(name, ""))
+
+def generator_version(name: str) -> str:
+    # Drawn by the agent or by the local renderer depending on the settings, which are part of the version
+    return f"{agent_version(name)}:{RENDERER_VERSION}:{RENDER_MODE}:{RENDER_LOCAL_MIN_NODES}:{STYLE_WITH_LLM}"
+
+# Pipeline dependency graph: stages only wait for the outputs they consume, so
+# orchestrator/data_analyzer and svg/js/image generation run concurrently.
+pipeline_stages = [
+    Stage("local_analysis", run_local_analysis, deps=["raw_data"], version=LOCAL_ANALYSIS_VERSION),
+    Stage("orchestrator", run_orchestrator, deps=["raw_data", "local_analysis"], version=agent_version("orchestrator")),
+    Stage("data_analyzer", run_data_analyzer, deps=["raw_data", "local_analysis"],
+          version=agent_version("data_analyzer")),
+    Stage("graph_designer", run_graph_designer, deps=["data_analyzer"], version=agent_version("graph_designer"),
+          fields={"elements": design_elements}),
+    Stage("layout", run_layout, deps=["graph_designer.elements", "data_analyzer"], version=LAYOUT_VERSION),
+    Stage("svg_generator", run_svg_generator, deps=["graph_designer", "data_analyzer", "layout"],
+          version=generator_version("svg_generator")),
+    Stage("js_generator", run_js_generator, deps=["graph_designer", "data_analyzer", "layout"],
+          version=generator_version("js_generator")),
+    Stage("image_generator", run_image_generator, deps=["graph_designer"], version=agent_version("image_generator")),
+    Stage("performance_optimizer", run_performance_optimizer, deps=["svg_generator", "js_generator"],
+          version=agent_version("performance_optimizer") if OPTIMIZE_MODE == "llm" else OPTIMIZER_VERSION),
+    Stage("quality_checker", run_quality_checker, deps=["performance_optimizer", "image_generator"],
+          version=agent_version("quality_checker")),
+]
+
+# Fields of the result: the stage providing each one and, if not the whole output, the part of it that is kept
+RESULT_FIELDS = {
+    "orchestrator_output": ("orchestrator", None),
+    "data_analysis": ("data_analyzer", None),
+    "graph_design": ("graph_designer", None),
+    "svg_code": ("svg_generator", None),
+    "js_code": ("js_generator", None),
+    "images": ("image_generator", lambda output: output[0]["images"]),
+    "optimized_code": ("performance_optimizer", None),
+    "quality_report": ("quality_checker", None),
+}
+
+def result_field(key: str, output: Any) -> Any:
+    extract = RESULT_FIELDS[key][1]
+    return output if extract is None else extract(output)
+
+def bundle_writer(bundle: BundleWriter):
+    # Each result field goes to the bundle as soon as its stage completes (or is reused)
+    fields = {}
+    for key, (stage, _) in RESULT_FIELDS.items():
+        fields.setdefault(stage, []).append(key)
+
+    def on_output(stage: str, output: Any):
+        for key in fields.get(stage, ()):
+            bundle.write(key, result_field(key, output))
+    return on_output
+
+def generate_interactive_graph(raw_data: RawData, max_iterations: int = 3,
+                               manifest: RunManifest = None, priority: int = None,
+                               bundle: BundleWriter = None) -> Dict[str, Any]:
+    """Run the pipeline and return the result fields; with `bundle`, they are also written there while it runs."""
     try:
         logging.info("Starting interactive graph generation process")
 
-        # Step 1: Orchestration
-        logging.info("Step 1: Orchestration")
-        orchestrator_response = agents["orchestrator"].run(raw_data)
-        orchestrator_output = json.loads(orchestrator_response)
-        logging.info(f"Orchestrator output: {orchestrator_output}")
-
-        # Step 2: Data Analysis
-        logging.info("Step 2: Data Analysis")
-        data_analysis = agents["data_analyzer"].run(raw_data)
-        data_analysis_output = json.loads(data_analysis)
-        logging.info(f"Data analysis output: {data_analysis_output}")
-
-        # Step 3: Graph Design
-        logging.info("Step 3: Graph Design")
-        graph_design = agents["graph_designer"].run(data_analysis)
-        graph_design_output = json.loads(graph_design)
-        logging.info(f"Graph design output: {graph_design_output}")
-
-        # Step 4: SVG Generation
-        logging.info("Step 4: SVG Generation")
-        svg_code = agents["svg_generator"].run(graph_design)
-        logging.info("SVG code generated successfully")
-
-        # Step 5: JavaScript Generation
-        logging.info("Step 5: JavaScript Generation")
-        js_code = agents["js_generator"].run(graph_design)
-        logging.info("JavaScript code generated successfully")
-
-        # Step 6: Image Generation and Verification
-        logging.info("Step 6: Image Generation and Verification")
-        images_response, image_contents = handle_image_generation(graph_design_output)
-        images_data = json.loads(images_response)
-
-        # Step 7: Performance Optimization
-        logging.info("Step 7: Performance Optimization")
-        optimized_code = agents["performance_optimizer"].run({
-            "svg_code": svg_code, 
-            "js_code": js_code
-        })
-        optimized_code_json = json.loads(optimized_code)
-        logging.info("Code optimization completed")
-
-        # Step 8: Quality Check
-        logging.info("Step 8: Quality Check")
-        quality_check_data = {
-            "svg_code": optimized_code_json["code_optimisé"]["svg"],
-            "js_code": optimized_code_json["code_optimisé"]["js"],
-            "images": images_data["images"]
-        }
-        quality_report = agents["quality_checker"].run(quality_check_data, image_contents)
-        quality_report_json = json.loads(quality_report)
-        logging.info(f"Quality report: {quality_report_json}")
+        # Each stage may ask its agent again up to max_iterations times; completed stages are never rerun
+        with request_priority(priority) if priority is not None else contextlib.nullcontext(), \
+                answer_attempts(max_iterations), span("pipeline", "pipeline", input_bytes=input_size(raw_data)):
+            outputs = run_stages(pipeline_stages, {"raw_data": raw_data}, max_workers=MAX_CONCURRENT_STAGES,
+                                 manifest=manifest, on_output=bundle_writer(bundle) if bundle is not None else None)
+        result = {key: result_field(key, outputs[stage]) for key, (stage, _) in RESULT_FIELDS.items()}
+        if bundle is not None:
+            with span("bundle:finish", "io"):
+                bundle.finish(RESULT_FIELDS)
 
         logging.info("Interactive graph generation process completed successfully")
 
-        return {
-            "orchestrator_output": orchestrator_output,
-            "data_analysis": data_analysis_output,
-            "graph_design": graph_design_output,
-            "svg_code": svg_code,
-            "js_code": js_code,
-            "images": images_data["images"],
-            "optimized_code": optimized_code_json,
-            "quality_report": quality_report_json
-        }
+        return result
 
     except LearnEverythingError as e:
         logging.error(f"Learn Everything Error: {str(e)}")
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+
+def fingerprint(value: Any) -> str:
+    # Values that are not held in memory (an input file) hash their own content
+    if hasattr(value, 'fingerprint'):
+        return value.fingerprint()
+    if isinstance(value, str):
+        payload = value
+    else:
+        payload = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def stage_fingerprint(name: str, version: str, input_fingerprints: Dict[str, str]) -> str:
+    return fingerprint({"stage": name, "version": version, "inputs": input_fingerprints})
+
+
+class RunManifest:
+    """Per-stage input fingerprints and outputs of a pipeline run.
+
+    A stage whose input fingerprint matches the recorded one is not run
+    again; its stored output is reused instead.
+    """
+
+    def __init__(self, stages: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.stages = stages or {}
+        self.reused = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'RunManifest':
+        with open(path, 'r') as file:
+            data = json.load(file)
+        if data.get("version") != MANIFEST_VERSION:
+            logging.warning(f"Ignoring manifest {path} with unsupported version {data.get('version')}")
+            return cls()
+        return cls(data.get("stages", {}))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"version": MANIFEST_VERSION, "stages": self.stages}, file)
+        os.replace(tmp_path, path)
+
+    def lookup(self, name: str, input_fingerprint: str) -> Tuple[bool, Any, Optional[str]]:
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None or entry["input_fingerprint"] != input_fingerprint:
+                return False, None, None
+            self.reused.append(name)
+            return True, entry["output"], entry["output_fingerprint"]
+
+    def record(self, name: str, input_fingerprint: str, output: Any) -> str:
+        output_fingerprint = fingerprint(output)
+        with self._lock:
+            self.stages[name] = {
+                "input_fingerprint": input_fingerprint,
+                "output_fingerprint": output_fingerprint,
+                "output": output,
+                "completed_at": time.time(),
+            }
+        return output_fingerprint
@@ -0,0 +1,881 @@
+import logging
+import math
+from functools import lru_cache
+import os
+import re
+from io import StringIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+# Digits kept for coordinates, relative to the size of the drawing: 4 keeps a
+# tenth of a unit on a 1000-unit viewBox and a thousandth on a 24-unit icon
+OPTIMIZE_PRECISION = int(os.getenv('OPTIMIZE_PRECISION', '4'))
+# Styles and glyphs drawn at least this many times are shared (CSS class, <use> of a <defs> entry)
+OPTIMIZE_MIN_REPEATS = int(os.getenv('OPTIMIZE_MIN_REPEATS', '2'))
+# Stage version of the local optimizer: stored outputs are recomputed when it or its settings change
+OPTIMIZER_VERSION = f"local-1:{OPTIMIZE_PRECISION}:{OPTIMIZE_MIN_REPEATS}"
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+
+# Significant digits kept for transforms, opacities and other unitless values
+SCALAR_DIGITS = 5
+COORDINATE_ATTRS = {"x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry", "fx", "fy", "dx", "dy",
+                    "width", "height", "points", "viewBox", "stroke-width", "stroke-dasharray",
+                    "stroke-dashoffset", "font-size"}
+SCALAR_ATTRS = {"transform", "gradientTransform", "patternTransform", "opacity", "fill-opacity",
+                "stroke-opacity", "stop-opacity", "offset", "stroke-miterlimit"}
+# Attributes that are also CSS properties, and may therefore move into a class
+PRESENTATION_ATTRS = {"fill", "fill-opacity", "fill-rule", "stroke", "stroke-width", "stroke-opacity",
+                      "stroke-dasharray", "stroke-dashoffset", "stroke-linecap", "stroke-linejoin",
+                      "stroke-miterlimit", "opacity", "color", "font-family", "font-size", "font-style",
+                      "font-weight", "text-anchor", "dominant-baseline", "visibility", "cursor",
+                      "pointer-events", "stop-color", "stop-opacity"}
+# Elements whose whitespace is content
+TEXT_ELEMENTS = {"text", "tspan", "textPath", "title", "desc", "style", "script", "foreignObject"}
+# Elements never styled through a shared class or replaced by a <use>
+UNSHARED_ELEMENTS = {"svg", "style", "script", "defs", "symbol", "clipPath", "mask", "pattern", "marker",
+                     "linearGradient", "radialGradient", "stop", "filter", "title", "desc", "metadata"}
+GLYPH_ELEMENTS = {"g", "path"}
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_SEPARATORS = re.compile(r'[\s,]*')
+_WORD = re.compile(r'[A-Za-z][\w-]*')
+
+
+def format_number(value: float, decimals: int) -> str:
+    """Shortest text of `value` rounded to `decimals` places: 0.50 -> ".5", -0.0 -> "0"."""
+    text = f"{value:.{decimals}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    sign = ""
+    if text.startswith("-"):
+        sign, text = "-", text[1:]
+    if text.startswith("0."):
+        text = text[1:]
+    return "0" if text == "0" else sign + text
+
+
+def significant_decimals(value: float, digits: int) -> int:
+    # Decimal places that keep `digits` significant digits, never rounding the integer part
+    if value == 0:
+        return 0
+    return min(max(digits - 1 - math.floor(math.log10(abs(value))), 0), 12)
+
+
+def round_numbers(text: str, decimals: Optional[int] = None, digits: int = SCALAR_DIGITS) -> str:
+    """Every number in an attribute value rounded to `decimals` places, or to `digits` significant digits."""
+    def shorten(match):
+        value = float(match.group())
+        if not math.isfinite(value):
+            return match.group()
+        return format_number(value, significant_decimals(value, digits) if decimals is None else decimals)
+    return _NUMBER.sub(shorten, text)
+
+
+def coordinate_decimals(root: ElementTree.Element, precision: int = OPTIMIZE_PRECISION) -> int:
+    """Decimal places kept for coordinates, from the size of the drawing (viewBox, else width and height)."""
+    sizes = [abs(float(n)) for n in _NUMBER.findall(root.get("viewBox") or "")][2:4]
+    if len(sizes) != 2:
+        sizes = [float(match.group()) for match in (_NUMBER.match(root.get(name) or "")
+                                                    for name in ("width", "height")) if match]
+    size = max(sizes, default=0) or 1000
+    return max(precision - math.floor(math.log10(size)), 0)
+
+
+# Path data
+
+# Number of arguments per command; coordinates are the (x, y) pairs, except for
+# arcs where only the last two arguments are a point
+PATH_ARITY = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+
+
+def parse_path(d: str) -> List[Tuple[str, List[float]]]:
+    """Segments of path data in absolute coordinates; H and V become L. Raises ValueError on invalid data."""
+    segments = []
+    x = y = start_x = start_y = 0.0
+    command = None
+    pos, end = 0, len(d)
+    while True:
+        pos = _SEPARATORS.match(d, pos).end()
+        if pos >= end:
+            return segments
+        char = d[pos]
+        if char.upper() in PATH_ARITY:
+            command = char
+            pos += 1
+            if command in "Zz":
+                segments.append(("Z", []))
+                x, y = start_x, start_y
+                continue
+        elif command is None or command in "Zz":
+            raise ValueError(f"Unexpected {char!r} at {pos} in path data")
+        upper = command.upper()
+        relative = command != upper
+        args = []
+        for i in range(PATH_ARITY[upper]):
+            pos = _SEPARATORS.match(d, pos).end()
+            if upper == "A" and i in (3, 4):
+                # Arc flags are single digits and may be written without separators
+                if d[pos:pos + 1] not in ("0", "1"):
+                    raise ValueError(f"Invalid arc flag at {pos} in path data")
+                args.append(float(d[pos]))
+                pos += 1
+                continue
+            match = _NUMBER.match(d, pos)
+            if match is None:
+                raise ValueError(f"Expected a number at {pos} in path data")
+            args.append(float(match.group()))
+            pos = match.end()
+        if upper == "H":
+            upper, args = "L", [args[0] + (x if relative else 0.0), y]
+        elif upper == "V":
+            upper, args = "L", [x, args[0] + (y if relative else 0.0)]
+        elif relative and upper == "A":
+            args[5] += x
+            args[6] += y
+        elif relative:
+            args = [value + (y if i % 2 else x) for i, value in enumerate(args)]
+        segments.append((upper, args))
+        x, y = args[-2], args[-1]
+        if upper == "M":
+            start_x, start_y = x, y
+            # Further pairs after a moveto are implicit linetos
+            command = "l" if relative else "L"
+
+
+def _round_segment(command: str, args: List[float], decimals: int) -> List[float]:
+    if command == "A":
+        return ([round(args[0], decimals), round(args[1], decimals),
+                 round(args[2], significant_decimals(args[2], SCALAR_DIGITS)), args[3], args[4],
+                 round(args[5], decimals), round(args[6], decimals)])
+    return [round(value, decimals) for value in args]
+
+
+def simplify_path(segments: List[Tuple[str, List[float]]], decimals: int,
+                  merge_lines: bool = True) -> List[Tuple[str, List[float]]]:
+    """Rounded segments without zero-length lines, with runs of lines that deviate less than the
+    rounding step from a straight line merged into one."""
+    tolerance = 0.5 * 10 ** -decimals
+    result = []
+    x = y = start_x = start_y = 0.0
+    # Start of the last line in `result`, and the points it has absorbed
+    line_start, absorbed = None, []
+    for i, (command, args) in enumerate(segments):
+        args = _round_segment(command, args, decimals)
+        following = segments[i + 1][0] if i + 1 < len(segments) else None
+        if command == "L":
+            previous = result[-1][0] if result else None
+            # S and T reflect the previous control point, so the segment before them is kept
+            if (args[0], args[1]) == (x, y) and previous not in (None, "M", "Z") and following not in ("S", "T"):
+                continue
+            if merge_lines and previous == "L" and _within(line_start, absorbed + [(x, y)], args, tolerance):
+                absorbed.append((x, y))
+                result[-1] = ("L", args)
+            else:
+                line_start, absorbed = (x, y), []
+                result.append(("L", args))
+        else:
+            result.append((command, args))
+        if command == "Z":
+            x, y = start_x, start_y
+        else:
+            x, y = args[-2], args[-1]
+            if command == "M":
+                start_x, start_y = x, y
+    return result
+
+
+def _within(start: Tuple[float, float], points: List[Tuple[float, float]], end: List[float],
+            tolerance: float) -> bool:
+    # Every point lies on the segment start-end, up to `tolerance`
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return False
+    for px, py in points:
+        along = ((px - start[0]) * dx + (py - start[1]) * dy) / length
+        if along < 0 or along > length or abs((px - start[0]) * dy - (py - start[1]) * dx) / length > tolerance:
+            return False
+    return True
+
+
+def translate_path(segments: List[Tuple[str, List[float]]], dx: float, dy: float) -> List[Tuple[str, List[float]]]:
+    translated = []
+    for command, args in segments:
+        if command == "A":
+            args = args[:5] + [args[5] + dx, args[6] + dy]
+        else:
+            args = [value + (dy if i % 2 else dx) for i, value in enumerate(args)]
+        translated.append((command, args))
+    return translated
+
+
+def format_path(segments: List[Tuple[str, List[float]]], decimals: int) -> str:
+    """Shortest path data for the segments: each one absolute or relative, whichever is shorter,
+    with repeated commands and unneeded separators left out."""
+    out = []
+    # Command a segment can leave out its letter for: the previous one, or a lineto after a moveto
+    implicit, last_number = None, None
+    x = y = start_x = start_y = 0.0
+
+    def numbers(values: Iterable[float]) -> List[str]:
+        return [format_number(value, decimals) for value in values]
+
+    for index, (command, args) in enumerate(segments):
+        if command == "Z":
+            candidates = [("z", [])]
+        elif command == "A":
+            head = numbers(args[:2]) + [format_number(args[2], significant_decimals(args[2], SCALAR_DIGITS)),
+                                        str(int(args[3])), str(int(args[4]))]
+            candidates = [("A", head + numbers(args[5:])), ("a", head + numbers((args[5] - x, args[6] - y)))]
+        else:
+            relative = [value - (y if i % 2 else x) for i, value in enumerate(args)]
+            candidates = [(command, numbers(args)), (command.lower(), numbers(relative))]
+            if command == "L":
+                if format_number(relative[1], decimals) == "0":
+                    candidates = [("H", numbers(args[:1])), ("h", numbers(relative[:1]))]
+                elif format_number(relative[0], decimals) == "0":
+                    candidates = [("V", numbers(args[1:])), ("v", numbers(relative[1:]))]
+            if index == 0:
+                # The first moveto is absolute either way
+                candidates = candidates[:1]
+        best = None
+        for letter, values in candidates:
+            text = _join_numbers(values, None if letter == implicit else letter, last_number)
+            if best is None or len(text) < len(best[0]):
+                best = (text, letter, values)
+        text, letter, values = best
+        out.append(text)
+        implicit = {"M": "L", "m": "l", "z": None}.get(letter, letter)
+        last_number = values[-1] if values else None
+        if command == "Z":
+            x, y = start_x, start_y
+        else:
+            x, y = args[-2], args[-1]
+            if command == "M":
+                start_x, start_y = x, y
+    return "".join(out)
+
+
+def _join_numbers(values: List[str], letter: Optional[str], previous: Optional[str]) -> str:
+    out = []
+    if letter:
+        out.append(letter)
+        previous = None
+    for value in values:
+        if previous is not None and not _self_separating(previous, value):
+            out.append(" ")
+        out.append(value)
+        previous = value
+    return "".join(out)
+
+
+def _self_separating(previous: str, value: str) -> bool:
+    # "1-2" and "1.5.5" read back as two numbers
+    return value.startswith("-") or (value.startswith(".") and ("." in previous or "e" in previous))
+
+
+# Glyphs repeat the same path data many times
+@lru_cache(maxsize=4096)
+def optimize_path(d: str, decimals: int, merge_lines: bool = True) -> str:
+    try:
+        return format_path(simplify_path(parse_path(d), decimals, merge_lines), decimals)
+    except ValueError as e:
+        logging.debug(f"Path data left as is: {str(e)}")
+        return round_numbers(d, decimals)
+
+
+# CSS
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_TAG = re.compile(r'[A-Za-z][\w-]*')
+_CSS_CLASS = re.compile(r'\.([\w-]+)')
+_CSS_ID = re.compile(r'#([\w-]+)')
+
+
+def minify_css(css: str) -> str:
+    if '"' in css or "'" in css or "\\" in css:
+        # Quoted values keep their spaces: only comments and the outer whitespace go
+        return _CSS_COMMENT.sub("", css).strip()
+    css = re.sub(r'\s+', ' ', _CSS_COMMENT.sub("", css))
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(";}", "}").strip()
+
+
+class StyleRules:
+    """What the document's stylesheets set, enough to tell which elements a rule may apply to.
+
+    Only the last compound selector (".node", "circle.edge:hover") is
+    looked at, so "may match" over-approximates; sheets with at-rules are
+    taken to set every property they mention on every element.
+    """
+
+    def __init__(self, css: str):
+        css = _CSS_COMMENT.sub("", css)
+        self.rules: Optional[List[Tuple[str, bool, Set[str]]]] = []
+        self.properties: Set[str] = set(re.findall(r'([\w-]+)\s*:(?![^{}]*\{)', css))
+        self.class_names: Set[str] = set(_CSS_CLASS.findall(css))
+        if "@" in css:
+            self.rules = None
+            return
+        for block in css.split("}"):
+            selectors, _, declarations = block.partition("{")
+            properties = {part.partition(":")[0].strip().lower() for part in declarations.split(";") if ":" in part}
+            for selector in selectors.split(","):
+                # Arguments of pseudo-classes and attribute selectors never narrow the match
+                selector = re.sub(r'\([^)]*\)|\[[^\]]*\]', '', selector).strip()
+                if selector:
+                    compounds = re.split(r'\s*[\s>+~]\s*', selector)
+                    contextual = len(compounds) > 1 or ":" in compounds[-1]
+                    self.rules.append((compounds[-1], contextual, properties))
+
+    @staticmethod
+    def _may_match(compound: str, element: ElementTree.Element) -> bool:
+        tag = _CSS_TAG.match(compound)
+        if tag and tag.group() != _local(element.tag):
+            return False
+        if not set(_CSS_CLASS.findall(compound)) <= set((element.get("class") or "").split()):
+            return False
+        return all(element_id == element.get("id") for element_id in _CSS_ID.findall(compound))
+
+    def properties_for(self, element: ElementTree.Element) -> Set[str]:
+        """Properties some rule may set on `element`."""
+        if self.rules is None:
+            return self.properties
+        properties = set()
+        for compound, _, rule_properties in self.rules:
+            if self._may_match(compound, element):
+                properties |= rule_properties
+        return properties
+
+    def depends_on_context(self, element: ElementTree.Element) -> bool:
+        """True when a rule may apply to `element` because of its ancestors or its state (hover...),
+        which would no longer hold for a copy of it in <defs>."""
+        if self.rules is None:
+            return bool(self.properties)
+        return any(contextual and self._may_match(compound, element) for compound, contextual, _ in self.rules)
+
+
+# SVG documents
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _is_svg(tag: str) -> bool:
+    return isinstance(tag, str) and (not tag.startswith("{") or tag.startswith("{" + SVG_NS + "}"))
+
+
+def _parse_svg(svg_code: str) -> Tuple[ElementTree.Element, Dict[str, str]]:
+    # Namespace prefixes are kept so that the document is written back with the same ones
+    prefixes: Dict[str, str] = {}
+    declared: Dict[str, str] = {}
+    events = ElementTree.iterparse(StringIO(svg_code), events=("start-ns",))
+    for _, (prefix, uri) in events:
+        if declared.setdefault(prefix, uri) != uri:
+            raise ValueError(f"Namespace prefix {prefix!r} is bound to several namespaces")
+        prefixes.setdefault(uri, prefix)
+    return events.root, prefixes
+
+
+def _serialize(root: ElementTree.Element, prefixes: Dict[str, str]) -> str:
+    out = []
+    names: Dict[str, str] = {}
+
+    def name(qualified: str) -> str:
+        text = names.get(qualified)
+        if text is None:
+            if qualified.startswith("{"):
+                uri, local = qualified[1:].split("}", 1)
+                prefix = "xml" if uri == XML_NS else prefixes[uri]
+                text = f"{prefix}:{local}" if prefix else local
+            else:
+                text = qualified
+            names[qualified] = text
+        return text
+
+    def write(element: ElementTree.Element, preserve: bool):
+        # Whitespace between elements goes, except inside text content
+        preserve = preserve or _local(element.tag) in TEXT_ELEMENTS
+        tag = name(element.tag)
+        out.append("<" + tag)
+        if element is root:
+            for uri, prefix in prefixes.items():
+                out.append(f' xmlns:{prefix}="{uri}"' if prefix else f' xmlns="{uri}"')
+        for key, value in element.items():
+            if _ATTR_SPECIAL.search(value):
+                value = escape(value, _ATTR_ENTITIES)
+            out.append(f' {name(key)}="{value}"')
+        text = element.text if element.text and (preserve or element.text.strip()) else None
+        if text is None and len(element) == 0:
+            out.append("/>")
+            return
+        out.append(">")
+        if text is not None:
+            out.append(escape(text))
+        for child in element:
+            write(child, preserve)
+            if child.tail and (preserve or child.tail.strip()):
+                out.append(escape(child.tail))
+        out.append(f"</{tag}>")
+
+    write(root, False)
+    return "".join(out)
+
+
+_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\t": "&#9;"}
+_ATTR_SPECIAL = re.compile(r'[&<>"\n\t]')
+
+
+def _fresh_names(prefix: str, taken: Set[str]) -> Iterator[str]:
+    index = 0
+    while True:
+        candidate = f"{prefix}{index}"
+        if candidate not in taken:
+            yield candidate
+        index += 1
+
+
+def _round_attributes(root: ElementTree.Element, decimals: int, merge_lines: bool):
+    for element in root.iter():
+        if not _is_svg(element.tag):
+            continue
+        for key, value in element.items():
+            if key == "d":
+                element.set(key, optimize_path(value, decimals, merge_lines))
+            elif key in COORDINATE_ATTRS:
+                element.set(key, round_numbers(value, decimals))
+            elif key in SCALAR_ATTRS:
+                element.set(key, round_numbers(value))
+        if _local(element.tag) == "style" and element.text:
+            element.text = minify_css(element.text)
+
+
+def _child_style(root: ElementTree.Element) -> ElementTree.Element:
+    for child in root:
+        if _local(child.tag) == "style" and _is_svg(child.tag):
+            return child
+    style = ElementTree.Element(_same_namespace(root.tag, "style"))
+    root.insert(0, style)
+    return style
+
+
+def _same_namespace(tag: str, local: str) -> str:
+    return tag[:tag.index("}") + 1] + local if tag.startswith("{") else local
+
+
+def _declarations(element: ElementTree.Element) -> Optional[Dict[str, str]]:
+    # Presentation attributes and inline style of an element, the inline style winning; None if
+    # the inline style cannot be moved as is
+    declarations = {key: value.strip() for key, value in element.items() if key in PRESENTATION_ATTRS}
+    style = element.get("style")
+    if style is not None:
+        for part in style.split(";"):
+            if not part.strip():
+                continue
+            key, separator, value = part.partition(":")
+            key, value = key.strip().lower(), value.strip()
+            if not separator or not value or not re.fullmatch(r'[a-z-]+', key) or re.search(r'[!{}<]', value):
+                return None
+            declarations[key] = value
+    return declarations
+
+
+def _share_styles(root: ElementTree.Element, rules: StyleRules, protected: Set[str], min_repeats: int) -> int:
+    """Move presentation attributes and inline styles repeated on several elements into shared
+    classes. Properties a stylesheet rule may also set on the element, or that the script names,
+    stay where they are: moving them would change which value wins."""
+    groups: Dict[Tuple[Tuple[str, str], ...], List[ElementTree.Element]] = {}
+    for element in root.iter():
+        if not _is_svg(element.tag) or _local(element.tag) in UNSHARED_ELEMENTS:
+            continue
+        declarations = _declarations(element)
+        if not declarations:
+            continue
+        if any(key in protected or _camel_case(key) in protected for key in declarations):
+            continue
+        if rules.properties_for(element) & set(declarations):
+            continue
+        groups.setdefault(tuple(sorted(declarations.items())), []).append(element)
+
+    taken = set(rules.class_names)
+    for element in root.iter():
+        taken.update((element.get("class") or "").split())
+    names = _fresh_names("c", taken)
+    css = []
+    for declarations, elements in groups.items():
+        if len(elements) < min_repeats:
+            continue
+        rule_body = ";".join(f"{key}:{value}" for key, value in declarations)
+        removed = sum(len(key) + len(value) + 4 for key, value in declarations)
+        if removed * len(elements) <= len(rule_body) + 4 + 12 * len(elements):
+            continue
+        class_name = next(names)
+        css.append(f".{class_name}{{{rule_body}}}")
+        for element in elements:
+            for key in PRESENTATION_ATTRS.intersection(element.keys()):
+                del element.attrib[key]
+            element.attrib.pop("style", None)
+            classes = element.get("class")
+            element.set("class", f"{classes} {class_name}" if classes else class_name)
+    if css:
+        style = _child_style(root)
+        style.text = (style.text or "") + "".join(css)
+    return len(css)
+
+
+def _camel_case(name: str) -> str:
+    head, *rest = name.split("-")
+    return head + "".join(part.capitalize() for part in rest)
+
+
+def _is_instance_attr(key: str) -> bool:
+    # Attributes that stay on each <use>: placement, data for the script, event handlers
+    return key == "transform" or key.startswith(("data-", "aria-", "on"))
+
+
+def _share_glyphs(root: ElementTree.Element, rules: StyleRules, protected: Set[str], decimals: int,
+                  prefixes: Dict[str, str], min_repeats: int) -> int:
+    """Replace groups and paths drawn several times by <use> references to one copy in <defs>.
+
+    Paths that only differ by where they start are the same glyph: the
+    copy starts at 0,0 and each <use> places it with x and y.
+    """
+    tags = {tag for tag in GLYPH_ELEMENTS if tag not in protected}
+    if not tags:
+        return 0
+    glyphs: Dict[ElementTree.Element, Tuple[tuple, ElementTree.Element, str, str]] = {}
+    contents: Dict[ElementTree.Element, tuple] = {}
+
+    def candidate(element: ElementTree.Element) -> bool:
+        return (_is_svg(element.tag) and _local(element.tag) in tags and element.get("id") is None
+                and all(child.get("id") is None and not rules.depends_on_context(child) for child in element.iter()))
+
+    def content(element: ElementTree.Element) -> tuple:
+        # What an element draws, as a comparable value; children are shared by nested groups
+        value = contents.get(element)
+        if value is None:
+            value = contents[element] = (element.tag, tuple(sorted(element.items())), (element.text or "").strip(),
+                                         tuple((content(child), (child.tail or "").strip()) for child in element))
+        return value
+
+    def collect(element: ElementTree.Element):
+        for child in element:
+            if _local(child.tag) in UNSHARED_ELEMENTS or _local(child.tag) in TEXT_ELEMENTS:
+                continue
+            if candidate(child):
+                glyph = _glyph(child, decimals)
+                if glyph is not None:
+                    glyphs[child] = (content(glyph[0]),) + glyph
+            collect(child)
+
+    collect(root)
+    counts: Dict[tuple, int] = {}
+    for signature, *_ in glyphs.values():
+        counts[signature] = counts.get(signature, 0) + 1
+    sizes: Dict[tuple, int] = {}
+
+    def worthwhile(signature: tuple, definition: ElementTree.Element, count: int) -> bool:
+        # Each <use> costs about 30 characters, the shared copy its own length
+        if count < min_repeats:
+            return False
+        if signature not in sizes:
+            sizes[signature] = len(_serialize(definition, prefixes))
+        return count * (sizes[signature] - 30) > sizes[signature] + 10
+
+    # Only the outermost repeated glyphs are replaced: their content goes with them
+    occurrences: Dict[tuple, List[Tuple[ElementTree.Element, ElementTree.Element]]] = {}
+
+    def select(element: ElementTree.Element):
+        for child in element:
+            glyph = glyphs.get(child)
+            if glyph is not None and worthwhile(glyph[0], glyph[1], counts[glyph[0]]):
+                occurrences.setdefault(glyph[0], []).append((element, child))
+            else:
+                select(child)
+
+    select(root)
+    taken = {element.get("id") for element in root.iter() if element.get("id")}
+    names = _fresh_names("u", taken)
+    replacements: Dict[ElementTree.Element, Dict[ElementTree.Element, ElementTree.Element]] = {}
+    definitions = []
+    for signature, places in occurrences.items():
+        definition = glyphs[places[0][1]][1]
+        if not worthwhile(signature, definition, len(places)):
+            continue
+        glyph_id = next(names)
+        definition.set("id", glyph_id)
+        definitions.append(definition)
+        for parent, element in places:
+            _, _, x, y = glyphs[element]
+            use = ElementTree.Element(_same_namespace(element.tag, "use"), {"href": f"#{glyph_id}"})
+            for key, value in element.items():
+                if _is_instance_attr(key):
+                    use.set(key, value)
+            if x != "0":
+                use.set("x", x)
+            if y != "0":
+                use.set("y", y)
+            use.tail = element.tail
+            replacements.setdefault(parent, {})[element] = use
+    for parent, replaced in replacements.items():
+        parent[:] = [replaced.get(child, child) for child in parent]
+    if definitions:
+        defs = ElementTree.Element(_same_namespace(root.tag, "defs"))
+        defs.extend(definitions)
+        index = 1 if len(root) and _local(root[0].tag) == "style" else 0
+        root.insert(index, defs)
+    return len(definitions)
+
+
+def _glyph(element: ElementTree.Element, decimals: int) -> Optional[Tuple[ElementTree.Element, str, str]]:
+    # The shared copy of an element (without its instance attributes) and where a <use> places it
+    definition = ElementTree.Element(element.tag, {key: value for key, value in element.items()
+                                                   if not _is_instance_attr(key)})
+    definition.text = element.text
+    definition.extend(element)
+    x = y = "0"
+    if _local(element.tag) == "path":
+        placed = _path_from_origin(element.get("d", ""), decimals)
+        if placed is None:
+            return None
+        d, x, y = placed
+        definition.set("d", d)
+    return definition, x, y
+
+
+@lru_cache(maxsize=4096)
+def _path_from_origin(d: str, decimals: int) -> Optional[Tuple[str, str, str]]:
+    # The path moved to start at 0,0, and where it started
+    try:
+        segments = parse_path(d)
+    except ValueError:
+        return None
+    if not segments or segments[0][0] != "M":
+        return None
+    start_x, start_y = segments[0][1]
+    return (format_path(translate_path(segments, -start_x, -start_y), decimals),
+            format_number(start_x, decimals), format_number(start_y, decimals))
+
+
+def optimize_svg(svg_code: str, protected: Iterable[str] = (), precision: int = OPTIMIZE_PRECISION,
+                 min_repeats: int = OPTIMIZE_MIN_REPEATS) -> str:
+    """A smaller SVG drawing the same picture.
+
+    Numbers are rounded to the precision of the drawing, paths are
+    simplified, repeated styles become classes and repeated glyphs become
+    <use> references. `protected` holds the names the page's script uses
+    (attributes, tags): styles and elements it could read or change keep
+    their form. Text that is not a well-formed SVG document is returned
+    unchanged.
+    """
+    try:
+        root, prefixes = _parse_svg(svg_code)
+    except (ElementTree.ParseError, ValueError) as e:
+        logging.warning(f"SVG left unoptimized: {str(e)}")
+        return svg_code
+    if _local(root.tag) != "svg":
+        logging.warning(f"SVG left unoptimized: the document is a <{_local(root.tag)}>")
+        return svg_code
+    protected = set(protected)
+    decimals = coordinate_decimals(root, precision)
+    # Markers are drawn at every vertex, so their paths keep all of them
+    merge_lines = not any(key.startswith("marker") for element in root.iter() for key in element.keys())
+    _round_attributes(root, decimals, merge_lines)
+    rules = StyleRules("".join(element.text or "" for element in root.iter() if _local(element.tag) == "style"))
+    _share_styles(root, rules, protected, min_repeats)
+    _share_glyphs(root, rules, protected, decimals, prefixes, min_repeats)
+    try:
+        return _serialize(root, prefixes)
+    except KeyError as e:
+        logging.warning(f"SVG left unoptimized: undeclared namespace {str(e)}")
+        return svg_code
+
+
+# JavaScript
+
+_JS_PUNCTUATOR = '|'.join(re.escape(p) for p in sorted([
+    ">>>=", "...", "===", "!==", "**=", "<<=", ">>=", ">>>", "??=", "&&=", "||=", "=>", "==", "!=", "<=", ">=",
+    "&&", "||", "??", "?.", "++", "--", "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "<<", ">>", "**",
+    "{", "(", ")", "[", "]", ";", ",", "<", ">", "+", "-", "*", "/", "%", "&", "|", "^", "!", "~", "?", ":",
+    "=", ".", "@", "#", "}"], key=len, reverse=True))
+_JS_TOKEN = re.compile(
+    r'(?P<space>\s+)'
+    r'|(?P<string>"(?:[^"\\\n\r]|\\[\s\S])*"|\'(?:[^\'\\\n\r]|\\[\s\S])*\')'
+    r'|(?P<number>0[xXoObB][\da-fA-F_]+n?|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][-+]?\d+)?n?)'
+    r'|(?P<name>[A-Za-z_$\u0080-\uffff\\][\w$\u0080-\uffff\\]*)'
+    rf'|(?P<punct>{_JS_PUNCTUATOR})')
+_JS_REGEX = re.compile(r'/(?:[^/\\\[\n\r]|\\.|\[(?:[^\]\\\n\r]|\\.)*\])+/[A-Za-z]*')
+_JS_TEMPLATE_TEXT = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*')
+_LINE_BREAKS = re.compile(r'[\n\r\u2028\u2029]')
+# After these keywords a slash starts a regular expression rather than a division
+_JS_EXPRESSION_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case",
+                           "do", "else", "yield", "await"}
+# A line break after these ends the statement
+_JS_RESTRICTED = {"return", "break", "continue", "throw", "yield", "async"}
+
+
+def _js_tokens(code: str) -> Iterator[Tuple[str, str, str]]:
+    """(kind, text, gap) for each token; the gap is the whitespace before it reduced to "", " " or "\\n".
+    Comments count as whitespace. Raises ValueError on unterminated strings, comments or literals."""
+    pos, end = 0, len(code)
+    gap = ""
+    previous = None
+    # Open braces of each template substitution being read, innermost last
+    templates: List[int] = []
+    while pos < end:
+        char = code[pos]
+        if char == "/" and code.startswith("//", pos):
+            newline = _LINE_BREAKS.search(code, pos)
+            pos = newline.start() if newline else end
+            gap = gap or " "
+            continue
+        if char == "/" and code.startswith("/*", pos):
+            close = code.find("*/", pos + 2)
+            if close < 0:
+                raise ValueError(f"Unterminated comment at {pos}")
+            gap = "\n" if gap == "\n" or _LINE_BREAKS.search(code, pos, close) else " "
+            pos = close + 2
+            continue
+        if char == "/" and _regex_allowed(previous):
+            match = _JS_REGEX.match(code, pos)
+            if match is None:
+                raise ValueError(f"Unterminated regular expression at {pos}")
+            kind, text = "regex", match.group()
+        elif char == "`" or (char == "}" and templates and templates[-1] == 0):
+            stop = _JS_TEMPLATE_TEXT.match(code, pos + 1).end()
+            if code.startswith("${", stop):
+                kind, text = "template_open", code[pos:stop + 2]
+                if char == "`":
+                    templates.append(0)
+            elif code.startswith("`", stop):
+                kind, text = "template", code[pos:stop + 1]
+                if char == "}":
+                    templates.pop()
+            else:
+                raise ValueError(f"Unterminated template literal at {pos}")
+        else:
+            match = _JS_TOKEN.match(code, pos)
+            if match is None:
+                raise ValueError(f"Unexpected character {char!r} at {pos}")
+            kind, text = match.lastgroup, match.group()
+            if kind == "space":
+                gap = "\n" if gap == "\n" or _LINE_BREAKS.search(text) else " "
+                pos = match.end()
+                continue
+            if templates and text == "{":
+                templates[-1] += 1
+            elif templates and text == "}":
+                templates[-1] -= 1
+        yield kind, text, gap
+        previous = (kind, text)
+        pos += len(text)
+        gap = ""
+
+
+def _regex_allowed(previous: Optional[Tuple[str, str]]) -> bool:
+    if previous is None:
+        return True
+    kind, text = previous
+    if kind == "punct":
+        return text not in (")", "]", "}")
+    return kind == "template_open" or (kind == "name" and text in _JS_EXPRESSION_KEYWORDS)
+
+
+def _is_identifier_char(char: str) -> bool:
+    return char.isalnum() or char in "_$\\" or char > "\x7f"
+
+
+def _needs_space(previous: Tuple[str, str], text: str) -> bool:
+    kind, previous_text = previous
+    last, first = previous_text[-1], text[0]
+    if _is_identifier_char(last) and _is_identifier_char(first):
+        return True
+    if last + first in ("++", "--", "//", "/*"):
+        return True
+    # "1 .toString()" is not "1.toString()"
+    return kind == "number" and first == "." and previous_text.isdigit()
+
+
+def _ends_value(kind: str, text: str) -> bool:
+    return kind in ("name", "number", "string", "regex", "template") or text in (")", "]", "}", "++", "--")
+
+
+def _starts_value(kind: str, text: str) -> bool:
+    return (kind in ("name", "number", "string", "regex") or (kind.startswith("template") and text[0] == "`")
+            or text in ("{", "++", "--", "!", "~"))
+
+
+def minify_js(code: str) -> str:
+    """JavaScript without comments and without the whitespace it does not need.
+
+    Line breaks are kept where automatic semicolon insertion may depend on
+    them (between two values, after return/break/continue/throw), so the
+    result parses to the same program. Names are left as they are: the
+    SVG, the page and other scripts may refer to them.
+    """
+    return _join_tokens(_js_tokens(code))
+
+
+def _join_tokens(tokens: Iterable[Tuple[str, str, str]]) -> str:
+    out = []
+    previous = None
+    for kind, text, gap in tokens:
+        if previous is not None and gap:
+            if gap == "\n" and (previous[1] in _JS_RESTRICTED
+                                or (_ends_value(*previous) and _starts_value(kind, text))):
+                out.append("\n")
+            elif _needs_space(previous, text):
+                out.append(" ")
+        out.append(text)
+        previous = (kind, text)
+    return "".join(out)
+
+
+def _token_names(tokens: Iterable[Tuple[str, str, str]]) -> Set[str]:
+    names = set()
+    # Parentheses open in a createElement(NS) call: the tag it names is new, not one the script looks up
+    creating, previous = 0, None
+    for kind, text, _ in tokens:
+        if creating:
+            creating += {"(": 1, ")": -1}.get(text, 0)
+            if kind == "string":
+                continue
+        elif text == "(" and previous in ("createElement", "createElementNS"):
+            creating = 1
+        if kind not in ("number", "punct"):
+            names.update(_WORD.findall(text))
+        previous = text
+    return names
+
+
+def js_names(code: str) -> Set[str]:
+    """Words the script uses in identifiers and strings: the attributes, properties and tags it may
+    read or change. Falls back to every word of the text when the script cannot be tokenized."""
+    try:
+        return _token_names(_js_tokens(code))
+    except ValueError:
+        return set(_WORD.findall(code))
+
+
+def optimize_code(svg_code: str, js_code: str) -> Dict[str, Any]:
+    """Optimized SVG and JavaScript, in the structure the performance optimizer agent answers with,
+    plus the sizes (in bytes) before and after."""
+    try:
+        tokens = list(_js_tokens(js_code))
+        optimized_js, names = _join_tokens(tokens), _token_names(tokens)
+    except ValueError as e:
+        logging.warning(f"JavaScript left unminified: {str(e)}")
+        optimized_js, names = js_code, set(_WORD.findall(js_code))
+    optimized_svg = optimize_svg(svg_code, names)
+
+    def sizes(before: str, after: str) -> Dict[str, int]:
+        return {"avant": len(before.encode('utf-8')), "après": len(after.encode('utf-8'))}
+
+    return {
+        "code_optimisé": {"svg": optimized_svg, "js": optimized_js},
+        "tailles": {"svg": sizes(svg_code, optimized_svg), "js": sizes(js_code, optimized_js)},
+    }
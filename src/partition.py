@@ -0,0 +1,258 @@
+import copy
+import json
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from data_loader import InputFile, JSONStreamReader, RawData
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, separators=(',', ':'), ensure_ascii=False))
+
+
+def _pack(items: Iterable[Any], max_chars: int, size: Callable[[Any], int] = _size) -> Iterator[List[Any]]:
+    # Greedy packing in input order keeps the chunking deterministic
+    chunk, chunk_size = [], 0
+    for item in items:
+        item_size = size(item) + 1
+        if chunk and chunk_size + item_size > max_chars:
+            yield chunk
+            chunk, chunk_size = [], 0
+        chunk.append(item)
+        chunk_size += item_size
+    if chunk:
+        yield chunk
+
+
+def _split_line(line: str, max_chars: int) -> Iterator[str]:
+    # Pieces of a line that each fit in a chunk, counted like _pack counts lines
+    if _size(line) + 1 <= max_chars:
+        yield line
+        return
+    while line:
+        end = min(len(line), max(max_chars - 3, 1))
+        overflow = _size(line[:end]) + 1 - max_chars
+        while end > 1 and overflow > 0:
+            # Escaped characters take more than one serialized character
+            end = max(end - overflow, 1)
+            overflow = _size(line[:end]) + 1 - max_chars
+        yield line[:end]
+        line = line[end:]
+
+
+def _split_text(lines: Iterable[str], max_chars: int) -> Iterator[str]:
+    pieces = (piece for line in lines for piece in _split_line(line, max_chars))
+    for chunk in _pack(pieces, max_chars):
+        yield "\n".join(chunk)
+
+
+def _split_items(items: Iterable[Any], max_chars: int) -> Iterator[Any]:
+    # An item too large for a chunk on its own is replaced by its parts
+    for item in items:
+        if _size(item) + 1 <= max_chars:
+            yield item
+        else:
+            yield from partition_data(item, max_chars)
+
+
+def is_node_edge_graph(data: Any) -> bool:
+    return isinstance(data, dict) and isinstance(data.get("nodes"), list) and isinstance(data.get("edges"), list)
+
+
+def connected_components(nodes: List[Dict], edges: List[Dict]) -> List[List[int]]:
+    """Node indices grouped by connected component, in order of first node."""
+    index = {node.get("id"): i for i, node in enumerate(nodes)}
+    parent = list(range(len(nodes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for edge in edges:
+        source, target = index.get(edge.get("source")), index.get(edge.get("target"))
+        if source is not None and target is not None:
+            root_source, root_target = find(source), find(target)
+            if root_source != root_target:
+                parent[max(root_source, root_target)] = min(root_source, root_target)
+
+    components = {}
+    for i in range(len(nodes)):
+        components.setdefault(find(i), []).append(i)
+    return list(components.values())
+
+
+def _partition_graph(data: Dict, max_chars: int) -> Iterator[Dict]:
+    nodes, edges = data["nodes"], data["edges"]
+    extra = {key: value for key, value in data.items() if key not in ("nodes", "edges")}
+
+    # Whole components are kept together when they fit; oversized ones are split in node order.
+    # Nodes get half of the budget, the other half is left for their edges.
+    node_sizes = [_size(node) + 1 for node in nodes]
+    groups = []
+    for component in connected_components(nodes, edges):
+        groups.extend(_pack(component, max_chars // 2, size=lambda i: node_sizes[i]))
+
+    node_chunk = {}
+    chunks = []
+    for group in _pack(groups, max_chars // 2, size=lambda indices: sum(node_sizes[i] for i in indices)):
+        chunk_nodes = [nodes[i] for group_indices in group for i in group_indices]
+        for node in chunk_nodes:
+            node_chunk[node.get("id")] = len(chunks)
+        chunks.append({"nodes": chunk_nodes, "edges": []})
+
+    # Each edge goes with its source node, so edges between chunks are analysed exactly once
+    for edge in edges:
+        chunk_index = node_chunk.get(edge.get("source"), node_chunk.get(edge.get("target"), 0))
+        if chunks:
+            chunks[chunk_index]["edges"].append(edge)
+
+    for chunk in chunks:
+        if _size(chunk) <= max_chars:
+            yield dict(extra, **chunk)
+            continue
+        # Dense chunk: spread its edges over several sub-chunks carrying the same nodes
+        edge_budget = max(max_chars - _size(chunk["nodes"]), max_chars // 2)
+        for edge_chunk in _pack(chunk["edges"], edge_budget):
+            yield dict(extra, nodes=chunk["nodes"], edges=edge_chunk)
+
+
+def _partition_entities(data: Dict, max_chars: int) -> Iterator[Dict]:
+    # One entity type per chunk, e.g. users, posts, comments, relationships
+    for key, value in data.items():
+        budget = max_chars - _size(key) - 3
+        if isinstance(value, list):
+            for items in _pack(_split_items(value, budget - 2), budget):
+                yield {key: items}
+        elif _size(value) > budget:
+            for part in partition_data(value, budget):
+                yield {key: part}
+        else:
+            yield {key: value}
+
+
+def _partition_members(members: Iterable[Tuple[str, Any, bool]], max_chars: int) -> Iterator[Dict]:
+    # Streamed counterpart of the dict cases of partition_data, on JSONStreamReader.items():
+    # only nodes and edges, which are split along components, are held in memory
+    rest = {}
+    for (key, element), group in groupby(members, key=lambda member: (member[0], member[2])):
+        values = (value for _, value, _ in group)
+        if not element:
+            rest[key] = next(values)
+        elif key in ("nodes", "edges"):
+            rest.setdefault(key, []).extend(values)
+        else:
+            budget = max_chars - _size(key) - 3
+            for items in _pack(_split_items(values, budget - 2), budget):
+                yield {key: items}
+    if is_node_edge_graph(rest):
+        yield from partition_data(rest, max_chars)
+    else:
+        yield from _partition_entities(rest, max_chars)
+
+
+def partition_data(data: Any, max_chars: int) -> Iterator[Any]:
+    """Split parsed input into chunks of at most roughly `max_chars` serialized characters.
+
+    Node/edge graphs are split along connected components, entity/relationship
+    datasets by entity type, lists by items and text by lines. Lines and
+    items larger than a chunk are split in turn.
+    """
+    if isinstance(data, str):
+        yield from _split_text(data.splitlines(), max_chars)
+    elif _size(data) <= max_chars:
+        yield data
+    elif is_node_edge_graph(data):
+        yield from _partition_graph(data, max_chars)
+    elif isinstance(data, dict):
+        yield from _partition_entities(data, max_chars)
+    elif isinstance(data, list):
+        yield from _pack(_split_items(data, max_chars - 2), max_chars)
+    else:
+        yield data
+
+
+def _chunk_text(chunk: Any) -> str:
+    return chunk if isinstance(chunk, str) else json.dumps(chunk, separators=(',', ':'), ensure_ascii=False)
+
+
+def _partition_file(input_file: InputFile, max_chars: int) -> Iterator[Any]:
+    with input_file.open() as file:
+        reader = JSONStreamReader(file)
+        first = reader.peek()
+        if first == '{':
+            yield from _partition_members(reader.items(), max_chars)
+        elif first == '[':
+            yield from _pack(_split_items(reader.elements(), max_chars - 2), max_chars)
+        else:
+            yield from partition_data(reader.value(), max_chars)
+            if reader.peek():
+                raise json.JSONDecodeError("Extra data", reader.buffer, reader.pos)
+
+
+def partition_input(raw_data: RawData, max_chars: int) -> List[str]:
+    """partition_data on raw input, with each chunk serialized; input that is not JSON is split as text.
+
+    Text already in memory is parsed whole; an input file is read one record
+    at a time, so memory holds the chunks rather than the parsed dataset.
+    """
+    if isinstance(raw_data, str) or raw_data.size <= max_chars:
+        text = raw_data if isinstance(raw_data, str) else raw_data.read()
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = text
+        return [_chunk_text(chunk) for chunk in partition_data(data, max_chars)]
+    try:
+        return [_chunk_text(chunk) for chunk in _partition_file(raw_data, max_chars)]
+    except json.JSONDecodeError:
+        with raw_data.open() as file:
+            return list(_split_text((line.rstrip('\r\n') for line in file), max_chars))
+
+
+def _merge_unique(target: List[Any], seen: set, values: Iterable[Any]):
+    for value in values:
+        key = json.dumps(value, sort_keys=True, ensure_ascii=False)
+        if key not in seen:
+            seen.add(key)
+            target.append(value)
+
+
+def _merge_structures(target: Dict, source: Dict):
+    for key, value in source.items():
+        if key not in target:
+            target[key] = copy.deepcopy(value)
+        elif isinstance(target[key], dict) and isinstance(value, dict):
+            _merge_structures(target[key], value)
+        elif isinstance(target[key], list) and isinstance(value, list):
+            merged, seen = [], set()
+            _merge_unique(merged, seen, target[key])
+            _merge_unique(merged, seen, value)
+            target[key] = merged
+
+
+def merge_analyses(partials: List[Dict]) -> Dict:
+    """Merge per-chunk data_analyzer outputs, in chunk order, without duplicates."""
+    elements, relations, attributes = [], [], []
+    seen_elements, seen_relations, seen_attributes = set(), set(), set()
+    hierarchy, hierarchy_seen = {}, {}
+    structure = {}
+
+    for partial in partials:
+        _merge_unique(elements, seen_elements, partial.get("éléments_clés", []))
+        _merge_unique(relations, seen_relations, partial.get("relations", []))
+        _merge_unique(attributes, seen_attributes, partial.get("attributs_visualisation", []))
+        for level, members in partial.get("hiérarchie", {}).items():
+            members = members if isinstance(members, list) else [members]
+            _merge_unique(hierarchy.setdefault(level, []), hierarchy_seen.setdefault(level, set()), members)
+        if isinstance(partial.get("structure_optimisée"), dict):
+            _merge_structures(structure, partial["structure_optimisée"])
+
+    return {
+        "éléments_clés": elements,
+        "relations": relations,
+        "hiérarchie": hierarchy,
+        "attributs_visualisation": attributes,
+        "structure_optimisée": structure,
+    }
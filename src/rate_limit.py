@@ -0,0 +1,350 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+from tracing import current_span
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '5'))
+API_BACKOFF_BASE = float(os.getenv('API_BACKOFF_BASE', '0.5'))  # seconds
+API_BACKOFF_MAX = float(os.getenv('API_BACKOFF_MAX', '60'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+# Requests per minute allowed by each provider, before any adaptation to its headers
+PROVIDER_RPM = {
+    "deepseek": float(os.getenv('DEEPSEEK_RPM', '60')),
+    "claude": float(os.getenv('CLAUDE_RPM', '50')),
+}
+
+# 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504, 529}
+
+_priority = contextvars.ContextVar('api_priority', default=None)
+_default_priority = PRIORITY_INTERACTIVE
+
+
+def set_default_priority(priority: int):
+    """Priority of requests made outside any `request_priority` block in this process."""
+    global _default_priority
+    _default_priority = priority
+
+
+def current_priority() -> int:
+    priority = _priority.get()
+    return _default_priority if priority is None else priority
+
+
+@contextlib.contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Token bucket whose waiters are served by priority, then in arrival order.
+
+    The rate adapts to the provider: it is halved on every 429 and grows
+    back slowly on success (AIMD), `pause` blocks everyone until a reset
+    time, and `limit_remaining` never lets local tokens exceed what the
+    provider says is left.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, now: float) -> float:
+        if now < self._paused_until:
+            return self._paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        with self._cond:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = self.clock()
+                    self._refill(now)
+                    if self._waiters[0] == ticket:
+                        wait = self._wait_time(now)
+                        if wait <= 0:
+                            self.tokens -= 1
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            self._cond.notify_all()
+
+    def limit_remaining(self, remaining: float):
+        with self._cond:
+            self._refill(self.clock())
+            self.tokens = min(self.tokens, remaining)
+
+    def throttled(self):
+        with self._cond:
+            self._refill(self.clock())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        with self._cond:
+            if self.rate < self.max_rate:
+                self._refill(self.clock())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class CircuitBreaker:
+    """Stops calling a provider after consecutive failures, then lets a single probe through after a cool-down."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self._opened_at + self.reset_timeout - self.clock())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = self.clock()
+
+    def record_throttled(self):
+        # A throttled probe says nothing of the provider's health: wait another cool-down before probing again
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+                self._opened_at = self.clock()
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # "1s", "6m0s", "20ms", "1h2m3.5s" (OpenAI-style reset headers) or plain seconds
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def _parse_reset(value: str, now: float) -> Optional[float]:
+    duration = _parse_duration(value)
+    if duration is not None:
+        return duration
+    try:
+        # RFC 3339 / HTTP dates (Anthropic reset headers, Retry-After dates)
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00")) if "T" in value else parsedate_to_datetime(value)
+        return max(0.0, moment.timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+class ApiGate:
+    """Every call to one provider goes through its gate.
+
+    Calls wait for a rate-limit token (by priority), are refused while the
+    circuit is open, and are retried with jittered exponential backoff on
+    transient errors (`retry_on`) and retryable statuses, honouring `Retry-After`.
+    """
+
+    def __init__(self, name: str, bucket: TokenBucket, breaker: Optional[CircuitBreaker] = None,
+                 max_retries: int = API_MAX_RETRIES, backoff_base: float = API_BACKOFF_BASE,
+                 backoff_max: float = API_BACKOFF_MAX, sleep: Callable[[float], None] = time.sleep,
+                 retry_on: Tuple[type, ...] = (ConnectionError, TimeoutError)):
+        self.name = name
+        self.bucket = bucket
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.retry_on = retry_on
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def backoff(self, attempt: int, server_delay: Optional[float] = None) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt], but never earlier than the server asked
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, min(server_delay, self.backoff_max)) if server_delay is not None else delay
+
+    def observe(self, headers: Mapping[str, str]):
+        """Adapt the bucket to the rate-limit headers of a response."""
+        headers = {key.lower(): value for key, value in headers.items()}
+        now = time.time()
+        for prefix in ("x-ratelimit-", "anthropic-ratelimit-"):
+            remaining = headers.get(f"{prefix}remaining-requests") or headers.get(f"{prefix}requests-remaining")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            self.bucket.limit_remaining(remaining)
+            if remaining < 1:
+                reset = headers.get(f"{prefix}reset-requests") or headers.get(f"{prefix}requests-reset")
+                delay = _parse_reset(reset, now) if reset else None
+                if delay:
+                    self.bucket.pause(delay)
+        return headers
+
+    def call(self, send: Callable[[], Any], priority: Optional[int] = None) -> Any:
+        """Run `send()` (which returns a response) under the gate; the last response or error is returned/raised."""
+        priority = current_priority() if priority is None else priority
+        # Waits and retries are reported on the caller's trace span
+        trace = current_span()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                if attempt >= self.max_retries:
+                    raise CircuitOpenError(f"{self.name} circuit open after {self.breaker.failures} failures")
+                delay = max(self.breaker.retry_in(), self.backoff(attempt))
+                logging.warning(f"{self.name}: circuit open, retrying in {delay:.1f}s")
+                attempt += 1
+                self.sleep(delay)
+                continue
+
+            waiting_since = time.perf_counter()
+            self.bucket.acquire(priority)
+            trace.add(rate_wait_ms=round((time.perf_counter() - waiting_since) * 1000, 3))
+            self.stats["calls"] += 1
+            try:
+                response = send()
+            except self.retry_on as e:
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logging.warning(f"{self.name}: {type(e).__name__} ({e}), retry {attempt + 1} in {delay:.1f}s")
+            except Exception:
+                # Not retried, but still counted: otherwise a half-open probe would never be resolved
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                raise
+            else:
+                headers = self.observe(getattr(response, "headers", None) or {})
+                status = response.status_code
+                if status not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    self.bucket.succeeded()
+                    return response
+                server_delay = _parse_reset(headers["retry-after"], time.time()) if "retry-after" in headers else None
+                if status == 429:
+                    # Throttling is the provider working as intended, not a failure
+                    self.stats["throttled"] += 1
+                    trace.add(throttled=1)
+                    self.bucket.throttled()
+                    self.breaker.record_throttled()
+                    if server_delay:
+                        self.bucket.pause(server_delay)
+                else:
+                    self.breaker.record_failure()
+                    self.stats["failures"] += 1
+                if attempt >= self.max_retries:
+                    return response
+                # A streamed response holds its pooled connection until closed
+                response.close()
+                delay = self.backoff(attempt, server_delay)
+                logging.warning(f"{self.name}: status {status}, retry {attempt + 1} in {delay:.1f}s")
+            attempt += 1
+            self.stats["retries"] += 1
+            trace.add(retries=1, backoff_ms=round(delay * 1000, 3))
+            self.sleep(delay)
+
+
+def create_gate(name: str, rpm: Optional[float] = None, share: float = 1.0) -> ApiGate:
+    """Gate for a provider; `share` scales its rate when several processes split one quota."""
+    rpm = rpm if rpm is not None else PROVIDER_RPM.get(name, 60.0)
+    rate = rpm * share / 60
+    import requests
+
+    # Invalid requests (bad URL, bad payload...) fail at once; only transient errors are retried
+    retry_on = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)
+    return ApiGate(name, TokenBucket(rate, capacity=max(rate * 5, 1.0)), retry_on=retry_on)
+
+
+_gates: Dict[str, ApiGate] = {}
+_gates_lock = threading.Lock()
+_gate_share = 1.0
+
+
+def get_gate(name: str) -> ApiGate:
+    with _gates_lock:
+        if name not in _gates:
+            _gates[name] = create_gate(name, share=_gate_share)
+        return _gates[name]
+
+
+def set_gate_share(share: float):
+    """Fraction of every provider quota used by this process (e.g. 1/N for N batch workers)."""
+    global _gate_share
+    with _gates_lock:
+        _gate_share = share
+        _gates.clear()
@@ -0,0 +1,217 @@
+import json
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+# Above this many nodes the SVG shows grid clusters instead of individual nodes
+RENDER_MAX_NODES = 2000
+# Number of elements emitted per chunk by the generators
+RENDER_CHUNK_SIZE = 500
+
+LEVEL_COLOURS = {"niveau1": "#d62728", "niveau2": "#1f77b4", "niveau3": "#7f7f7f"}
+DEFAULT_STYLESHEET = """
+.edge { stroke: #999; stroke-opacity: 0.5; }
+.node { stroke: #fff; stroke-width: 0.5; }
+.cluster { fill: #1f77b4; fill-opacity: 0.6; stroke: #fff; }
+.label { font: 10px sans-serif; pointer-events: none; }
+"""
+
+
+class Scene:
+    """Nodes, edges and (for large graphs) clusters ready to be drawn."""
+
+    def __init__(self, ids: List[str], positions: np.ndarray, levels: List[str],
+                 sources: np.ndarray, targets: np.ndarray, max_nodes: int = RENDER_MAX_NODES):
+        self.ids = ids
+        self.positions = positions
+        self.levels = levels
+        self.sources = sources
+        self.targets = targets
+        self.clustered = len(ids) > max_nodes
+        if self.clustered:
+            self._build_clusters(max_nodes)
+
+    def _build_clusters(self, max_nodes: int):
+        # Level of detail: bin nodes on a grid with at most `max_nodes` cells
+        side = max(int(np.sqrt(max_nodes)), 1)
+        low = self.positions.min(axis=0)
+        span = np.maximum(self.positions.max(axis=0) - low, 1e-9)
+        cells = np.minimum(((self.positions - low) / span * side).astype(np.int64), side - 1)
+        cell_index = cells[:, 0] * side + cells[:, 1]
+        occupied, self.node_cluster = np.unique(cell_index, return_inverse=True)
+        count = len(occupied)
+        self.cluster_sizes = np.bincount(self.node_cluster, minlength=count)
+        self.cluster_positions = np.stack([
+            np.bincount(self.node_cluster, weights=self.positions[:, 0], minlength=count),
+            np.bincount(self.node_cluster, weights=self.positions[:, 1], minlength=count),
+        ], axis=1) / self.cluster_sizes[:, None]
+
+        # Edges between clusters are merged and weighted by how many they replace
+        cluster_sources = self.node_cluster[self.sources]
+        cluster_targets = self.node_cluster[self.targets]
+        keep = cluster_sources != cluster_targets
+        keys, weights = np.unique(cluster_sources[keep] * count + cluster_targets[keep], return_counts=True)
+        # Only the heaviest links are drawn so the overview stays readable and small
+        heaviest = np.sort(np.argsort(-weights, kind="stable")[:max_nodes * 2])
+        keys, weights = keys[heaviest], weights[heaviest]
+        self.cluster_edges = (keys // count, keys % count, weights)
+
+
+def build_scene(data_analysis: Dict[str, Any], positions: Dict[str, List[float]],
+                max_nodes: int = RENDER_MAX_NODES, edges: Optional[List[Tuple[str, str]]] = None) -> Scene:
+    """Scene of the laid out nodes; `edges` are (source id, target id) pairs, the analysis relations by default."""
+    ids = list(positions)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    level_of = {}
+    for level, members in (data_analysis.get("hiérarchie") or {}).items():
+        for member in members if isinstance(members, list) else []:
+            level_of.setdefault(str(member), level)
+    if edges is None:
+        edges = [(relation.get("de"), relation.get("à"))
+                 for relation in data_analysis.get("relations", []) if isinstance(relation, dict)]
+    pairs = [(index.get(str(source)), index.get(str(target))) for source, target in edges]
+    pairs = [(source, target) for source, target in pairs if source is not None and target is not None]
+    return Scene(
+        ids,
+        np.array([positions[node_id] for node_id in ids], dtype=float).reshape(-1, 2),
+        [level_of.get(node_id, "") for node_id in ids],
+        np.array([source for source, _ in pairs], dtype=np.int64),
+        np.array([target for _, target in pairs], dtype=np.int64),
+        max_nodes,
+    )
+
+
+def _chunks(lines: Iterable[str], chunk_size: int = RENDER_CHUNK_SIZE) -> Iterator[str]:
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= chunk_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def iter_svg(scene: Scene, width: int = 1000, height: int = 1000,
+             stylesheet: Optional[str] = None) -> Iterator[str]:
+    """Yield the SVG document piece by piece; the whole document is never built in memory."""
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" id="graph" viewBox="0 0 {width} {height}" '
+           f'width="{width}" height="{height}">\n')
+    yield f"<style>{stylesheet or DEFAULT_STYLESHEET}</style>\n"
+    yield '<g id="viewport">\n'
+
+    if scene.clustered:
+        cluster_sources, cluster_targets, weights = scene.cluster_edges
+        xs, ys = scene.cluster_positions[:, 0].tolist(), scene.cluster_positions[:, 1].tolist()
+        yield '<g id="edges" class="lod-clusters">\n'
+        yield from _chunks(
+            f'<line class="edge" x1="{xs[s]:.1f}" y1="{ys[s]:.1f}" x2="{xs[t]:.1f}" y2="{ys[t]:.1f}" '
+            f'stroke-width="{1 + np.log1p(w):.1f}"/>\n'
+            for s, t, w in zip(cluster_sources.tolist(), cluster_targets.tolist(), weights.tolist()))
+        yield '</g>\n<g id="nodes" class="lod-clusters">\n'
+        yield from _chunks(
+            f'<circle class="cluster" data-size="{size}" cx="{x:.1f}" cy="{y:.1f}" r="{2 + size ** 0.5:.1f}"/>\n'
+            for size, x, y in zip(scene.cluster_sizes.tolist(), xs, ys))
+        yield '</g>\n'
+    else:
+        xs, ys = scene.positions[:, 0].tolist(), scene.positions[:, 1].tolist()
+        yield '<g id="edges">\n'
+        yield from _chunks(
+            f'<line class="edge" x1="{xs[s]:.1f}" y1="{ys[s]:.1f}" x2="{xs[t]:.1f}" y2="{ys[t]:.1f}"/>\n'
+            for s, t in zip(scene.sources.tolist(), scene.targets.tolist()))
+        yield '</g>\n<g id="nodes">\n'
+        yield from _chunks(
+            f'<circle class="node" data-id={quoteattr(node_id)} cx="{x:.1f}" cy="{y:.1f}" '
+            f'r="{6 if level == "niveau1" else 4}" fill="{LEVEL_COLOURS.get(level, "#7f7f7f")}"/>\n'
+            for node_id, level, x, y in zip(scene.ids, scene.levels, xs, ys))
+        yield '</g>\n'
+
+    yield '</g>\n<text id="tooltip" class="label" x="0" y="0"></text>\n</svg>\n'
+
+
+JS_RUNTIME = """
+(function () {
+  var svg = document.getElementById("graph");
+  var viewport = document.getElementById("viewport");
+  var ns = "http://www.w3.org/2000/svg";
+  var scale = 1, tx = 0, ty = 0, detail = null;
+
+  function apply() {
+    viewport.setAttribute("transform", "translate(" + tx + "," + ty + ") scale(" + scale + ")");
+    if (GRAPH.clustered) updateDetail();
+  }
+
+  // Level of detail: individual nodes are only drawn for the visible area once zoomed in
+  function updateDetail() {
+    if (detail) { viewport.removeChild(detail); detail = null; }
+    if (scale < GRAPH.detailScale) return;
+    var box = svg.viewBox.baseVal, x0 = -tx / scale, y0 = -ty / scale;
+    var x1 = x0 + box.width / scale, y1 = y0 + box.height / scale, drawn = 0;
+    detail = document.createElementNS(ns, "g");
+    for (var i = 0; i < GRAPH.ids.length && drawn < GRAPH.maxDetail; i++) {
+      var x = GRAPH.x[i], y = GRAPH.y[i];
+      if (x < x0 || x > x1 || y < y0 || y > y1) continue;
+      var c = document.createElementNS(ns, "circle");
+      c.setAttribute("class", "node"); c.setAttribute("cx", x); c.setAttribute("cy", y);
+      c.setAttribute("r", 3 / scale); c.setAttribute("data-id", GRAPH.ids[i]);
+      detail.appendChild(c); drawn++;
+    }
+    viewport.appendChild(detail);
+  }
+
+  svg.addEventListener("wheel", function (event) {
+    event.preventDefault();
+    var factor = event.deltaY < 0 ? 1.2 : 1 / 1.2;
+    tx = event.offsetX - (event.offsetX - tx) * factor;
+    ty = event.offsetY - (event.offsetY - ty) * factor;
+    scale *= factor;
+    apply();
+  });
+
+  var drag = null;
+  svg.addEventListener("mousedown", function (event) { drag = [event.clientX - tx, event.clientY - ty]; });
+  window.addEventListener("mouseup", function () { drag = null; });
+  window.addEventListener("mousemove", function (event) {
+    if (!drag) return;
+    tx = event.clientX - drag[0]; ty = event.clientY - drag[1];
+    apply();
+  });
+
+  var tooltip = document.getElementById("tooltip");
+  svg.addEventListener("mouseover", function (event) {
+    if (event.target.tagName !== "circle") return;
+    var id = event.target.getAttribute("data-id");
+    tooltip.textContent = id || event.target.getAttribute("data-size") + " nodes";
+    tooltip.setAttribute("x", event.offsetX + 8);
+    tooltip.setAttribute("y", event.offsetY - 8);
+  });
+  svg.addEventListener("mouseout", function () { tooltip.textContent = ""; });
+})();
+"""
+
+
+def iter_js(scene: Scene, detail_scale: float = 4.0, max_detail: int = 2000) -> Iterator[str]:
+    """Yield the interaction script; node data is streamed as JSON arrays in chunks."""
+    yield "var GRAPH = {\n"
+    yield f"clustered: {'true' if scene.clustered else 'false'}, detailScale: {detail_scale}, maxDetail: {max_detail},\n"
+    for key, values in (("ids", scene.ids), ("x", scene.positions[:, 0].round(1).tolist()),
+                        ("y", scene.positions[:, 1].round(1).tolist())):
+        yield f"{key}: ["
+        yield from _chunks((("," if i else "") + json.dumps(value) for i, value in enumerate(values)),
+                           RENDER_CHUNK_SIZE * 4)
+        yield "],\n"
+    yield "};\n"
+    yield JS_RUNTIME
+
+
+def write_stream(chunks: Iterable[str], target: Union[str, IO[str]]) -> int:
+    """Write chunks to a path or an open text stream (file, socket makefile...); returns characters written."""
+    if isinstance(target, str):
+        with open(target, "w", encoding="utf-8") as file:
+            return write_stream(chunks, file)
+    written = 0
+    for chunk in chunks:
+        target.write(chunk)
+        written += len(chunk)
+    return written
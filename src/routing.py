@@ -0,0 +1,290 @@
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tracing import current_span
+
+# Answer times kept per route for the latency quantiles
+ROUTE_STATS_WINDOW = int(os.getenv('ROUTE_STATS_WINDOW', '200'))
+# A second route is tried when the first has not answered within this quantile of its answer times
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', '0.95'))
+# Answers needed before a route's quantile is trusted; no hedging before that
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'true').lower() in ('1', 'true', 'yes')
+
+# Providers whose API accepts images along with the messages
+IMAGE_PROVIDERS = {"claude"}
+
+
+class Route:
+    """A provider and model an agent can be served by, written "provider:model"."""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Route':
+        provider, separator, model = spec.partition(":")
+        if not separator or not provider or not model:
+            raise ValueError(f"Invalid route {spec!r}, expected provider:model")
+        return cls(provider, model)
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Route) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"Route({self.key!r})"
+
+
+def parse_agent_routes(spec: str, providers: Iterable[str] = ("deepseek", "claude")) -> Dict[str, List[Route]]:
+    """Routes per agent from JSON such as {"orchestrator": ["deepseek:deepseek-chat", "deepseek:deepseek-coder"]}.
+
+    Routes are listed cheapest first: later routes are used when earlier
+    ones fail or return an invalid answer, or as hedges.
+    """
+    if not spec.strip():
+        return {}
+    config = json.loads(spec)
+    if not isinstance(config, dict):
+        raise ValueError("Agent routes must be a JSON object of agent name -> list of routes")
+    agent_routes = {agent: [Route.parse(route) for route in routes] for agent, routes in config.items()}
+    for agent, routes in agent_routes.items():
+        unknown = [route.key for route in routes if route.provider not in providers]
+        if not routes or unknown:
+            raise ValueError(f"Agent {agent}: routes must be a non-empty list of known providers, got {unknown}")
+    return agent_routes
+
+
+class RouteStats:
+    """Answer times (seconds to the first text) and outcomes of recent calls on a route."""
+
+    def __init__(self, window: int = ROUTE_STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.counts = {"answers": 0, "failures": 0, "invalid": 0, "hedges": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str, latency: Optional[float] = None):
+        with self._lock:
+            self.counts[outcome] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < max(min_samples, 1):
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def as_dict(self) -> Dict[str, Any]:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        with self._lock:
+            return {**self.counts, "p50_s": None if p50 is None else round(p50, 3),
+                    "p95_s": None if p95 is None else round(p95, 3)}
+
+
+_stats: Dict[str, RouteStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_route_stats(route: Route) -> RouteStats:
+    with _stats_lock:
+        stats = _stats.get(route.key)
+        if stats is None:
+            stats = _stats[route.key] = RouteStats()
+        return stats
+
+
+def route_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        routes = dict(_stats)
+    return {key: stats.as_dict() for key, stats in routes.items()}
+
+
+def reset_route_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class _Abandoned(Exception):
+    # Raised into the stream of a hedge that lost the race, so that it stops reading
+    pass
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="route")
+        return _hedge_executor
+
+
+class _Race:
+    """Calls on one or two routes for the same request; the first to answer wins.
+
+    "Answering" is delivering the first text: the first streamed chunk, or
+    the whole response when not streaming. From then on only the winner
+    feeds `on_text`, and the other call is abandoned.
+    """
+
+    def __init__(self, call: Callable[[Route, Callable[[str], None]], str], on_text):
+        self.call = call
+        self.on_text = on_text
+        self.winner: Optional[Route] = None
+        self.outcomes: Dict[Route, Tuple[Optional[str], Optional[BaseException]]] = {}
+        self.started: Dict[Route, float] = {}
+        self.changed = threading.Condition()
+
+    def _claim(self, route: Route) -> bool:
+        with self.changed:
+            if self.winner is None:
+                self.winner = route
+                get_route_stats(route).record("answers", time.perf_counter() - self.started[route])
+                self.changed.notify_all()
+            return self.winner == route
+
+    def run(self, route: Route):
+        def forward(chunk: str):
+            if not self._claim(route):
+                raise _Abandoned()
+            if self.on_text is not None:
+                self.on_text(chunk)
+
+        text, error = None, None
+        try:
+            text = self.call(route, forward)
+            # An empty completion never calls on_text
+            if not self._claim(route):
+                return
+        except _Abandoned:
+            return
+        except Exception as e:
+            error = e
+        with self.changed:
+            self.outcomes[route] = (text, error)
+            self.changed.notify_all()
+
+    def start(self, route: Route, in_thread: bool):
+        self.started[route] = time.perf_counter()
+        if in_thread:
+            # The call sees the caller's priority and trace span
+            _executor().submit(contextvars.copy_context().run, self.run, route)
+        else:
+            self.run(route)
+
+    def wait(self, routes: List[Route], timeout: Optional[float] = None) -> bool:
+        """Wait until a route answered or every route in `routes` finished; False on timeout."""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.winner is not None or all(r in self.outcomes for r in routes),
+                                         timeout)
+
+    def result(self, route: Route) -> Tuple[Optional[str], Optional[BaseException]]:
+        with self.changed:
+            self.changed.wait_for(lambda: route in self.outcomes)
+            return self.outcomes[route]
+
+
+def _hedge_delay(route: Route) -> Optional[float]:
+    return get_route_stats(route).quantile(HEDGE_QUANTILE, HEDGE_MIN_SAMPLES)
+
+
+def _fastest(routes: List[Route]) -> Route:
+    # Median answer time; routes without measurements keep their configured order after measured ones
+    def median(route: Route) -> float:
+        value = get_route_stats(route).quantile(0.5)
+        return math.inf if value is None else value
+    return min(routes, key=median)
+
+
+def run_routes(routes: List[Route], call: Callable[[Route, Callable[[str], None]], str],
+               validate: Optional[Callable[[str], Any]] = None, on_text=None,
+               hedge: Optional[bool] = None, on_reject: Optional[Callable[[], None]] = None) -> Tuple[str, Route, Any]:
+    """Text of the first acceptable answer among `routes`, the route that gave it, and what
+    `validate` returned for it (e.g. the parsed answer), so that callers need not parse it again.
+
+    `call(route, on_text)` sends the request on a route. Routes are tried
+    in order: an error, or an answer rejected by `validate` (by raising),
+    moves on to the next one. With hedging, when a route has not answered
+    within its usual p95, the fastest remaining route is called as well.
+    The winner's text reaches `on_text` as it streams in; when that answer
+    then fails or is rejected, `on_reject()` is called before the next
+    route streams, so that what was taken from it can be dropped. If every
+    route answers invalidly, the last answer is returned (with None) for
+    the caller to report.
+    """
+    if not routes:
+        raise ValueError("No route to call")
+    hedge = HEDGE_REQUESTS if hedge is None else hedge
+    trace = current_span()
+    remaining = list(routes)
+    last_text, last_route, last_error = None, None, None
+    while remaining:
+        primary = remaining.pop(0)
+        race = _Race(call, on_text)
+        delay = _hedge_delay(primary) if hedge and remaining else None
+        if delay is None:
+            race.start(primary, in_thread=False)
+        else:
+            race.start(primary, in_thread=True)
+            if not race.wait([primary], delay):
+                backup = _fastest(remaining)
+                remaining.remove(backup)
+                logging.info(f"{primary.key} has not answered in {delay:.1f}s, hedging with {backup.key}")
+                get_route_stats(backup).record("hedges")
+                trace.add(hedges=1)
+                race.start(backup, in_thread=True)
+            race.wait(list(race.started))
+
+        # Without a winner every route of this round failed before answering
+        tried = [race.winner] if race.winner is not None else list(race.started)
+        for route in tried:
+            text, error = race.result(route)
+            if error is not None:
+                get_route_stats(route).record("failures")
+                logging.warning(f"Route {route.key} failed: {str(error)}")
+                last_error = error
+                if route == race.winner and on_reject is not None:
+                    on_reject()
+                continue
+            if route != primary:
+                get_route_stats(route).record("hedge_wins")
+            value = None
+            if validate is not None:
+                try:
+                    value = validate(text)
+                except (ValueError, TypeError) as e:
+                    get_route_stats(route).record("invalid")
+                    logging.warning(f"Route {route.key} returned an invalid answer: {str(e)}")
+                    last_text, last_route = text, route
+                    if on_reject is not None:
+                        on_reject()
+                    continue
+            trace.set(route=route.key)
+            return text, route, value
+        if remaining:
+            trace.add(escalations=1)
+            logging.info(f"Escalating to {remaining[0].key}")
+
+    if last_text is not None:
+        trace.set(route=last_route.key)
+        return last_text, last_route, None
+    raise last_error
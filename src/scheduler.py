@@ -0,0 +1,265 @@
+import contextlib
+import contextvars
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from manifest import RunManifest, fingerprint, stage_fingerprint
+from tracing import span
+
+
+class Stage:
+    """A pipeline step: `func` receives a dict with the outputs of `deps`.
+
+    `version` is folded into the stage fingerprint, so changing it (e.g. when
+    the agent template changes) invalidates outputs stored in a manifest.
+
+    `fields` names values derived from the output (name -> function of the
+    output). Other stages can depend on one of them as "stage.field"; they
+    start as soon as the stage calls `publish(field, value)` while still
+    running, or when it finishes otherwise. A published value is checked
+    against the final output (and against a later `publish`): if it
+    changed, the stages that used it run again.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (),
+                 version: str = "", fields: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.version = version
+        self.fields = dict(fields or {})
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r}, deps={list(self.deps)!r})"
+
+
+_MISSING = object()
+
+# (stage name, event queue) of the stage running in the current context, for publish()
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+
+# Callback receiving (stage name, status) for the stages run in the current context
+_stage_listener = contextvars.ContextVar('stage_listener', default=None)
+
+
+@contextlib.contextmanager
+def stage_listener(callback: Callable[[str, str], None]) -> Iterator[None]:
+    """Report the progress of the stages run in this block.
+
+    `callback(name, status)` is called with "running", "done", "failed" or
+    "reused", from the thread that runs the stage, so it must be thread-safe.
+    """
+    token = _stage_listener.set(callback)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+
+def _notify(name: str, status: str):
+    listener = _stage_listener.get()
+    if listener is not None:
+        try:
+            listener(name, status)
+        except Exception as e:
+            # Progress reporting never fails the pipeline
+            logging.warning(f"Stage listener failed on {name} {status}: {str(e)}")
+
+
+def publish(field: str, value: Any) -> bool:
+    """Hand a field of the running stage's output to the stages waiting for it; False outside a stage."""
+    current = _current_stage.get()
+    if current is None:
+        return False
+    name, events = current
+    events.put(("field", f"{name}.{field}", value))
+    return True
+
+
+def validate_stages(stages: List[Stage], initial: Dict[str, Any]) -> None:
+    names = set(initial)
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        names.add(stage.name)
+    names.update(f"{stage.name}.{field}" for stage in stages for field in stage.fields)
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in names]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    # Kahn's algorithm: every stage must become reachable from the initial values
+    done = set(initial)
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(dep.split(".")[0] in done for dep in stage.deps)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {[stage.name for stage in remaining]}")
+        done.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in done]
+
+
+def _run_stage(stage: Stage, inputs: Dict[str, Any], events: queue.Queue, submitted: float):
+    _current_stage.set((stage.name, events))
+    # Queue time: waiting for a free worker once every dependency was available
+    queue_ms = round((time.perf_counter() - submitted) * 1000, 3)
+    _notify(stage.name, "running")
+    try:
+        with span(f"stage:{stage.name}", "stage", queue_ms=queue_ms):
+            output = stage.func(inputs)
+        _notify(stage.name, "done")
+        events.put(("done", stage.name, output))
+    except BaseException as e:
+        _notify(stage.name, "failed")
+        events.put(("error", stage.name, e))
+
+
+def run_stages(stages: List[Stage], initial: Optional[Dict[str, Any]] = None,
+               max_workers: Optional[int] = None, manifest: Optional[RunManifest] = None,
+               on_output: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+    """Run stages as soon as their dependencies are available.
+
+    Independent stages run concurrently on a thread pool. The first stage
+    failure cancels everything not yet started and is re-raised once the
+    stages already running have finished. With a manifest, stages whose
+    inputs are unchanged reuse the recorded output and every completed
+    stage is recorded, including those that finished after a failure, so
+    that a new run only repeats what failed.
+
+    `on_output(name, output)` receives each stage output, run or reused, as
+    soon as it is available; it is called from the scheduling thread, so it
+    should hand slow work (e.g. writing files) off.
+    """
+    results = dict(initial or {})
+    validate_stages(stages, results)
+    fingerprints = {name: fingerprint(value) for name, value in results.items()} if manifest is not None else {}
+    input_fingerprints = {}
+    by_name = {stage.name: stage for stage in stages}
+
+    def store(name: str, value: Any, output_fingerprint: Optional[str] = None):
+        results[name] = value
+        if manifest is not None:
+            fingerprints[name] = output_fingerprint or fingerprint(value)
+
+    def finish(stage: Stage, output: Any, output_fingerprint: Optional[str] = None):
+        store(stage.name, output, output_fingerprint)
+        if on_output is not None:
+            on_output(stage.name, output)
+        # Fields not published while the stage ran are derived from its output; published ones must agree with it
+        for field, derive in stage.fields.items():
+            name = f"{stage.name}.{field}"
+            value = derive(output)
+            if name not in results:
+                store(name, value)
+            elif name in early and early.pop(name) != value:
+                logging.info(f"Field {name} published early differs from the output, restarting its dependents")
+                store(name, value)
+                invalidate(name)
+
+    def invalidate(name: str):
+        # Stages that started from a value that has changed run again, as do the stages that used their outputs
+        for stage in stages:
+            if name not in stage.deps:
+                continue
+            if stage.name in running:
+                stale.add(stage.name)
+            elif stage.name in results:
+                forget(stage)
+
+    def forget(stage: Stage):
+        del results[stage.name]
+        retract_fields(stage)
+        if failure is None:
+            pending[stage.name] = stage
+        invalidate(stage.name)
+
+    def retract_fields(stage: Stage):
+        for field in stage.fields:
+            name = f"{stage.name}.{field}"
+            early.pop(name, None)
+            if results.pop(name, _MISSING) is not _MISSING:
+                invalidate(name)
+
+    pending = dict(by_name)
+    running = {}
+    failure = None
+    early = {}  # fields published while their stage ran, checked against its output
+    stale = set()  # running stages started from a value that has changed since
+    events = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=max_workers or max(len(stages), 1),
+                                  thread_name_prefix="stage")
+    try:
+        while pending or running:
+            ready = [stage for stage in pending.values() if all(dep in results for dep in stage.deps)]
+            reused_any = False
+            for stage in ready:
+                del pending[stage.name]
+                if manifest is not None:
+                    input_fingerprint = stage_fingerprint(stage.name, stage.version,
+                                                          {dep: fingerprints[dep] for dep in stage.deps})
+                    reused, output, output_fingerprint = manifest.lookup(stage.name, input_fingerprint)
+                    if reused:
+                        logging.info(f"Stage {stage.name} unchanged, reusing output from manifest")
+                        with span(f"stage:{stage.name}", "stage", reused=True):
+                            finish(stage, output, output_fingerprint)
+                        _notify(stage.name, "reused")
+                        reused_any = True
+                        continue
+                    input_fingerprints[stage.name] = input_fingerprint
+                inputs = {dep: results[dep] for dep in stage.deps}
+                logging.debug(f"Scheduling stage {stage.name}")
+                # Stages see the caller's context variables (e.g. the request priority)
+                running[stage.name] = executor.submit(contextvars.copy_context().run, _run_stage, stage, inputs,
+                                                      events, time.perf_counter())
+            if reused_any:
+                # Reused outputs may unblock more stages; look again before waiting
+                continue
+
+            kind, name, value = events.get()
+            if kind == "field":
+                if name.split(".")[0] in stale:
+                    continue
+                if name not in results:
+                    logging.debug(f"Field {name} published early")
+                    store(name, value)
+                    early[name] = value
+                elif name in early and early[name] != value:
+                    # A later answer of the same stage (e.g. after a rejected one) changed the field
+                    logging.info(f"Field {name} published again with another value, restarting its dependents")
+                    store(name, value)
+                    early[name] = value
+                    invalidate(name)
+                continue
+            running.pop(name)
+            if name in stale:
+                # Started from a value that has changed: its output and fields are discarded and it runs again
+                stale.discard(name)
+                retract_fields(by_name[name])
+                if failure is None:
+                    pending[name] = by_name[name]
+                continue
+            if kind == "error":
+                if failure is None:
+                    failure = value
+                    pending.clear()
+                    if running:
+                        logging.info(f"Stage {name} failed, waiting for {len(running)} running stages")
+                continue
+            if manifest is not None:
+                output_fingerprint = manifest.record(name, input_fingerprints[name], value)
+                finish(by_name[name], value, output_fingerprint)
+            else:
+                finish(by_name[name], value)
+    finally:
+        # Don't start anything else once a stage has failed
+        for future in running.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    if failure is not None:
+        raise failure
+    return results
@@ -0,0 +1,399 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from rate_limit import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from routing import route_stats
+from scheduler import stage_listener
+
+SERVICE_HOST = os.getenv('SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', '8080'))
+# Jobs run at the same time; each one runs its stages on MAX_CONCURRENT_STAGES threads
+SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS', '4'))
+# Jobs waiting for a worker before submissions are refused (HTTP 429)
+SERVICE_MAX_QUEUED = int(os.getenv('SERVICE_MAX_QUEUED', '64'))
+# Finished jobs (and their results) are kept this many seconds
+SERVICE_JOB_TTL = float(os.getenv('SERVICE_JOB_TTL', '3600'))
+# Seconds between keep-alive comments on an idle progress stream
+SERVICE_KEEPALIVE = 15.0
+
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+FINISHED = ("done", "failed", "cancelled")
+
+
+class ServiceBusyError(Exception):
+    pass
+
+
+class Job:
+    """A graph generation request, with its progress events and, once finished, its result or error."""
+
+    def __init__(self, job_id: str, raw_data: str, priority: int, max_iterations: int):
+        self.job_id = job_id
+        self.raw_data = raw_data
+        self.priority = priority
+        self.max_iterations = max_iterations
+        self.status = "queued"
+        self.stages: Dict[str, str] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def _emit(self, **event):
+        # Called with self._changed held
+        self.events.append({"seq": len(self.events) + 1, "time": round(time.time(), 3), **event})
+        self._changed.notify_all()
+
+    def set_status(self, status: str, **details):
+        with self._changed:
+            self.status = status
+            if status == "running":
+                self.started = time.time()
+            elif status in FINISHED:
+                self.finished = time.time()
+                # The input is not needed any more; results are kept until the job expires
+                self.raw_data = None
+            self._emit(event="job", status=status, **details)
+
+    def on_stage(self, name: str, status: str):
+        with self._changed:
+            self.stages[name] = status
+            self._emit(event="stage", stage=name, status=status)
+
+    def wait_events(self, after: int, timeout: float) -> List[Dict[str, Any]]:
+        """Events after sequence number `after`, waiting up to `timeout` seconds for one."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after or self.done, timeout)
+            return self.events[after:]
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._changed:
+            status = {"id": self.job_id, "status": self.status, "priority": self.priority,
+                      "stages": dict(self.stages), "submitted": self.submitted, "started": self.started,
+                      "finished": self.finished}
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+def _generate(raw_data: str, **kwargs) -> Dict[str, Any]:
+    from main import generate_interactive_graph
+    return generate_interactive_graph(raw_data, **kwargs)
+
+
+class JobService:
+    """Runs graph jobs on a fixed pool of worker threads, highest priority first.
+
+    All jobs share the process's clients, connection pools, rate-limit
+    gates and response cache, which stay warm between jobs. Submissions
+    beyond `max_queued` waiting jobs are refused with ServiceBusyError.
+    """
+
+    def __init__(self, workers: int = SERVICE_WORKERS, max_queued: int = SERVICE_MAX_QUEUED,
+                 job_ttl: float = SERVICE_JOB_TTL, run: Optional[Callable[..., Dict[str, Any]]] = None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.job_ttl = job_ttl
+        self.run = run or _generate
+        self.jobs: Dict[str, Job] = {}
+        self._queue = []  # (priority, submission order, job)
+        self._order = itertools.count()
+        self._running = 0
+        self._stopping = False
+        self._lock = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _queued(self) -> int:
+        return sum(1 for _, _, job in self._queue if job.status == "queued")
+
+    def _expire(self):
+        deadline = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished < deadline]:
+            del self.jobs[job_id]
+
+    def submit(self, raw_data: str, priority: int = PRIORITY_INTERACTIVE, max_iterations: int = 3) -> Job:
+        with self._lock:
+            if self._stopping:
+                raise ServiceBusyError("Service is shutting down")
+            self._expire()
+            if self._queued() >= self.max_queued:
+                raise ServiceBusyError(f"{self.max_queued} jobs already waiting")
+            job = Job(uuid.uuid4().hex, raw_data, priority, max_iterations)
+            job.set_status("queued")
+            self.jobs[job.job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._order), job))
+            self._lock.notify()
+        logging.info(f"Job {job.job_id} queued with priority {priority}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job still waiting for a worker; running jobs are not interrupted."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            job.set_status("cancelled")
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"queued": self._queued(), "running": self._running, "workers": self.workers,
+                    "max_queued": self.max_queued, "jobs": len(self.jobs)}
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._queue or self._stopping)
+                if self._stopping:
+                    return
+                _, _, job = heapq.heappop(self._queue)
+                if job.status != "queued":
+                    continue
+                job.set_status("running")
+                self._running += 1
+            try:
+                self._run_job(job)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def _run_job(self, job: Job):
+        start = time.perf_counter()
+        try:
+            with stage_listener(job.on_stage):
+                job.result = self.run(job.raw_data, max_iterations=job.max_iterations, priority=job.priority)
+        except Exception as e:
+            logging.error(f"Job {job.job_id} failed: {str(e)}")
+            job.error = str(e)
+            job.set_status("failed", error=str(e))
+            return
+        job.set_status("done")
+        logging.info(f"Job {job.job_id} done in {time.perf_counter() - start:.1f}s")
+
+    def close(self, wait: bool = True):
+        """Stop taking jobs; workers finish the job they are running, queued jobs are dropped."""
+        with self._lock:
+            self._stopping = True
+            for _, _, job in self._queue:
+                if job.status == "queued":
+                    job.set_status("cancelled")
+            self._lock.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """JSON API of the job service.
+
+    POST /jobs                 submit {"data": ..., "priority": "interactive"|"batch"|int, "max_iterations": 3}
+    GET /jobs/<id>             status and per-stage progress
+    GET /jobs/<id>/result      result of a finished job (409 until then)
+    GET /jobs/<id>/events      progress as server-sent events, until the job finishes
+    DELETE /jobs/<id>          cancel a queued job
+    GET /health                queue and worker counts, latency statistics of each route
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.client_address[0]} {format % args}")
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        self.send_json(status, {"error": message}, headers)
+
+    def route(self):
+        # (job, action) for /jobs/<id>[/action], with a 404 already sent for unknown jobs
+        match = re.match(r"^/jobs/([0-9a-f]+)(?:/(result|events))?/?$", urlparse(self.path).path)
+        if match is None:
+            self.send_error_json(404, "Not found")
+            return None, None
+        job = self.service.get(match.group(1))
+        if job is None:
+            self.send_error_json(404, f"Unknown job {match.group(1)}")
+            return None, None
+        return job, match.group(2)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            # Per-route answer times and outcomes, as used for hedging
+            self.send_json(200, {**self.service.stats(), "routes": route_stats()})
+            return
+        job, action = self.route()
+        if job is None:
+            return
+        if action is None:
+            self.send_json(200, job.as_dict())
+        elif action == "result":
+            if job.status == "done":
+                self.send_json(200, job.result)
+            else:
+                self.send_json(409, job.as_dict())
+        else:
+            self.send_events(job)
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self.send_error_json(404, "Not found")
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(request, dict) or "data" not in request:
+                raise ValueError('expected a JSON object with a "data" field')
+            priority = request.get("priority", "interactive")
+            priority = PRIORITIES[priority] if isinstance(priority, str) else int(priority)
+            max_iterations = int(request.get("max_iterations", 3))
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error_json(400, f"Invalid job request: {str(e)}")
+            return
+        data = request["data"]
+        raw_data = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        try:
+            job = self.service.submit(raw_data, priority, max_iterations)
+        except ServiceBusyError as e:
+            # Backpressure: clients retry later instead of growing the queue without bound
+            self.send_error_json(429, str(e), {"Retry-After": "5"})
+            return
+        self.send_json(202, job.as_dict(), {"Location": f"/jobs/{job.job_id}"})
+
+    def do_DELETE(self):
+        job, action = self.route()
+        if job is None:
+            return
+        if action is not None or not self.service.cancel(job.job_id):
+            self.send_json(409, job.as_dict())
+            return
+        self.send_json(200, job.as_dict())
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_events(self, job: Job):
+        # Clients reconnecting with Last-Event-ID (or ?after=N) only receive the events they missed
+        query = parse_qs(urlparse(self.path).query)
+        cursor = self.headers.get("Last-Event-ID") or query.get("after", ["0"])[0]
+        try:
+            after = int(cursor)
+            if after < 0:
+                raise ValueError(cursor)
+        except ValueError:
+            self.send_error_json(400, f"Invalid event id: {cursor!r}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            while True:
+                events = job.wait_events(after, SERVICE_KEEPALIVE)
+                for event in events:
+                    self.send_chunk(f"id: {event['seq']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                                    .encode('utf-8'))
+                    after = event["seq"]
+                if job.done and after >= len(job.events):
+                    break
+                if not events:
+                    self.send_chunk(b": keep-alive\n\n")
+            self.send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            logging.debug(f"Progress stream of job {job.job_id} closed by the client")
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: JobService, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        super().__init__((host, port), ServiceHandler)
+        self.service = service
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def run_service():
+    from cache import create_response_cache
+    from main import create_image_store, set_image_store, set_response_cache
+
+    parser = argparse.ArgumentParser(description="Learn Everything: graph generation service (HTTP job API)")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help='Jobs run concurrently')
+    parser.add_argument('--max-queued', type=int, default=SERVICE_MAX_QUEUED,
+                        help='Waiting jobs before new submissions are refused with HTTP 429')
+    parser.add_argument('--cache-dir', default=os.getenv('RESPONSE_CACHE_DIR', '.cache/learn-anything'),
+                        help='Directory of the on-disk agent response cache')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='Expire cached responses after this many seconds')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the APIs, ignoring cached responses')
+    parser.add_argument('--image-store', choices=['github', 'local'],
+                        help='Where generated images are stored (default: $IMAGE_STORE or github)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Configuration, agents and clients are loaded once and shared by every job
+    cache = None
+    if not args.no_cache:
+        cache = create_response_cache(os.path.join(args.cache_dir, 'responses.sqlite'), ttl=args.cache_ttl)
+        set_response_cache(cache)
+    if args.image_store:
+        set_image_store(create_image_store(args.image_store))
+
+    service = JobService(args.workers, args.max_queued)
+    server = ServiceServer(service, args.host, args.port)
+    logging.info(f"Serving on {server.url} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if cache is not None:
+            logging.info(f"Response cache: {cache.report()}")
+
+
+if __name__ == "__main__":
+    run_service()
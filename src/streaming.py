@@ -0,0 +1,147 @@
+import json
+import re
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+_STRUCTURAL = re.compile(r'["{}\[\],]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def iter_sse_data(lines: Iterable[Union[str, bytes]]) -> Iterator[str]:
+    """Data payloads of a server-sent event stream, one per event, ending at `[DONE]`."""
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+        if not line:
+            if data:
+                payload = "\n".join(data)
+                data = []
+                if payload == "[DONE]":
+                    return
+                yield payload
+        elif line.startswith('data:'):
+            data.append(line[5:].lstrip(' '))
+        # event:, id:, retry: and comments carry nothing the deltas need
+    if data and "\n".join(data) != "[DONE]":
+        yield "\n".join(data)
+
+
+class StreamError(Exception):
+    pass
+
+
+def deepseek_deltas(payloads: Iterable[str], usage: Optional[dict] = None) -> Iterator[str]:
+    # OpenAI-compatible chunks: {"choices": [{"delta": {"content": "..."}}]}, token usage in the last one
+    for payload in payloads:
+        event = json.loads(payload)
+        if "error" in event:
+            raise StreamError(f"DeepSeek stream error: {event['error']}")
+        if usage is not None and event.get("usage"):
+            usage.update(event["usage"])
+        for choice in event.get("choices", []):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+def claude_deltas(payloads: Iterable[str], usage: Optional[dict] = None) -> Iterator[str]:
+    # Anthropic message stream: text arrives in content_block_delta events, token
+    # usage in message_start (input) and message_delta (output)
+    for payload in payloads:
+        event = json.loads(payload)
+        if event.get("type") == "error":
+            raise StreamError(f"Claude stream error: {event.get('error')}")
+        if usage is not None:
+            usage.update((event.get("message") or {}).get("usage") or event.get("usage") or {})
+        if event.get("type") == "content_block_delta":
+            text = (event.get("delta") or {}).get("text")
+            if text:
+                yield text
+
+
+class IncrementalJSONParser:
+    """Parses a JSON object fed in arbitrary pieces, returning each top-level field once its value is complete.
+
+    Text before the opening brace (e.g. a Markdown fence) is ignored. Only
+    the text of the field being received is kept, so completed fields can be
+    handed on and released while the rest of the object is still arriving.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment: List[str] = []
+
+    def _complete(self, fields: List[Tuple[str, Any]]):
+        text = "".join(self._segment).strip()
+        self._segment = []
+        if text:
+            fields.extend(json.loads("{" + text + "}").items())
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        fields = []
+        i, n = 0, len(text)
+        segment_start = None if self._depth == 0 else 0
+        while i < n and not self.done:
+            if self._depth == 0:
+                start = text.find('{', i)
+                if start < 0:
+                    break
+                self._depth = 1
+                i = segment_start = start + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    break
+                i = match.end()
+                if match.group() == '\\':
+                    self._escape = True
+                else:
+                    self._in_string = False
+            else:
+                match = _STRUCTURAL.search(text, i)
+                if match is None:
+                    break
+                char, i = match.group(), match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                elif char in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._segment.append(text[segment_start:match.start()])
+                        self._complete(fields)
+                        self.done = True
+                        segment_start = None
+                elif self._depth == 1:
+                    # A comma between top-level fields
+                    self._segment.append(text[segment_start:match.start()])
+                    self._complete(fields)
+                    segment_start = i
+        if segment_start is not None and not self.done:
+            self._segment.append(text[segment_start:])
+        return fields
+
+
+def stream_json_fields(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    parser = IncrementalJSONParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def collect_text(chunks: Iterable[str], on_text: Optional[Callable[[str], None]] = None) -> str:
+    """Join streamed text, passing every piece to `on_text` as it arrives."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if on_text is not None:
+            on_text(chunk)
+    return "".join(parts)
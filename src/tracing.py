@@ -0,0 +1,143 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Span:
+    def __init__(self, span_id: int, name: str, category: str, parent: Optional[int], start: float,
+                 attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.start = start
+        self.duration = 0.0
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"id": self.span_id, "parent": self.parent, "name": self.name, "cat": self.category,
+                "start": round(self.start, 6), "duration": round(self.duration, 6),
+                "thread": self.thread_name, **self.attrs}
+
+
+class Tracer:
+    """Collects spans of one run and exports them as JSON lines or as a Chrome trace.
+
+    Times are seconds since the tracer was created. Chrome traces open in
+    chrome://tracing, Perfetto or speedscope (flame chart per thread).
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.perf_counter() - self.origin
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "", **attrs) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(next(self._ids), name, category, parent.span_id if parent else None, self.now(), attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = self.now() - span.start
+            with self._lock:
+                self.spans.append(span)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total and maximum duration (ms) of spans by name, slowest total first."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration * 1000
+            entry["max_ms"] = max(entry["max_ms"], span.duration * 1000)
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["total_ms"]))
+
+    def write_jsonl(self, path: str):
+        with open(path, 'w') as file:
+            for span in sorted(self.spans, key=lambda span: span.start):
+                file.write(json.dumps(span.as_dict(), ensure_ascii=False, default=str) + "\n")
+
+    def write_chrome_trace(self, path: str):
+        pid = os.getpid()
+        events, threads = [], {}
+        for span in sorted(self.spans, key=lambda span: span.start):
+            threads[span.thread_id] = span.thread_name
+            events.append({"name": span.name, "cat": span.category or "pipeline", "ph": "X", "pid": pid,
+                           "tid": span.thread_id, "ts": round(span.start * 1e6, 1),
+                           "dur": round(span.duration * 1e6, 1), "args": span.attrs})
+        events.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}}
+                      for thread_id, name in threads.items())
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+    def write(self, path: str):
+        # The format follows the extension: .jsonl for JSON lines, a Chrome trace otherwise
+        if path.endswith('.jsonl'):
+            self.write_jsonl(path)
+        else:
+            self.write_chrome_trace(path)
+
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+_tracer: Optional[Tracer] = None
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, category: str = "", **attrs):
+    """Span of the active tracer, or a no-op when tracing is off."""
+    if _tracer is None:
+        return contextlib.nullcontext(_NULL_SPAN)
+    return _tracer.span(name, category, **attrs)
+
+
+def current_span() -> Span:
+    """Span enclosing the caller (attributes set on it are dropped when tracing is off)."""
+    return _current_span.get() or _NULL_SPAN
+
+
+class _NullSpan(Span):
+    def __init__(self):
+        super().__init__(0, "", "", None, 0.0, {})
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, **counts):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
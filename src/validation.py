@@ -0,0 +1,120 @@
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# Strings (possibly cut short by the end of the text) and the characters that give JSON its structure
+_SCAN = re.compile(r'"(?:[^"\\]+|\\.)*(?P<closed>")?|[{}\[\],]', re.S)
+_FENCE = re.compile(r'```[\w-]*[ \t]*\n?(.*?)(?:```|$)', re.S)
+_OPENING = re.compile(r'[{\[]')
+
+_TYPES = {"object": dict, "array": list, "string": str, "number": (int, float), "integer": int, "boolean": bool}
+_JSON_NAMES = {dict: "object", list: "array", str: "string", int: "number", float: "number", bool: "boolean",
+               type(None): "null"}
+
+
+class OutputError(ValueError):
+    """An agent answer that is not usable JSON, or not of the expected shape."""
+    pass
+
+
+def strip_fences(text: str) -> str:
+    # Only a fence opened before the JSON itself is markdown; ``` inside a string value is content
+    opening = _OPENING.search(text)
+    match = _FENCE.search(text)
+    if match is None or (opening is not None and opening.start() < match.start()):
+        return text
+    return match.group(1)
+
+
+def repair_json(text: str) -> str:
+    """Usual defects of LLM answers corrected: markdown fences and text around the JSON
+    removed, trailing commas dropped, and an answer cut short truncated to its last
+    complete element, with the open brackets closed."""
+    text = strip_fences(text)
+    opening = _OPENING.search(text)
+    if opening is None:
+        raise OutputError("no JSON object in the answer")
+    start = opening.start()
+    stack, removed = [], []
+    comma = None  # last comma, while only whitespace follows it
+    cut = None  # (end, depth) of the last complete element
+    end = None
+    for match in _SCAN.finditer(text, start):
+        token, position = match.group(), match.start()
+        if token[0] == '"':
+            comma = None
+            if match.group("closed") is None:
+                break  # cut short inside a string
+        elif token == ',':
+            cut = (position, len(stack))
+            comma = position
+        elif token in '{[':
+            stack.append('}' if token == '{' else ']')
+            comma = None
+        else:
+            if comma is not None and not text[comma + 1:position].strip():
+                removed.append(comma)
+            comma = None
+            if not stack or token != stack[-1]:
+                raise OutputError(f"unexpected {token!r} at character {position}")
+            stack.pop()
+            if not stack:
+                end = position + 1
+                break
+            cut = (position + 1, len(stack))
+
+    closing = ""
+    if end is None:
+        if cut is None:
+            raise OutputError("the answer stops before its first complete element")
+        end, depth = cut
+        closing = "".join(reversed(stack[:depth]))
+    pieces, previous = [], start
+    for position in removed:
+        if position < end:
+            pieces.append(text[previous:position])
+            previous = position + 1
+    pieces.append(text[previous:end])
+    return "".join(pieces) + closing
+
+
+def check_schema(value: Any, schema: Dict[str, Any], path: str = "$") -> None:
+    """Raise OutputError where `value` departs from `schema`.
+
+    Schemas are a subset of JSON Schema: "type", "properties", "required",
+    "items" and "additionalProperties" (as a schema). Fields not described
+    are accepted.
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        if not isinstance(value, _TYPES[expected]) or (isinstance(value, bool) and expected != "boolean"):
+            raise OutputError(f"{path}: expected {expected}, got {_JSON_NAMES.get(type(value), 'value')}")
+    if isinstance(value, dict):
+        for key in schema.get("required", ()):
+            if key not in value:
+                raise OutputError(f"{path}: missing field {key!r}")
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties")
+        for key, child in value.items():
+            child_schema = properties.get(key, additional if isinstance(additional, dict) else None)
+            if child_schema is not None:
+                check_schema(child, child_schema, f"{path}.{key}")
+    elif isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            check_schema(item, schema["items"], f"{path}[{index}]")
+
+
+def parse_output(text: str, schema: Optional[Dict[str, Any]] = None) -> Tuple[Any, bool]:
+    """Parsed agent answer, checked against `schema`, and whether it had to be repaired first."""
+    repaired = False
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError as e:
+        try:
+            value = json.loads(repair_json(text))
+        except (OutputError, json.JSONDecodeError):
+            raise OutputError(f"invalid JSON: {str(e)}")
+        repaired = True
+    if schema is not None:
+        check_schema(value, schema)
+    return value, repaired
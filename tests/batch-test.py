@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import patch
+import json
+import sys
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from batch import discover_jobs, is_batch_source, run_batch, run_job
+from data_loader import read_text
+
+def fake_generate(raw_data, max_iterations=3, manifest=None):
+    data = json.loads(read_text(raw_data))
+    if data.get("fail"):
+        raise ValueError("bad input")
+    return {"data_analysis": data}
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.input_dir = os.path.join(self.root, 'inputs')
+        self.output_dir = os.path.join(self.root, 'outputs')
+        os.makedirs(self.input_dir)
+        for name, data in (("a", {"n": 1}), ("b", {"n": 2}), ("c", {"fail": True})):
+            with open(os.path.join(self.input_dir, f"{name}.json"), 'w') as file:
+                json.dump(data, file)
+
+    def run_batch(self, jobs, **kwargs):
+        # Threads stand in for worker processes so that the patched pipeline is used
+        with patch('main.generate_interactive_graph', side_effect=fake_generate) as generate, \
+                patch('batch.ProcessPoolExecutor', ThreadPoolExecutor), patch('batch._init_worker'):
+            summary = run_batch(jobs, self.output_dir, workers=2, **kwargs)
+        return summary, generate
+
+    def test_batch_sources(self):
+        self.assertTrue(is_batch_source(self.input_dir))
+        self.assertTrue(is_batch_source(os.path.join(self.input_dir, '*.json')))
+        self.assertTrue(is_batch_source('topics.jsonl'))
+        self.assertFalse(is_batch_source(os.path.join(self.input_dir, 'a.json')))
+
+    def test_discover_from_directory_glob_and_manifest(self):
+        jobs = discover_jobs(self.input_dir, self.output_dir)
+        self.assertEqual([job.job_id for job in jobs], ["a", "b", "c"])
+        self.assertEqual(jobs[0].output_file, os.path.join(self.output_dir, "a.json"))
+        jobs = discover_jobs(os.path.join(self.input_dir, '[ab].json'), self.output_dir)
+        self.assertEqual([job.job_id for job in jobs], ["a", "b"])
+
+        manifest = os.path.join(self.root, 'topics.jsonl')
+        with open(manifest, 'w') as file:
+            file.write(json.dumps({"input": "inputs/b.json", "id": "topic-b"}) + "\n\n")
+            file.write(json.dumps({"input": "inputs/a.json", "output": os.path.join(self.root, "a-out.json")}) + "\n")
+        jobs = discover_jobs(manifest, self.output_dir)
+        self.assertEqual([job.job_id for job in jobs], ["topic-b", "a"])
+        self.assertEqual(jobs[0].input_file, os.path.join(self.input_dir, "b.json"))
+        self.assertEqual(jobs[1].output_file, os.path.join(self.root, "a-out.json"))
+
+    def test_run_job_reports_failures(self):
+        job = discover_jobs(self.input_dir, self.output_dir)[2]
+        with patch('main.generate_interactive_graph', side_effect=fake_generate):
+            status = run_job(job)
+        self.assertEqual(status["status"], "failed")
+        self.assertIn("bad input", status["error"])
+        self.assertFalse(os.path.exists(job.output_file))
+
+    def test_batch_writes_outputs_and_summary_and_resumes(self):
+        jobs = discover_jobs(self.input_dir, self.output_dir)
+        summary, generate = self.run_batch(jobs)
+        self.assertEqual(summary["counts"], {"done": 2, "failed": 1})
+        self.assertEqual([job["status"] for job in summary["jobs"]], ["done", "done", "failed"])
+        with open(os.path.join(self.output_dir, "b.json")) as file:
+            self.assertEqual(json.load(file), {"data_analysis": {"n": 2}})
+        with open(os.path.join(self.output_dir, "summary.json")) as file:
+            self.assertEqual(json.load(file)["counts"], summary["counts"])
+
+        # Running again only retries the failed job
+        summary, generate = self.run_batch(jobs)
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(summary["counts"], {"skipped": 2, "failed": 1})
+
+        summary, generate = self.run_batch(jobs, force=True)
+        self.assertEqual(generate.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
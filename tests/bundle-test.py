@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+import importlib.util
+import json
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from benchmark_harness import datasets, run_offline
+from bundle import BUNDLE_VERSION, Bundle, BundleError, BundleWriter, MANIFEST_FILE
+
+RESULT = {"svg_code": "<svg>" + "<circle r='1'/>" * 1000 + "</svg>", "js_code": "var a = 1;",
+          "images": [{"id": "é", "url": "file://x.png"}], "quality_report": {"score": 0.9}}
+
+def write_bundle(path, result, **options):
+    with BundleWriter(path, **options) as bundle:
+        for key, value in result.items():
+            bundle.write(key, value)
+        bundle.finish(result)
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "output")
+
+    def test_round_trip_and_json_export(self):
+        write_bundle(self.path, RESULT)
+        bundle = Bundle(self.path)
+        self.assertTrue(bundle.complete)
+        self.assertEqual(bundle.to_dict(), RESULT)
+        self.assertEqual(list(bundle), list(RESULT))
+        # Large artifacts are compressed, small ones stay as they are
+        self.assertEqual(bundle.artifacts["svg_code"]["compression"], "gzip")
+        self.assertLess(bundle.artifacts["svg_code"]["stored_size"], bundle.artifacts["svg_code"]["size"] / 10)
+        self.assertEqual(bundle.artifacts["js_code"]["file"], "js_code.txt")
+        self.assertEqual(bundle.mmap("js_code")[:], b"var a = 1;")
+        with self.assertRaises(BundleError):
+            bundle.mmap("svg_code")
+
+        export = os.path.join(os.path.dirname(self.path), "output.json")
+        bundle.export_json(export)
+        with open(export) as file:
+            self.assertEqual(file.read(), json.dumps(RESULT, indent=2))
+
+    def test_only_requested_artifacts_are_read(self):
+        write_bundle(self.path, RESULT)
+        bundle = Bundle(self.path)
+        with patch.object(Bundle, "open", wraps=bundle.open) as opened:
+            self.assertEqual(bundle["quality_report"], {"score": 0.9})
+            self.assertEqual(bundle["quality_report"], {"score": 0.9})
+        self.assertEqual([call.args for call in opened.call_args_list], [("quality_report",)])
+
+    def test_partial_bundle_is_readable_and_rewrites_replace_it(self):
+        writer = BundleWriter(self.path, compression="none")
+        writer.write("svg_code", RESULT["svg_code"])
+        writer.close()
+        bundle = Bundle(self.path)
+        self.assertFalse(bundle.complete)
+        self.assertEqual(bundle["svg_code"], RESULT["svg_code"])
+
+        write_bundle(self.path, {"js_code": "x"})
+        self.assertEqual(sorted(os.listdir(self.path)), ["js_code.txt", MANIFEST_FILE])
+        with self.assertRaises(KeyError):
+            Bundle(self.path)["svg_code"]
+
+    def test_failed_run_keeps_the_previous_bundle(self):
+        write_bundle(self.path, RESULT)
+        writer = BundleWriter(self.path)
+        writer.write("js_code", "var b = 2;")
+        writer.close()
+        bundle = Bundle(self.path)
+        self.assertFalse(bundle.complete)
+        self.assertEqual(bundle.to_dict(), {**RESULT, "js_code": "var b = 2;"})
+
+        write_bundle(self.path, {"js_code": "x"}, compression="none")
+        self.assertEqual(sorted(os.listdir(self.path)), ["js_code.txt", MANIFEST_FILE])
+
+    def test_foreign_manifest_files_are_not_deleted(self):
+        outside = os.path.join(os.path.dirname(self.path), "outside.txt")
+        for manifest in ({"version": BUNDLE_VERSION + 1, "artifacts": {"svg_code": {"file": "notes.txt"}}},
+                         {"version": BUNDLE_VERSION, "artifacts": {"svg_code": {"file": "../outside.txt"}}}):
+            os.makedirs(self.path, exist_ok=True)
+            for path in (os.path.join(self.path, "notes.txt"), outside):
+                with open(path, 'w') as file:
+                    file.write("keep")
+            with open(os.path.join(self.path, MANIFEST_FILE), 'w') as file:
+                json.dump(manifest, file)
+            write_bundle(self.path, {"js_code": "x"})
+            self.assertTrue(os.path.exists(os.path.join(self.path, "notes.txt")))
+            self.assertTrue(os.path.exists(outside))
+            self.assertEqual(Bundle(self.path).to_dict(), {"js_code": "x"})
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "zstandard is not installed")
+    def test_zstd(self):
+        write_bundle(self.path, RESULT, compression="zstd")
+        bundle = Bundle(self.path)
+        self.assertEqual(bundle.artifacts["svg_code"]["file"], "svg_code.txt.zst")
+        self.assertEqual(bundle.to_dict(), RESULT)
+
+    def test_pipeline_writes_its_result_as_a_bundle(self):
+        data = json.dumps(datasets.generate_complex_network(num_nodes=50, num_edges=100))
+        with BundleWriter(self.path) as writer:
+            result = run_offline(data, bundle=writer)
+        bundle = Bundle(self.path)
+        self.assertTrue(bundle.complete)
+        self.assertEqual(bundle.to_dict(), json.loads(json.dumps(result)))
+
+if __name__ == '__main__':
+    unittest.main()
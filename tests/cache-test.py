@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from cache import DiskCache, MemoryCache, ResponseCache, make_cache_key
+
+class TestResponseCache(unittest.TestCase):
+    def test_key_depends_on_every_field(self):
+        base = make_cache_key("model", "template", "input", 0.7, [{"data": "abc"}])
+        self.assertEqual(base, make_cache_key("model", "template", "input", 0.7, [{"data": "abc"}]))
+        self.assertNotEqual(base, make_cache_key("other", "template", "input", 0.7, [{"data": "abc"}]))
+        self.assertNotEqual(base, make_cache_key("model", "template", "input", 0.2, [{"data": "abc"}]))
+        self.assertNotEqual(base, make_cache_key("model", "template", "input", 0.7, [{"data": "abd"}]))
+
+    def test_memory_lru_eviction(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache(ttl=0.05)
+        cache.set("a", "1")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_disk_tier_survives_new_process_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "responses.sqlite")
+            first = ResponseCache(MemoryCache(), DiskCache(path))
+            first.set("key", "value")
+            first.disk.close()
+
+            second = ResponseCache(MemoryCache(), DiskCache(path))
+            self.assertEqual(second.get("key"), "value")
+            self.assertEqual(second.get("key"), "value")
+            self.assertEqual(second.report()["total"], {"hits": 2, "misses": 0, "evictions": 0})
+            self.assertEqual(second.disk.stats.hits, 1)  # second hit served from memory
+            second.disk.close()
+
+    def test_disk_size_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DiskCache(os.path.join(tmp, "responses.sqlite"), max_bytes=10)
+            cache.set("a", "123456")
+            cache.set("b", "123456")
+            self.assertEqual(len(cache), 1)
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
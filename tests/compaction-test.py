@@ -0,0 +1,83 @@
+import unittest
+import json
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from compaction import PromptBudgetError, compact_input, estimate_tokens, omit_fields, prune, tabulate
+
+COMMENTS = [{"id": f"comment_{i}", "authorId": f"user_{i % 7}", "postId": f"post_{i % 3}", "likes": i}
+            for i in range(50)]
+
+class TestCompaction(unittest.TestCase):
+    def test_records_become_a_lossless_table(self):
+        table = tabulate({"comments": COMMENTS})["comments"]
+        self.assertEqual(table["colonnes"], ["id", "authorId", "postId", "likes"])
+        self.assertEqual([dict(zip(table["colonnes"], row)) for row in table["lignes"]], COMMENTS)
+        # Mixed or short lists are left alone
+        mixed = [{"a": 1}, {"b": 2}, {"a": 3}, {"a": 4}]
+        self.assertEqual(tabulate(mixed), mixed)
+        self.assertEqual(tabulate(COMMENTS[:2]), COMMENTS[:2])
+
+    def test_prune_drops_empty_fields_and_samples_lists(self):
+        data = {"a": None, "b": "", "c": [], "d": {"e": {}}, "f": 0, "g": False, "h": list(range(10))}
+        self.assertEqual(prune(data), {"f": 0, "g": False, "h": list(range(10))})
+        self.assertEqual(prune(data, max_list_items=3)["h"], [0, 1, 2, "... (+7)"])
+
+    def test_sampled_records_stay_a_table(self):
+        text, _ = compact_input("orchestrator", {"comments": COMMENTS}, budget=100000)
+        table = json.loads(text)["comments"]
+        self.assertEqual(table["colonnes"], ["id", "authorId", "postId", "likes"])
+        self.assertEqual(len(table["lignes"]), 20)
+        self.assertEqual(table["omis"], 30)
+
+    def test_compact_input_is_smaller_than_default_json(self):
+        data = {"comments": COMMENTS, "thème": "éléments"}
+        text, sampled = compact_input("data_analyzer", json.dumps(data, indent=2), budget=100000)
+        self.assertFalse(sampled)
+        self.assertIn("éléments", text)
+        self.assertLess(len(text), len(json.dumps(data)) * 0.6)
+        # Plain text is sent unchanged
+        self.assertEqual(compact_input("data_analyzer", "du texte brut", budget=100), ("du texte brut", False))
+
+    def test_budget_is_enforced(self):
+        data = {"comments": COMMENTS * 20}
+        budget = estimate_tokens(json.dumps(COMMENTS[:10])) // 2
+        with self.assertRaises(PromptBudgetError):
+            compact_input("data_analyzer", data, budget)
+        # The orchestrator only needs the structure, so its lists are sampled to fit
+        text, sampled = compact_input("orchestrator", data, budget)
+        self.assertTrue(sampled)
+        self.assertLessEqual(estimate_tokens(text), budget)
+
+    def test_agents_only_get_the_fields_they_use(self):
+        design = {"nœuds": [{"id": "n1"}], "arêtes": [{"source": "n1", "target": "n1"}], "layout": "force-directed"}
+        # The design is free-form: whatever the designer put in it reaches the generators
+        text, _ = compact_input("js_generator", {"graph_design": design, "positions": {"n1": [0, 0]}}, 1000)
+        self.assertEqual(json.loads(text), {"graph_design": design, "positions": {"n1": [0, 0]}})
+        text, _ = compact_input("image_generator", design, 1000)
+        self.assertEqual(json.loads(text), {"nœuds": [{"id": "n1"}], "layout": "force-directed"})
+        # Image content goes to the quality checker as attached thumbnails only
+        images = [{"id": f"i{i}", "content": "data:image/png;base64,AAAA", "url": f"u{i}", "style": "photo"}
+                  for i in range(5)]
+        text, _ = compact_input("quality_checker", {"svg_code": "<svg/>", "js_code": "", "images": images}, 1000)
+        self.assertEqual(json.loads(text), {"svg_code": "<svg/>",
+                                            "images": omit_fields(images, {"content": None})})
+        self.assertNotIn("content", text)
+        # Agents not told about tables get plain records
+        text, _ = compact_input("test", {"comments": COMMENTS}, 100000)
+        self.assertEqual(json.loads(text), {"comments": COMMENTS})
+
+    def test_agent_sends_compacted_input(self):
+        import main
+
+        with patch.object(main, "call_deepseek_api", return_value="{}") as call, \
+                patch.object(main, "response_cache", None):
+            main.Agent("data_analyzer", "template").run({"comments": COMMENTS, "vide": []})
+        sent = call.call_args[0][0][1]["content"]
+        self.assertEqual(json.loads(sent), tabulate({"comments": COMMENTS}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import io
+import json
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data_loader import InputFile, JSONStreamReader, input_size, read_text
+from manifest import fingerprint
+
+DOCUMENT = '{"nodes": [1, 2.5e-3, -70, {"x": [1, 2]}], "empty": [], "meta": {"name": "d\\u00e9mo"}, "n": 123456789}'
+
+def expected_items(text):
+    items = []
+    for key, value in json.loads(text).items():
+        items += [(key, item, True) for item in value] if isinstance(value, list) else [(key, value, False)]
+    return items
+
+class TestJSONStreamReader(unittest.TestCase):
+    def test_items_match_json_loads_for_any_chunk_size(self):
+        # Tiny chunks cut numbers, strings and escapes at every possible position
+        for chunk_size in (1, 2, 3, 7, 1000):
+            items = list(JSONStreamReader(io.StringIO(DOCUMENT), chunk_size).items())
+            self.assertEqual(items, expected_items(DOCUMENT), chunk_size)
+        self.assertEqual(list(JSONStreamReader(io.StringIO(" {} ")).items()), [])
+
+    def test_invalid_documents_raise(self):
+        for text in ('{"a": [1, 2}', '{"a": 1} x', '{"a" 1}', '{"a": [1,', '{1: 2}'):
+            for chunk_size in (1, 1000):
+                with self.assertRaises(json.JSONDecodeError, msg=text):
+                    list(JSONStreamReader(io.StringIO(text), chunk_size).items())
+
+class TestInputFile(unittest.TestCase):
+    def test_input_file_stands_in_for_its_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'input.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(DOCUMENT)
+            data = InputFile(path)
+            self.assertEqual(read_text(data), DOCUMENT)
+            self.assertEqual(input_size(data), len(DOCUMENT.encode('utf-8')))
+            # Run manifests hash the file without keeping its text
+            self.assertEqual(fingerprint(data), fingerprint(DOCUMENT))
+
+if __name__ == '__main__':
+    unittest.main()
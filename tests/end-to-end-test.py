@@ -11,9 +11,8 @@ from main import generate_interactive_graph
 class TestEndToEnd(unittest.TestCase):
     @patch('main.call_deepseek_api')
     @patch('main.call_claude_api')
-    @patch('main.upload_image_to_github')
-    @patch('main.get_image_from_github')
-    def test_full_graph_generation_process(self, mock_get_image, mock_upload, mock_claude, mock_deepseek):
+    @patch('main.store_images')
+    def test_full_graph_generation_process(self, mock_upload, mock_claude, mock_deepseek):
         # Mock API responses
         mock_deepseek.side_effect = [
             json.dumps({"plan": ["step1", "step2"]}),  # Orchestrator
@@ -26,8 +25,7 @@ class TestEndToEnd(unittest.TestCase):
         ]
         mock_claude.return_value = json.dumps({"evaluation": "8/10", "suggestions": ["Improve contrast"]})
         
-        mock_upload.return_value = ("https://example.com/image.png", b"image_content")
-        mock_get_image.return_value = b"image_content"
+        mock_upload.return_value = {"img1": "https://example.com/image.png"}
 
         # Test data
         raw_data = json.dumps({"nodes": [{"id": "A"}, {"id": "B"}], "edges": [{"source": "A", "target": "B"}]})
@@ -49,7 +47,6 @@ class TestEndToEnd(unittest.TestCase):
         mock_deepseek.assert_called()
         mock_claude.assert_called_once()
         mock_upload.assert_called()
-        mock_get_image.assert_called()
 
 if __name__ == '__main__':
     unittest.main()
@@ -16,7 +16,7 @@ class TestErrorHandling(unittest.TestCase):
         with self.assertRaises(LearnEverythingError):
             generate_interactive_graph("{}")
 
-    @patch('main.upload_image_to_github')
+    @patch('main.store_images')
     def test_image_upload_error(self, mock_upload):
         mock_upload.side_effect = Exception("Upload failed")
         
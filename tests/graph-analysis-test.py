@@ -0,0 +1,86 @@
+import unittest
+import json
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data_loader import InputFile
+from graph_analysis import analyze_graph, extract_graph, label_propagation, load_graph, summarize_analysis
+
+import numpy as np
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'large-real-dataset-sample.json')
+
+class TestGraphAnalysis(unittest.TestCase):
+    def test_unstructured_input_is_rejected(self):
+        self.assertIsNone(extract_graph({"text": "some notes"}))
+        self.assertIsNone(extract_graph(["a", "b"]))
+
+    def test_entity_dataset_relations(self):
+        with open(SAMPLE_PATH) as f:
+            graph = extract_graph(json.load(f))
+        analysis = analyze_graph(graph)
+        relation_types = analysis["structure_optimisée"]["types_de_relations"]
+        self.assertIn("author", relation_types)
+        self.assertIn("post", relation_types)
+        self.assertIn("friend", relation_types)
+        self.assertEqual(len(analysis["relations"]), graph.num_edges)
+
+    def test_node_edge_schema_matches_data_analyzer(self):
+        data = {
+            "nodes": [{"id": f"node{i}", "type": "user", "value": i} for i in range(10)],
+            "edges": [{"source": "node0", "target": f"node{i}", "type": "friend"} for i in range(1, 10)],
+        }
+        analysis = analyze_graph(extract_graph(data))
+        self.assertEqual(set(analysis), {"éléments_clés", "relations", "hiérarchie",
+                                         "attributs_visualisation", "structure_optimisée"})
+        self.assertEqual(len(analysis["éléments_clés"]), 10)
+        self.assertEqual(len(analysis["relations"]), 9)
+        # The hub is ranked first and sits at the top of the hierarchy
+        self.assertEqual(analysis["éléments_clés"][0], "node0")
+        self.assertIn("node0", analysis["hiérarchie"]["niveau1"])
+        self.assertIn("value", analysis["attributs_visualisation"])
+
+    def test_streamed_graph_matches_parsed_graph(self):
+        with open(SAMPLE_PATH) as f:
+            parsed = extract_graph(json.load(f))
+        streamed = load_graph(InputFile(SAMPLE_PATH))
+        self.assertEqual(streamed.ids, parsed.ids)
+        self.assertEqual(analyze_graph(streamed), analyze_graph(parsed))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'notes.json')
+            with open(path, 'w') as f:
+                f.write('["a", "b"]')
+            self.assertIsNone(load_graph(InputFile(path)))
+
+    def test_edge_types_are_shared_labels(self):
+        data = {"nodes": [{"id": "a", "type": "user"}, {"id": "b"}],
+                "edges": [{"source": "a", "target": "b", "type": "friend"}] * 3}
+        graph = extract_graph(data)
+        self.assertEqual(graph.node_type(1), "")
+        self.assertEqual(graph.edge_type(2), "friend")
+        self.assertEqual(graph.node_type_counts(), {"user": 1})
+        self.assertEqual(graph.edge_type_counts(), {"friend": 3})
+        self.assertEqual(graph.labels, ["", "user", "friend"])
+
+    def test_label_propagation_separates_cliques(self):
+        edges = [(i, j) for i in range(5) for j in range(i + 1, 5)]
+        edges += [(i + 5, j + 5) for i, j in edges] + [(0, 5)]
+        sources = np.array([a for a, _ in edges])
+        targets = np.array([b for _, b in edges])
+        labels = label_propagation(10, sources, targets)
+        self.assertEqual(len(set(labels[:5])), 1)
+        self.assertEqual(len(set(labels[5:])), 1)
+        self.assertNotEqual(labels[0], labels[5])
+
+    def test_summary_truncates_long_lists(self):
+        analysis = {"éléments_clés": [str(i) for i in range(500)], "relations": [], "hiérarchie": {}}
+        summary = summarize_analysis(analysis, max_items=50)
+        self.assertEqual(len(summary["éléments_clés"]), 50)
+        self.assertEqual(summary["éléments_clés_total"], 500)
+        self.assertEqual(len(analysis["éléments_clés"]), 500)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import asyncio
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from http_client import HttpTransport
+from mock_api_server import MockAPIServer
+from rate_limit import ApiGate, CircuitBreaker, TokenBucket
+from streaming import deepseek_deltas
+
+def within(timeout, func):
+    # A leaked connection makes the next request wait forever on the blocking pool: fail instead of hanging
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = func()
+        except BaseException as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AssertionError(f"still waiting after {timeout}s: a pooled connection was not released")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+class CountingLimiter:
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.active -= 1
+        self.semaphore.release()
+
+class TestHttpTransport(unittest.TestCase):
+    def test_sequential_calls_reuse_one_connection(self):
+        with MockAPIServer() as server:
+            transport = HttpTransport()
+            for _ in range(5):
+                self.assertEqual(transport.post(server.url, json={}).status_code, 200)
+            transport.close()
+        self.assertEqual(server.requests, 5)
+        self.assertEqual(len(server.connections), 1)
+
+    def test_async_calls_respect_pool_size(self):
+        async def fire(transport, url):
+            return await asyncio.gather(*(transport.apost(url, json={}) for _ in range(20)))
+
+        with MockAPIServer(latency=0.01) as server:
+            transport = HttpTransport(pool_maxsize=2)
+            responses = asyncio.run(fire(transport, server.url))
+            transport.close()
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertLessEqual(len(server.connections), 2)
+
+    def test_limiter_caps_requests_in_flight(self):
+        limiter = CountingLimiter(3)
+        with MockAPIServer(latency=0.01) as server:
+            transport = HttpTransport(pool_maxsize=8, limiter=limiter)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                codes = list(executor.map(lambda _: transport.post(server.url, json={}).status_code, range(24)))
+            transport.close()
+        self.assertEqual(codes, [200] * 24)
+        self.assertEqual(limiter.peak, 3)
+
+    def test_limiter_is_held_until_streamed_bodies_are_read(self):
+        import main
+
+        limiter = CountingLimiter(2)
+        lock = threading.Lock()
+        reading = {"active": 0, "peak": 0}
+
+        def stream(transport, url):
+            started = []
+
+            def on_text(chunk):
+                if not started:
+                    started.append(chunk)
+                    with lock:
+                        reading["active"] += 1
+                        reading["peak"] = max(reading["peak"], reading["active"])
+            response = transport.post(url, json={"stream": True}, stream=True)
+            text = main.read_completion(response, deepseek_deltas, None, on_text)
+            with lock:
+                reading["active"] -= 1
+            return text
+
+        # Slow bodies: without the permit, every request would be reading its body at once
+        with MockAPIServer(content='{"ok": true}', stream_chunk_size=2, stream_delay=0.01) as server:
+            transport = HttpTransport(pool_maxsize=8, limiter=limiter)
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                texts = list(executor.map(lambda _: within(10, lambda: stream(transport, server.url)), range(6)))
+            # A response closed before its body is read gives its permit back too
+            within(10, lambda: transport.post(server.url, json={"stream": True}, stream=True).close())
+            transport.close()
+        self.assertEqual(texts, ['{"ok": true}'] * 6)
+        self.assertEqual(reading["peak"], 2)
+        self.assertEqual(limiter.active, 0)
+
+    def test_retried_responses_release_their_connection(self):
+        import main
+
+        # More retryable answers than pooled connections, then the completion
+        pool_size = 2
+        answers = [(503, "overloaded")] * (pool_size + 1) + ['{"ok": true}']
+        gate = ApiGate("test", TokenBucket(1000), CircuitBreaker(failure_threshold=100), max_retries=5,
+                       sleep=lambda delay: None)
+        with MockAPIServer(respond=lambda request: answers.pop(0)) as server:
+            transport = HttpTransport(pool_maxsize=pool_size)
+            send = lambda: transport.post(server.url, json={"stream": True}, stream=True)
+            response = within(10, lambda: gate.call(send))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(main.read_completion(response, deepseek_deltas, None), '{"ok": true}')
+            transport.close()
+        self.assertEqual(gate.stats["retries"], pool_size + 1)
+
+    def test_failed_and_abandoned_streams_release_their_connection(self):
+        import main
+
+        def abandon(chunk):
+            # What a hedge that lost the race does to its stream
+            raise RuntimeError("abandoned")
+
+        # The body is still arriving when the reader gives up
+        with MockAPIServer(content='{"ok": true}', stream_chunk_size=2, stream_delay=0.02) as server:
+            transport = HttpTransport(pool_maxsize=1)
+
+            # The errors are kept, as a logged or stored exception would be: their tracebacks keep the
+            # abandoned streams alive, so that garbage collection cannot close them
+            errors = []
+
+            def read_three_times():
+                for _ in range(3):
+                    response = transport.post(server.url, json={"stream": True}, stream=True)
+                    try:
+                        main.read_completion(response, deepseek_deltas, None, abandon)
+                    except RuntimeError as e:
+                        errors.append(e)
+                response = transport.post(server.url, json={}, stream=True)
+                with self.assertRaises(KeyError):
+                    # Not an event stream: the answer is read whole, and the extractor fails
+                    main.read_completion(response, deepseek_deltas, lambda body: body["missing"])
+                return main.read_completion(transport.post(server.url, json={}, stream=True), deepseek_deltas,
+                                            lambda body: body["content"][0]["text"])
+
+            self.assertEqual(within(10, read_three_times), '{"ok": true}')
+            transport.close()
+        self.assertEqual(len(errors), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import base64
+import json
+import sys
+import os
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import main
+from image_prep import QA_IMAGE_MAX_SIDE, prepare_image, qa_images
+from image_store import LocalImageStore
+
+def data_url(colour, size=(4, 4)):
+    buffered = BytesIO()
+    Image.new("RGB", size, colour).save(buffered, format="JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode()
+
+class TestImagePipeline(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = LocalImageStore(tmp.name)
+        patcher = patch("main.image_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, images):
+        generator = MagicMock(answer=MagicMock(return_value=(json.dumps({"images": images}), None)))
+        with patch.dict(main.agents, {"image_generator": generator}):
+            images_data, image_contents = main.handle_image_generation({})
+        return json.loads(images_data), image_contents
+
+    def test_broken_images_are_skipped(self):
+        images_data, image_contents = self.generate([
+            {"id": "ok", "content": data_url("red")},
+            {"id": "broken", "content": "data:image/png;base64,bm90IGFuIGltYWdl"},
+        ])
+        self.assertEqual(len(image_contents), 1)
+        self.assertTrue(images_data["images"][0]["url"].startswith("file://"))
+        self.assertNotIn("content", images_data["images"][0])
+        self.assertNotIn("url", images_data["images"][1])
+
+    def test_identical_images_are_not_encoded_again(self):
+        images = [{"id": "a", "content": data_url("red")}, {"id": "b", "content": data_url("blue")}]
+        first, first_contents = self.generate(images)
+        with patch("main.prepare_image", side_effect=AssertionError("image decoded twice")):
+            second, second_contents = self.generate(images)
+        self.assertEqual(first, second)
+        self.assertEqual(first_contents, second_contents)
+
+    def test_quality_checker_gets_thumbnails_of_distinct_images(self):
+        large = data_url("green", size=(2000, 1000))
+        images_data, image_contents = self.generate([
+            {"id": "a", "content": large}, {"id": "b", "content": large}, {"id": "c", "content": data_url("red")},
+        ])
+        self.assertEqual([image.get("url") is not None for image in images_data["images"]], [True, True, True])
+        self.assertEqual(len(image_contents), 2)
+        thumbnail = Image.open(BytesIO(base64.b64decode(image_contents[0]["data"])))
+        self.assertEqual(thumbnail.size, (QA_IMAGE_MAX_SIDE, QA_IMAGE_MAX_SIDE // 2))
+        self.assertIn(image_contents[0]["type"], ("image/png", "image/jpeg"))
+        # The stored image keeps its full resolution
+        stored = self.store.read(os.path.basename(images_data["images"][0]["url"])[:-len(".png")])
+        self.assertEqual(Image.open(BytesIO(stored)).size, (2000, 1000))
+
+    def test_quality_check_images_fit_the_budget(self):
+        images = [prepare_image(data_url(colour, size=(64, 64))) for colour in ("red", "green", "blue")]
+        sizes = [len(base64.b64encode(image.thumbnail)) for image in images]
+        self.assertEqual(len(qa_images(images, max_bytes=sum(sizes))), 3)
+        self.assertEqual(len(qa_images(images, max_bytes=sizes[0] + sizes[1])), 2)
+        self.assertEqual(qa_images(images, max_bytes=0), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import MagicMock
+import base64
+import hashlib
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from image_store import (GitHubImageStore, ImageStoreError, LocalImageStore, content_digest, git_blob_sha,
+                         source_digest)
+
+class FakeRepo:
+    """In-memory stand-in for the parts of the GitHub git data API used by the store."""
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.commits = 0
+        self.blob_calls = 0
+        self.ref = MagicMock(object=MagicMock(sha="c0"))
+
+    def get_git_ref(self, name):
+        return self.ref
+
+    def get_git_commit(self, sha):
+        return MagicMock(sha=sha, tree=MagicMock(sha="t0"))
+
+    def get_git_tree(self, sha, recursive=False):
+        return MagicMock(tree=[MagicMock(path=path, sha=blob_sha) for path, blob_sha in self.files.items()])
+
+    def create_git_blob(self, content, encoding):
+        self.blob_calls += 1
+        raw = base64.b64decode(content)
+        return MagicMock(sha=hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest())
+
+    def create_git_tree(self, elements, base_tree):
+        self.files.update({element._InputGitTreeElement__path: element._InputGitTreeElement__sha
+                           for element in elements})
+        return MagicMock()
+
+    def create_git_commit(self, message, tree, parents):
+        self.commits += 1
+        return MagicMock(sha=f"c{self.commits}")
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_git_blob_sha_matches_git(self):
+        # `printf 'hello\n' | git hash-object --stdin`
+        self.assertEqual(git_blob_sha(b"hello\n"), "ce013625030ba8dba906f756967f9e9ca394464a")
+
+    def test_local_store_is_content_addressed(self):
+        store = LocalImageStore(self.tmp.name, base_url="https://cdn.example/images/")
+        urls = store.put_many({"a": b"png-1", "b": b"png-1", "c": b"png-2"}, {"a": source_digest("source-1")})
+        digest = content_digest(b"png-1")
+        self.assertEqual(urls["a"], f"https://cdn.example/images/{digest[:2]}/{digest}.png")
+        self.assertEqual(urls["a"], urls["b"])
+        self.assertEqual(store.read(digest), b"png-1")
+        self.assertEqual(store.lookup(source_digest("source-1")), digest)
+        self.assertIsNone(store.lookup(source_digest("source-2")))
+
+    def test_local_store_does_not_rewrite_existing_files(self):
+        store = LocalImageStore(self.tmp.name)
+        store.put_many({"a": b"png-1"})
+        path = store.path(content_digest(b"png-1"))
+        mtime = path.stat().st_mtime_ns
+        url = store.put_many({"b": b"png-1"})["b"]
+        self.assertEqual(path.stat().st_mtime_ns, mtime)
+        self.assertEqual(url, path.resolve().as_uri())
+
+    def test_github_store_uploads_new_images_in_one_commit(self):
+        repo = FakeRepo()
+        store = GitHubImageStore(lambda: repo, "owner/repo", "main", LocalImageStore(self.tmp.name))
+        pngs = {f"img{i}": f"png-{i}".encode() for i in range(5)}
+        urls = store.put_many(pngs, {image_id: source_digest(image_id) for image_id in pngs})
+        digest = content_digest(b"png-3")
+        self.assertEqual(urls["img3"], f"https://raw.githubusercontent.com/owner/repo/main/assets/images/{digest}.png")
+        self.assertEqual((repo.commits, repo.blob_calls), (1, 5))
+        repo.ref.edit.assert_called_once_with("c1")
+        self.assertEqual(repo.files[f"assets/images/{digest}.png"], git_blob_sha(b"png-3"))
+
+        # A second run finds everything in the local mirror and never calls GitHub
+        self.assertEqual(store.lookup(source_digest("img3")), digest)
+        store.get_repo = MagicMock(side_effect=AssertionError("GitHub should not be called"))
+        store.put_many(pngs)
+
+    def test_github_store_skips_paths_already_on_the_branch(self):
+        digest = content_digest(b"png")
+        repo = FakeRepo({f"assets/images/{digest}.png": git_blob_sha(b"png")})
+        store = GitHubImageStore(lambda: repo, "owner/repo", "main", LocalImageStore(self.tmp.name))
+        store.put_many({"img": b"png"})
+        self.assertEqual((repo.commits, repo.blob_calls), (0, 0))
+        self.assertTrue(store.contains(digest))
+
+    def test_github_blob_mismatch_is_an_error(self):
+        repo = FakeRepo()
+        repo.create_git_blob = MagicMock(return_value=MagicMock(sha="0" * 40))
+        store = GitHubImageStore(lambda: repo, "owner/repo", "main", LocalImageStore(self.tmp.name))
+        with self.assertRaises(ImageStoreError):
+            store.put_many({"img": b"png"})
+        self.assertEqual(repo.commits, 0)
+        self.assertFalse(store.contains(content_digest(b"png")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from layout import coarsen, compute_layout, layout_design
+
+def two_cliques(size):
+    edges = [(i, j) for i in range(size) for j in range(i + 1, size)]
+    edges += [(i + size, j + size) for i, j in edges]
+    return np.array([a for a, _ in edges]), np.array([b for _, b in edges])
+
+class TestLayout(unittest.TestCase):
+    def test_positions_fit_drawing_area_and_are_deterministic(self):
+        rng = np.random.default_rng(1)
+        sources, targets = rng.integers(0, 500, 2000), rng.integers(0, 500, 2000)
+        positions = compute_layout(500, sources, targets, size=800)
+        self.assertEqual(positions.shape, (500, 2))
+        self.assertTrue((positions >= 0).all() and (positions <= 800).all())
+        np.testing.assert_array_equal(positions, compute_layout(500, sources, targets, size=800))
+
+    def test_clusters_are_separated(self):
+        sources, targets = two_cliques(20)
+        for multilevel in (False, True):
+            positions = compute_layout(40, sources, targets, multilevel=multilevel)
+            gap = np.linalg.norm(positions[:20].mean(axis=0) - positions[20:].mean(axis=0))
+            spread = max(positions[:20].std(axis=0).max(), positions[20:].std(axis=0).max())
+            self.assertGreater(gap, 4 * spread)
+
+    def test_coarsening_matches_disjoint_pairs(self):
+        sources, targets = two_cliques(10)
+        parent, coarse_count = coarsen(20, sources, targets, np.random.default_rng(0))
+        self.assertLess(coarse_count, 20)
+        self.assertTrue((np.bincount(parent) <= 2).all())
+
+    def test_layout_design_uses_analysis_elements(self):
+        analysis = {"éléments_clés": ["a", "b", "c"],
+                    "relations": [{"de": "a", "à": "b"}, {"de": "b", "à": "d"}]}
+        positions = layout_design({"layout": "force-directed"}, analysis)
+        self.assertEqual(set(positions), {"a", "b", "c", "d"})
+        self.assertTrue(all(len(point) == 2 for point in positions.values()))
+
+    def test_layout_design_prefers_designer_nodes(self):
+        design = {"nodes": [{"id": "x"}, {"id": "y"}], "edges": [{"source": "x", "target": "y"}]}
+        positions = layout_design(design, {"éléments_clés": ["a", "b", "c"]})
+        self.assertEqual(set(positions), {"x", "y"})
+
+if __name__ == '__main__':
+    unittest.main()
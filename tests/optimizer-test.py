@@ -0,0 +1,139 @@
+import unittest
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from xml.etree import ElementTree
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from optimizer import _js_tokens, minify_js, optimize_code, optimize_path, optimize_svg, parse_path
+from renderer import JS_RUNTIME, build_scene, iter_js, iter_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+def points(d):
+    return [(command, args[-2:]) for command, args in parse_path(d) if args]
+
+def glyph(x, y, node_id):
+    return (f'<g transform="translate({x},{y})" data-id="{node_id}">'
+            f'<circle r="8.000001" fill="#1f77b4" stroke="#ffffff" stroke-width="1.5"/>'
+            f'<path d="M -4 0 L 0 0 L 4 0 M 0 -4 L 0 4" stroke="#ffffff"/></g>')
+
+class TestOptimizer(unittest.TestCase):
+    def test_paths_keep_their_points_within_the_precision(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+            d = f"M {x} {y}"
+            for _ in range(20):
+                command = rng.choice("LlCcQqHhVv")
+                count = {"L": 2, "C": 6, "Q": 4, "H": 1, "V": 1}[command.upper()]
+                d += f" {command} " + " ".join(f"{rng.uniform(-50, 50):.6f}" for _ in range(count))
+            d += " Z"
+            optimized = optimize_path(d, 2, merge_lines=False)
+            self.assertLess(len(optimized), len(d) * 0.6)
+            before, after = parse_path(d), parse_path(optimized)
+            self.assertEqual(len(before), len(after))
+            for (_, a), (_, b) in zip(before, after):
+                for u, v in zip(a, b):
+                    self.assertAlmostEqual(u, v, delta=0.005 * len(before))
+
+    def test_paths_drop_zero_length_and_collinear_segments(self):
+        optimized = optimize_path("M 0 0 L 10 0 L 20 0 L 20 0 L 20 10 L 20 20 L 0 20 Z", 1)
+        self.assertEqual(optimized, "M0 0H20V20H0z")
+        # A curve is never merged, and arcs keep their flags
+        self.assertEqual(points(optimize_path("M0 0 C 1 1 2 2 3 3 a 5 5 0 1 0 10 0", 1)),
+                         [("M", [0, 0]), ("C", [3, 3]), ("A", [13, 3])])
+
+    def test_renderer_output_draws_the_same_elements(self):
+        rng = np.random.default_rng(0)
+        positions = {f"n{i}": [float(x), float(y)] for i, (x, y) in enumerate(rng.uniform(0, 1000, (300, 2)))}
+        analysis = {"relations": [{"de": f"n{a}", "à": f"n{b}"} for a, b in rng.integers(0, 300, (600, 2)).tolist()],
+                    "hiérarchie": {"niveau1": ["n0"]}}
+        scene = build_scene(analysis, positions)
+        svg, js = "".join(iter_svg(scene)), "".join(iter_js(scene))
+        result = optimize_code(svg, js)
+        optimized = result["code_optimisé"]["svg"]
+        self.assertLess(len(optimized), len(svg))
+        self.assertEqual(result["tailles"]["svg"], {"avant": len(svg), "après": len(optimized)})
+
+        before, after = ElementTree.fromstring(svg), ElementTree.fromstring(optimized)
+        for tag in ("circle", "line"):
+            self.assertEqual(len(after.findall(f".//{SVG}{tag}")), len(before.findall(f".//{SVG}{tag}")))
+        # Node colours moved into shared classes; the script still finds its elements
+        node = after.find(f".//{SVG}circle[@data-id='n1']")
+        self.assertIsNone(node.get("fill"))
+        self.assertIn("node", node.get("class").split())
+        self.assertIn(f".{node.get('class').split()[1]}{{fill:#7f7f7f}}", after.find(f"{SVG}style").text)
+        self.assertEqual(after.find(f".//{SVG}line").get("x1"), next(before.iter(f"{SVG}line")).get("x1"))
+
+    def test_repeated_glyphs_become_uses(self):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1000 1000">\n'
+               + "\n".join(glyph(100 * i, 50, f"n{i}") for i in range(5))
+               + '\n<path d="M 10 10 l 5 5 l 5 -5 l 5 5 l 5 -5" fill="none" stroke="red"/>'
+               + '\n<path d="M 300 10 l 5 5 l 5 -5 l 5 5 l 5 -5" fill="none" stroke="red"/>\n</svg>')
+        root = ElementTree.fromstring(optimize_svg(svg))
+        uses = root.findall(f"{SVG}use")
+        self.assertEqual(len(uses), 7)
+        self.assertEqual([use.get("data-id") for use in uses[:5]], [f"n{i}" for i in range(5)])
+        self.assertEqual(uses[1].get("transform"), "translate(100,50)")
+        self.assertEqual((uses[6].get("x"), uses[6].get("y")), ("300", "10"))
+        definitions = root.find(f"{SVG}defs")
+        self.assertEqual(len(definitions), 2)
+        self.assertEqual(definitions.find(f"{SVG}g/{SVG}circle").get("r"), "8")
+        self.assertEqual(points(definitions.find(f"{SVG}path").get("d")),
+                         [("M", [0, 0]), ("L", [5, 5]), ("L", [10, 0]), ("L", [15, 5]), ("L", [20, 0])])
+
+    def test_styles_the_page_depends_on_stay_in_place(self):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg"><style>.hot { fill: red }</style>'
+               + "".join(f'<circle class="hot" fill="blue" stroke="black" cx="{i}" cy="0" r="1"/>' for i in range(5))
+               + "".join(f'<rect x="{i}" y="0" width="1" height="1" stroke="green"/>' for i in range(5))
+               + '</svg>')
+        # The stylesheet may set fill on the circles, the script changes stroke
+        root = ElementTree.fromstring(optimize_svg(svg, protected={"stroke"}))
+        self.assertTrue(all(circle.get("fill") == "blue" and circle.get("stroke") == "black"
+                            for circle in root.iter(f"{SVG}circle")))
+        self.assertTrue(all(rect.get("stroke") == "green" for rect in root.iter(f"{SVG}rect")))
+        self.assertEqual(len(root.findall(f"{SVG}use")), 0)
+
+    def test_text_content_and_unknown_documents_are_left_alone(self):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg">\n  <text x="1.23456" y="2">A  <tspan>b</tspan> c</text>\n'
+               '</svg>')
+        self.assertEqual(optimize_svg(svg),
+                         '<svg xmlns="http://www.w3.org/2000/svg"><text x="1.2" y="2">A  <tspan>b</tspan> c</text></svg>')
+        for text in ("```svg\n<svg></svg>\n```", "<html><body/></html>", "<svg><g></svg>"):
+            self.assertEqual(optimize_svg(text), text)
+
+    def test_minified_script_has_the_same_tokens(self):
+        code = JS_RUNTIME + """
+        // Statements relying on line breaks
+        var a = 1
+        var b = a
+        ++b
+        function f(x) { return /a[/]b+/g.test(x) ? `t ${x + {y: 1}.y} u` : x / 2 / 3 }
+        if (a) { b = 'x  y' } /* multi
+        line */ else b = - -a
+        """
+        minified = minify_js(code)
+        self.assertLess(len(minified), len(code) * 0.75)
+        self.assertEqual([token[:2] for token in _js_tokens(minified)], [token[:2] for token in _js_tokens(code)])
+        self.assertIn("var a=1\nvar b=a\n++b", minified)
+        self.assertIn("b=- -a", minified)
+        with self.assertRaises(ValueError):
+            minify_js("var s = 'unterminated")
+
+    @unittest.skipUnless(shutil.which("node"), "Node.js is needed to check the script syntax")
+    def test_minified_renderer_script_is_valid(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "graph.js")
+            with open(path, "w") as file:
+                file.write(minify_js(JS_RUNTIME))
+            subprocess.run(["node", "--check", path], check=True)
+
+if __name__ == '__main__':
+    unittest.main()
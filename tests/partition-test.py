@@ -0,0 +1,105 @@
+import unittest
+import json
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data_loader import InputFile
+from partition import connected_components, merge_analyses, partition_data, partition_input
+
+def chain_graph(num_components, component_size):
+    nodes, edges = [], []
+    for c in range(num_components):
+        ids = [f"c{c}n{i}" for i in range(component_size)]
+        nodes.extend({"id": node_id, "type": "user"} for node_id in ids)
+        edges.extend({"source": a, "target": b} for a, b in zip(ids, ids[1:]))
+    return {"nodes": nodes, "edges": edges}
+
+class TestPartition(unittest.TestCase):
+    def test_small_input_is_single_chunk(self):
+        data = chain_graph(2, 3)
+        self.assertEqual(list(partition_data(data, 100000)), [data])
+
+    def test_components_are_not_split_when_they_fit(self):
+        data = chain_graph(20, 5)
+        self.assertEqual(len(connected_components(data["nodes"], data["edges"])), 20)
+        chunks = list(partition_data(data, 2000))
+        self.assertGreater(len(chunks), 1)
+
+        component_chunk = {}
+        for index, chunk in enumerate(chunks):
+            self.assertLessEqual(len(json.dumps(chunk, separators=(',', ':'))), 2000)
+            for node in chunk["nodes"]:
+                component_chunk.setdefault(node["id"].split("n")[0], set()).add(index)
+        self.assertTrue(all(len(indices) == 1 for indices in component_chunk.values()))
+
+        # Every node and edge ends up in exactly one chunk
+        self.assertEqual(sum(len(chunk["nodes"]) for chunk in chunks), 100)
+        self.assertEqual(sum(len(chunk["edges"]) for chunk in chunks), 80)
+
+    def test_entity_dataset_is_split_by_type(self):
+        data = {
+            "users": [{"id": f"user_{i}"} for i in range(50)],
+            "relationships": [{"type": "friend", "from": "user_0", "to": f"user_{i}"} for i in range(1, 50)],
+        }
+        chunks = list(partition_data(data, 500))
+        self.assertTrue(all(len(chunk) == 1 for chunk in chunks))
+        self.assertEqual(sum(len(chunk.get("users", [])) for chunk in chunks), 50)
+        self.assertEqual(sum(len(chunk.get("relationships", [])) for chunk in chunks), 49)
+
+    def test_long_lines_and_items_are_split(self):
+        text = "é\"" * 5000
+        chunks = list(partition_data(text, 1000))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(len(json.dumps(chunk, ensure_ascii=False)) <= 1000 for chunk in chunks))
+
+        data = {"posts": [{"id": "p0", "text": "x" * 5000}, {"id": "p1"}], "note": "y" * 5000}
+        for chunk in partition_data(data, 1000):
+            self.assertLessEqual(len(json.dumps(chunk, separators=(',', ':'))), 1000)
+
+    def test_input_files_are_streamed_into_the_same_chunks(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        datasets = [
+            {"users": [{"id": f"user_{i}"} for i in range(50)], "name": "réseau",
+             "relationships": [{"type": "friend", "from": "user_0", "to": f"user_{i}"} for i in range(1, 50)]},
+            chain_graph(20, 5),
+            [{"id": i, "text": "z" * 300} for i in range(20)],
+        ]
+        for data in datasets:
+            path = os.path.join(tmp.name, "data.json")
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False)
+            streamed = partition_input(InputFile(path), 2000)
+            self.assertGreater(len(streamed), 1)
+            self.assertTrue(all(len(chunk) <= 2000 for chunk in streamed))
+            self.assertEqual(sorted(streamed), sorted(partition_input(json.dumps(data, ensure_ascii=False), 2000)))
+
+        # Text that only looks like JSON is split by lines
+        with open(path, "w") as file:
+            file.write("{not json\n" + "word " * 2000)
+        chunks = partition_input(InputFile(path), 1000)
+        self.assertTrue(chunks[0].startswith("{not json"))
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+
+    def test_merge_is_deterministic_and_deduplicated(self):
+        partials = [
+            {"éléments_clés": ["a", "b"], "relations": [{"de": "a", "à": "b", "type": "x"}],
+             "hiérarchie": {"niveau1": ["a"]}, "attributs_visualisation": ["size"],
+             "structure_optimisée": {"groups": ["g1"]}},
+            {"éléments_clés": ["b", "c"], "relations": [{"de": "a", "à": "b", "type": "x"}],
+             "hiérarchie": {"niveau1": ["c"], "niveau2": ["b"]}, "attributs_visualisation": ["size", "color"],
+             "structure_optimisée": {"groups": ["g2"]}},
+        ]
+        merged = merge_analyses(partials)
+        self.assertEqual(merged["éléments_clés"], ["a", "b", "c"])
+        self.assertEqual(len(merged["relations"]), 1)
+        self.assertEqual(merged["hiérarchie"], {"niveau1": ["a", "c"], "niveau2": ["b"]})
+        self.assertEqual(merged["attributs_visualisation"], ["size", "color"])
+        self.assertEqual(merged["structure_optimisée"], {"groups": ["g1", "g2"]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,30 +1,27 @@
 import unittest
 import time
 import json
-import random
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
 
 from main import generate_interactive_graph
+from benchmark_harness import DEFAULT_THRESHOLDS, Scenario, compare, datasets, offline_pipeline, run_offline
 
-def generate_complex_network(num_nodes, num_edges):
-    nodes = [{"id": f"node{i}", "type": random.choice(["user", "post", "comment"]), "value": random.randint(1, 100)} for i in range(num_nodes)]
-    
-    edges = []
-    for _ in range(num_edges):
-        source = random.choice(nodes)["id"]
-        target = random.choice(nodes)["id"]
-        if source != target:
-            edges.append({
-                "source": source,
-                "target": target,
-                "weight": random.uniform(0.1, 1.0),
-                "type": random.choice(["friend", "like", "comment", "share"])
-            })
-    
-    return {"nodes": nodes, "edges": edges}
+generate_complex_network = datasets.generate_complex_network
+
+def stand_in_apis():
+    # DeepSeek, Claude and GitHub are answered by a local mock server: no network, no cost
+    return offline_pipeline(Scenario("custom", "custom", {}, latency=0.0))
+
+def load_real_dataset():
+    path = os.path.join(os.path.dirname(__file__), 'data', 'large_real_dataset.json')
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return datasets.generate_large_dataset(seed=0)
 
 class TestPerformance(unittest.TestCase):
     @unittest.skip("Long-running test")
@@ -33,7 +30,8 @@ class TestPerformance(unittest.TestCase):
         large_data = generate_complex_network(num_nodes=10000, num_edges=50000)
         
         start_time = time.time()
-        result = generate_interactive_graph(json.dumps(large_data))
+        with stand_in_apis():
+            result = generate_interactive_graph(json.dumps(large_data))
         end_time = time.time()
         
         execution_time = end_time - start_time
@@ -52,12 +50,13 @@ class TestPerformance(unittest.TestCase):
         self.assertEqual(len(result_data["relations"]), 50000)
 
     def test_load_real_dataset(self):
-        # Load a real or semi-real large dataset
-        with open(os.path.join(os.path.dirname(__file__), 'data', 'large_real_dataset.json'), 'r') as f:
-            real_data = json.load(f)
+        # Load a real or semi-real large dataset (scripts/generate-large-dataset.py writes one),
+        # else generate the same kind of data
+        real_data = load_real_dataset()
         
         start_time = time.time()
-        result = generate_interactive_graph(json.dumps(real_data))
+        with stand_in_apis():
+            result = generate_interactive_graph(json.dumps(real_data))
         end_time = time.time()
         
         execution_time = end_time - start_time
@@ -68,5 +67,20 @@ class TestPerformance(unittest.TestCase):
         # Additional assertions specific to the real dataset
         # (These would depend on the nature of your real dataset)
 
+    def test_offline_pipeline_keeps_every_node(self):
+        real_data = load_real_dataset()
+        result = run_offline(json.dumps(real_data))
+        self.assertEqual(result["data_analysis"]["structure_optimisée"]["statistiques"]["nœuds"],
+                         len(real_data["users"]) + len(real_data["posts"]) + len(real_data["comments"]))
+        self.assertEqual(len(result["images"]), 4)
+
+    def test_regressions_are_reported(self):
+        baseline = {"thresholds": DEFAULT_THRESHOLDS,
+                    "scenarios": {"small": {"wall_s": 1.0, "api_requests": 7, "request_bytes": 1000}}}
+        self.assertEqual(compare({"small": {"wall_s": 1.2, "api_requests": 7, "request_bytes": 1040}}, baseline), [])
+        regressions = compare({"small": {"wall_s": 1.3, "api_requests": 8, "request_bytes": 1000}}, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("small: wall_s"))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from rate_limit import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, ApiGate, CircuitBreaker, CircuitOpenError, TokenBucket,
+                        current_priority, request_priority)
+from scheduler import Stage, run_stages
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def responder(*outcomes):
+    outcomes = list(outcomes)
+    calls = []
+
+    def send():
+        calls.append(1)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send, calls
+
+class TestRateLimit(unittest.TestCase):
+    def make_gate(self, clock=None, **kwargs):
+        clock = clock or FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+        return ApiGate("test", TokenBucket(1000), breaker, sleep=clock.sleep, **kwargs), clock
+
+    def test_bucket_serves_interactive_requests_first(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        bucket.acquire()
+        order = []
+
+        def take(name, priority):
+            bucket.acquire(priority)
+            order.append(name)
+
+        threads = [threading.Thread(target=take, args=(f"batch{i}", PRIORITY_BATCH)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.005)
+        threads.append(threading.Thread(target=take, args=("interactive", PRIORITY_INTERACTIVE)))
+        threads[-1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order[0], "interactive")
+        self.assertEqual(order[1:], ["batch0", "batch1", "batch2"])
+
+    def test_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = time.perf_counter()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+
+    def test_429_is_retried_after_the_requested_delay(self):
+        gate, clock = self.make_gate()
+        throttled = FakeResponse(429, {"Retry-After": "0.05"})
+        send, calls = responder(throttled, FakeResponse(200))
+        self.assertEqual(gate.call(send).status_code, 200)
+        self.assertEqual(len(calls), 2)
+        # The discarded answer gave its connection back
+        self.assertTrue(throttled.closed)
+        self.assertGreaterEqual(clock.now, 0.05)
+        # Halved by the 429, then raised by a twentieth of the maximum on success
+        self.assertEqual(gate.bucket.rate, 550)
+        self.assertEqual(gate.breaker.state, "closed")
+
+    def test_connection_errors_are_retried_then_raised(self):
+        gate, _ = self.make_gate(max_retries=2)
+        send, calls = responder(ConnectionError("reset"), FakeResponse(200))
+        self.assertEqual(gate.call(send).status_code, 200)
+        send, calls = responder(*[ConnectionError("reset")] * 3)
+        with self.assertRaises(ConnectionError):
+            gate.call(send)
+        self.assertEqual(len(calls), 3)
+
+    def test_non_retryable_status_is_returned_at_once(self):
+        gate, _ = self.make_gate()
+        send, calls = responder(FakeResponse(400))
+        self.assertEqual(gate.call(send).status_code, 400)
+        self.assertEqual(len(calls), 1)
+
+    def test_circuit_opens_and_recovers(self):
+        gate, clock = self.make_gate(max_retries=2)
+        send, calls = responder(*[FakeResponse(503)] * 3)
+        self.assertEqual(gate.call(send).status_code, 503)
+        self.assertEqual(gate.breaker.state, "open")
+
+        # While open, callers wait for the cool-down instead of hitting the provider
+        send, calls = responder(FakeResponse(200))
+        before = clock.now
+        self.assertEqual(gate.call(send).status_code, 200)
+        self.assertGreaterEqual(clock.now - before, 9)
+        self.assertEqual(gate.breaker.state, "closed")
+
+        gate.max_retries = 0
+        gate.breaker.record_failure()
+        gate.breaker.record_failure()
+        gate.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            gate.call(responder(FakeResponse(200))[0])
+
+    def test_half_open_probe_is_always_resolved(self):
+        # A probe that raises an error that is not retried counts as a failure
+        gate, clock = self.make_gate(max_retries=0)
+        for _ in range(3):
+            gate.breaker.record_failure()
+        clock.now += 10
+        with self.assertRaises(KeyError):
+            gate.call(responder(KeyError("missing"))[0])
+        self.assertEqual(gate.breaker.state, "open")
+        clock.now += 100
+        self.assertEqual(gate.call(responder(FakeResponse(200))[0]).status_code, 200)
+        self.assertEqual(gate.breaker.state, "closed")
+
+        # A throttled probe opens the circuit again for another cool-down
+        for _ in range(3):
+            gate.breaker.record_failure()
+        clock.now += 10
+        self.assertEqual(gate.call(responder(FakeResponse(429))[0]).status_code, 429)
+        self.assertEqual(gate.breaker.state, "open")
+        self.assertEqual(gate.breaker.failures, 3)
+        clock.now += 100
+        self.assertEqual(gate.call(responder(FakeResponse(200))[0]).status_code, 200)
+        self.assertEqual(gate.breaker.state, "closed")
+
+    def test_rate_limit_headers_pause_the_bucket(self):
+        gate, _ = self.make_gate()
+        gate.observe({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m30s"})
+        self.assertGreater(gate.bucket._wait_time(time.monotonic()), 80)
+        gate.observe({"anthropic-ratelimit-requests-remaining": "2"})
+        self.assertLessEqual(gate.bucket.tokens, 2)
+
+    def test_priority_follows_pipeline_stages(self):
+        stages = [Stage("a", lambda inputs: current_priority()),
+                  Stage("b", lambda inputs: current_priority(), deps=("a",))]
+        with request_priority(PRIORITY_BATCH):
+            results = run_stages(stages)
+        self.assertEqual((results["a"], results["b"]), (PRIORITY_BATCH, PRIORITY_BATCH))
+        self.assertEqual(current_priority(), PRIORITY_INTERACTIVE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+from xml.etree import ElementTree
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from renderer import build_scene, iter_js, iter_svg, write_stream
+
+def random_graph(num_nodes, num_edges, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = {f"n{i}": [float(x), float(y)] for i, (x, y) in enumerate(rng.uniform(0, 1000, (num_nodes, 2)))}
+    relations = [{"de": f"n{a}", "à": f"n{b}"} for a, b in rng.integers(0, num_nodes, (num_edges, 2)).tolist()]
+    return {"relations": relations, "hiérarchie": {"niveau1": ["n0"]}}, positions
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+class TestRenderer(unittest.TestCase):
+    def test_small_graph_draws_every_node_and_edge(self):
+        analysis, positions = random_graph(30, 60)
+        scene = build_scene(analysis, positions)
+        self.assertFalse(scene.clustered)
+        root = ElementTree.fromstring("".join(iter_svg(scene)))
+        self.assertEqual(len(root.findall(f".//{SVG}circle")), 30)
+        self.assertEqual(len(root.findall(f".//{SVG}line")), 60)
+        self.assertEqual(root.find(f".//{SVG}circle[@data-id='n0']").get("r"), "6")
+
+    def test_designer_elements_are_drawn(self):
+        import main
+        from layout import layout_design
+
+        design = {"nœuds": [{"id": "x"}, {"id": "y"}, {"id": "z"}],
+                  "arêtes": [{"source": "x", "target": "y"}, {"source": "y", "target": "z"}]}
+        analysis = {"éléments_clés": ["a", "b"], "relations": [{"de": "a", "à": "b"}]}
+        for graph_design, ids, edges in ((design, ["x", "y", "z"], [(0, 1), (1, 2)]), ({}, ["a", "b"], [(0, 1)])):
+            # The designer's nodes and edges when it gave some, else those of the analysis, as laid out
+            inputs = {"graph_designer": graph_design, "data_analyzer": analysis,
+                      "layout": layout_design(graph_design, analysis)}
+            scene = main.local_scene(inputs)
+            self.assertEqual(scene.ids, ids)
+            self.assertEqual(list(zip(scene.sources.tolist(), scene.targets.tolist())), edges)
+
+    def test_stage_versions_follow_render_settings(self):
+        from unittest.mock import patch
+        import main
+
+        versions = {stage.name: stage.version for stage in main.pipeline_stages}
+        self.assertTrue(all(versions[name] for name in ("local_analysis", "layout", "svg_generator", "js_generator")))
+        self.assertEqual(versions["svg_generator"], main.generator_version("svg_generator"))
+        # Switching the renderer mode or bumping the renderer version invalidates stored drawings
+        for setting, value in (("RENDER_MODE", "llm"), ("RENDERER_VERSION", "renderer-0")):
+            with patch.object(main, setting, value):
+                self.assertNotEqual(main.generator_version("svg_generator"), versions["svg_generator"])
+
+    def test_large_graph_is_clustered(self):
+        analysis, positions = random_graph(5000, 10000)
+        scene = build_scene(analysis, positions, max_nodes=400)
+        self.assertTrue(scene.clustered)
+        root = ElementTree.fromstring("".join(iter_svg(scene)))
+        clusters = root.findall(f".//{SVG}circle")
+        self.assertLessEqual(len(clusters), 400)
+        self.assertEqual(sum(int(circle.get("data-size")) for circle in clusters), 5000)
+        self.assertIn("clustered: true", "".join(iter_js(scene)))
+
+    def test_output_is_streamed_in_chunks(self):
+        analysis, positions = random_graph(3000, 6000)
+        scene = build_scene(analysis, positions, max_nodes=5000)
+        chunks = list(iter_svg(scene))
+        self.assertGreater(len(chunks), 10)
+        self.assertLess(max(len(chunk) for chunk in chunks), sum(len(chunk) for chunk in chunks) / 5)
+
+    def test_write_stream_to_path_and_stream(self):
+        analysis, positions = random_graph(10, 10)
+        scene = build_scene(analysis, positions)
+        buffer = io.StringIO()
+        written = write_stream(iter_js(scene), buffer)
+        self.assertEqual(written, len(buffer.getvalue()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "graph.svg")
+            write_stream(iter_svg(scene), path)
+            ElementTree.parse(path)
+
+if __name__ == '__main__':
+    unittest.main()
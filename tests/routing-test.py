@@ -0,0 +1,111 @@
+import unittest
+import json
+import threading
+import time
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from http_client import set_transport
+from mock_api_server import MockAPIServer
+from routing import Route, get_route_stats, parse_agent_routes, reset_route_stats, route_stats, run_routes
+
+CHEAP, STRONG = Route("deepseek", "cheap"), Route("deepseek", "strong")
+
+def answering(answers, delays=None):
+    # call(route, on_text) streaming each answer in two chunks after an optional delay
+    def call(route, on_text):
+        time.sleep((delays or {}).get(route, 0))
+        answer = answers[route]
+        if isinstance(answer, Exception):
+            raise answer
+        on_text(answer[:3])
+        on_text(answer[3:])
+        return answer
+    return call
+
+class TestRouting(unittest.TestCase):
+    def setUp(self):
+        reset_route_stats()
+
+    def test_escalates_on_invalid_answer_and_error(self):
+        call = answering({CHEAP: "not json", STRONG: '{"ok": true}'})
+        self.assertEqual(run_routes([CHEAP, STRONG], call, validate=json.loads), ('{"ok": true}', STRONG, {"ok": True}))
+        self.assertEqual(route_stats()[CHEAP.key]["invalid"], 1)
+
+        call = answering({CHEAP: ValueError("502"), STRONG: '{"ok": true}'})
+        self.assertEqual(run_routes([CHEAP, STRONG], call, validate=json.loads)[1], STRONG)
+        self.assertEqual(route_stats()[CHEAP.key]["failures"], 1)
+        # With nothing valid, the last answer is left for the caller to report
+        call = answering({CHEAP: "not json", STRONG: "still not"})
+        self.assertEqual(run_routes([CHEAP, STRONG], call, validate=json.loads), ("still not", STRONG, None))
+        with self.assertRaises(ValueError):
+            run_routes([CHEAP], answering({CHEAP: ValueError("down")}))
+
+    def test_rejected_answers_are_retracted(self):
+        chunks, rejections = [], []
+
+        def on_reject():
+            rejections.append("".join(chunks))
+            chunks.clear()
+        call = answering({CHEAP: '{"ok": tr', STRONG: '{"ok": true}'})
+        run_routes([CHEAP, STRONG], call, validate=json.loads, on_text=chunks.append, on_reject=on_reject)
+        # The rejected answer streamed as it arrived, and was dropped before the next route streamed
+        self.assertEqual(rejections, ['{"ok": tr'])
+        self.assertEqual("".join(chunks), '{"ok": true}')
+
+    def test_hedges_a_slow_route(self):
+        for _ in range(20):
+            get_route_stats(CHEAP).record("answers", 0.01)
+        chunks = []
+        call = answering({CHEAP: '{"from": "cheap"}', STRONG: '{"from": "strong"}'}, delays={CHEAP: 1.0})
+        start = time.perf_counter()
+        text, route, _ = run_routes([CHEAP, STRONG], call, on_text=chunks.append, hedge=True)
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(route, STRONG)
+        # Only the winner's stream reaches on_text, even once the slow route answers
+        time.sleep(1.1)
+        self.assertEqual("".join(chunks), text)
+        stats = route_stats()
+        self.assertEqual((stats[STRONG.key]["hedges"], stats[STRONG.key]["hedge_wins"]), (1, 1))
+
+    def test_no_hedge_without_enough_measurements(self):
+        calls = []
+        def call(route, on_text):
+            calls.append(route)
+            on_text("{}")
+            return "{}"
+        self.assertEqual(run_routes([CHEAP, STRONG], call, hedge=True), ("{}", CHEAP, None))
+        self.assertEqual(calls, [CHEAP])
+        self.assertIsNotNone(route_stats()[CHEAP.key]["p50_s"])
+
+    def test_route_configuration(self):
+        routes = parse_agent_routes('{"orchestrator": ["deepseek:deepseek-chat", "claude:claude-3-haiku"]}')
+        self.assertEqual(routes["orchestrator"], [Route("deepseek", "deepseek-chat"), Route("claude", "claude-3-haiku")])
+        self.assertEqual(parse_agent_routes(""), {})
+        for spec in ('{"orchestrator": ["deepseek"]}', '{"orchestrator": ["openai:gpt"]}', '{"orchestrator": []}'):
+            with self.assertRaises(ValueError):
+                parse_agent_routes(spec)
+
+class TestAgentRoutes(unittest.TestCase):
+    def test_agent_escalates_to_the_next_model(self):
+        import main
+
+        reset_route_stats()
+        def respond(request):
+            return '{"plan": []}' if request["model"] == "strong" else "Voici le plan : ..."
+        agent = main.Agent("routed", "template", routes=[CHEAP, STRONG], validate=json.loads)
+        try:
+            with MockAPIServer(respond=respond) as server, patch.object(main, "DEEPSEEK_API_URL", server.url), \
+                    patch.object(main, "response_cache", None):
+                self.assertEqual(agent.run("data"), '{"plan": []}')
+        finally:
+            set_transport(None)
+        with self.assertRaises(main.LearnEverythingError):
+            main.Agent("routed", "template", routes=[CHEAP]).run("data", images=[{"type": "image/png", "data": ""}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+import unittest
+import tempfile
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from manifest import RunManifest
+from scheduler import Stage, publish, run_stages
+
+class TestScheduler(unittest.TestCase):
+    def test_outputs_follow_dependencies(self):
+        stages = [
+            Stage("double", lambda inputs: inputs["value"] * 2, deps=["value"]),
+            Stage("square", lambda inputs: inputs["value"] ** 2, deps=["value"]),
+            Stage("total", lambda inputs: inputs["double"] + inputs["square"], deps=["double", "square"]),
+        ]
+        results = run_stages(stages, {"value": 3})
+        self.assertEqual(results["total"], 15)
+
+    def test_independent_stages_run_concurrently(self):
+        # Both stages must be in flight at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_for_sibling(inputs):
+            barrier.wait()
+            return True
+
+        stages = [
+            Stage("left", wait_for_sibling, deps=["raw"]),
+            Stage("right", wait_for_sibling, deps=["raw"]),
+        ]
+        results = run_stages(stages, {"raw": None})
+        self.assertTrue(results["left"] and results["right"])
+
+    def test_failure_stops_downstream_stages(self):
+        calls = []
+
+        def fail(inputs):
+            raise RuntimeError("boom")
+
+        def downstream(inputs):
+            calls.append("downstream")
+
+        stages = [
+            Stage("fail", fail),
+            Stage("downstream", downstream, deps=["fail"]),
+        ]
+        with self.assertRaises(RuntimeError):
+            run_stages(stages)
+        self.assertEqual(calls, [])
+
+    def test_cycle_is_rejected(self):
+        stages = [
+            Stage("a", lambda inputs: None, deps=["b"]),
+            Stage("b", lambda inputs: None, deps=["a"]),
+        ]
+        with self.assertRaises(ValueError):
+            run_stages(stages)
+
+    def test_parallel_wall_time(self):
+        def slow(inputs):
+            time.sleep(0.2)
+
+        stages = [Stage(f"stage{i}", slow) for i in range(4)]
+        start = time.time()
+        run_stages(stages)
+        self.assertLess(time.time() - start, 0.6)
+
+class TestPublishedFields(unittest.TestCase):
+    def test_published_field_starts_dependents_early(self):
+        consumed = threading.Event()
+
+        def producer(inputs):
+            publish("head", inputs["raw"][0])
+            # Only finishes once the dependent stage has already used the field
+            self.assertTrue(consumed.wait(5))
+            return inputs["raw"]
+
+        def consumer(inputs):
+            consumed.set()
+            return inputs["producer.head"] * 10
+
+        stages = [
+            Stage("producer", producer, deps=["raw"], fields={"head": lambda output: output[0]}),
+            Stage("consumer", consumer, deps=["producer.head"]),
+        ]
+        results = run_stages(stages, {"raw": [4, 5]})
+        self.assertEqual(results["consumer"], 40)
+        self.assertEqual(results["producer"], [4, 5])
+
+    def test_changed_field_restarts_its_dependents(self):
+        consumed = threading.Event()
+        calls = []
+
+        def producer(inputs):
+            # e.g. a field of a streamed answer that is then rejected, and replaced by another answer
+            publish("head", 1)
+            self.assertTrue(consumed.wait(5))
+            return [2]
+
+        def consumer(inputs):
+            calls.append(inputs["producer.head"])
+            consumed.set()
+            return inputs["producer.head"] * 10
+
+        stages = [
+            Stage("producer", producer, fields={"head": lambda output: output[0]}),
+            Stage("consumer", consumer, deps=["producer.head"]),
+            Stage("final", lambda inputs: inputs["consumer"] + 1, deps=["consumer"]),
+        ]
+        results = run_stages(stages)
+        self.assertEqual((results["producer.head"], results["consumer"], results["final"]), (2, 20, 21))
+        self.assertEqual(calls, [1, 2])
+
+    def test_unpublished_field_is_derived_from_output(self):
+        stages = [
+            Stage("producer", lambda inputs: [7, 8], fields={"head": lambda output: output[0]}),
+            Stage("consumer", lambda inputs: inputs["producer.head"], deps=["producer.head"]),
+        ]
+        self.assertEqual(run_stages(stages)["consumer"], 7)
+
+    def test_unknown_field_is_rejected(self):
+        stages = [
+            Stage("producer", lambda inputs: None),
+            Stage("consumer", lambda inputs: None, deps=["producer.missing"]),
+        ]
+        with self.assertRaises(ValueError):
+            run_stages(stages)
+
+    def test_reused_stage_provides_its_fields(self):
+        calls = []
+
+        def make_stages():
+            def producer(inputs):
+                calls.append("producer")
+                return inputs["raw"]
+            return [
+                Stage("producer", producer, deps=["raw"], fields={"head": lambda output: output[0]}),
+                Stage("consumer", lambda inputs: inputs["producer.head"], deps=["producer.head"]),
+            ]
+
+        manifest = RunManifest()
+        run_stages(make_stages(), {"raw": [1, 2]}, manifest=manifest)
+        results = run_stages(make_stages(), {"raw": [1, 2]}, manifest=manifest)
+        self.assertEqual(calls, ["producer"])
+        self.assertEqual(results["consumer"], 1)
+
+class TestIncrementalRuns(unittest.TestCase):
+    def make_stages(self, calls):
+        def track(name, func):
+            def run(inputs):
+                calls.append(name)
+                return func(inputs)
+            return run
+
+        return [
+            Stage("left", track("left", lambda inputs: inputs["raw"]["a"] * 2), deps=["raw"]),
+            Stage("right", track("right", lambda inputs: len(inputs["raw"])), deps=["raw"]),
+            Stage("sum", track("sum", lambda inputs: inputs["left"] + inputs["right"]), deps=["left", "right"]),
+        ]
+
+    def test_unchanged_run_reuses_every_stage(self):
+        calls = []
+        manifest = RunManifest()
+        run_stages(self.make_stages(calls), {"raw": {"a": 1, "b": 2}}, manifest=manifest)
+        self.assertEqual(sorted(calls), ["left", "right", "sum"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "run.manifest.json")
+            manifest.save(path)
+            calls.clear()
+            results = run_stages(self.make_stages(calls), {"raw": {"a": 1, "b": 2}}, manifest=RunManifest.load(path))
+        self.assertEqual(calls, [])
+        self.assertEqual(results["sum"], 4)
+
+    def test_only_affected_stages_rerun(self):
+        calls = []
+        manifest = RunManifest()
+        run_stages(self.make_stages(calls), {"raw": {"a": 1, "b": 2}}, manifest=manifest)
+        calls.clear()
+        # "right" only depends on the key count, so its output and "sum" input stay stable
+        results = run_stages(self.make_stages(calls), {"raw": {"a": 1, "b": 3}}, manifest=manifest)
+        self.assertEqual(sorted(calls), ["left", "right"])
+        self.assertEqual(results["sum"], 4)
+
+    def test_version_change_invalidates_stage(self):
+        calls = []
+        manifest = RunManifest()
+        stages = [Stage("only", lambda inputs: calls.append("only"), deps=["raw"], version="v1")]
+        run_stages(stages, {"raw": 1}, manifest=manifest)
+        stages = [Stage("only", lambda inputs: calls.append("only"), deps=["raw"], version="v2")]
+        run_stages(stages, {"raw": 1}, manifest=manifest)
+        self.assertEqual(calls, ["only", "only"])
+
+    def test_stages_running_when_another_fails_are_kept(self):
+        calls = []
+        started = threading.Event()
+
+        def slow(inputs):
+            calls.append("slow")
+            started.set()
+            time.sleep(0.05)
+            return 1
+
+        def fail(inputs):
+            started.wait(5)
+            raise RuntimeError("boom")
+
+        manifest = RunManifest()
+        with self.assertRaises(RuntimeError):
+            run_stages([Stage("slow", slow, deps=["raw"]), Stage("fail", fail, deps=["raw"])], {"raw": 1},
+                       manifest=manifest)
+        self.assertIn("slow", manifest.stages)
+        # The next run only repeats the stage that failed
+        results = run_stages([Stage("slow", slow, deps=["raw"]), Stage("fail", lambda inputs: 2, deps=["raw"])],
+                             {"raw": 1}, manifest=manifest)
+        self.assertEqual(calls, ["slow"])
+        self.assertEqual(results["fail"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import json
+import threading
+import sys
+import os
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from rate_limit import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from scheduler import Stage, run_stages
+from service import JobService, ServiceBusyError, ServiceServer
+
+def fake_pipeline(raw_data, max_iterations=3, priority=None):
+    # Two stages, so that progress goes through the scheduler's stage listener
+    data = json.loads(raw_data)
+    if data.get("fail"):
+        raise ValueError("bad input")
+    outputs = run_stages([Stage("analyse", lambda inputs: len(inputs["raw_data"]), deps=["raw_data"]),
+                          Stage("design", lambda inputs: {"size": inputs["analyse"]}, deps=["analyse"])],
+                         {"raw_data": raw_data})
+    return {"graph_design": outputs["design"], "priority": priority}
+
+class TestJobService(unittest.TestCase):
+    def start(self, run=fake_pipeline, **kwargs):
+        service = JobService(run=run, **kwargs)
+        self.addCleanup(service.close)
+        return service
+
+    def blocked(self):
+        # A pipeline that waits for `release`, and records the order in which jobs started
+        release, started = threading.Event(), []
+
+        def run(raw_data, max_iterations=3, priority=None):
+            started.append(json.loads(raw_data)["name"])
+            release.wait(5)
+            return {}
+        return run, release, started
+
+    def test_priority_order(self):
+        run, release, started = self.blocked()
+        service = self.start(run, workers=1)
+        first = service.submit('{"name": "first"}')
+        jobs = [service.submit('{"name": "batch"}', PRIORITY_BATCH),
+                service.submit('{"name": "interactive"}', PRIORITY_INTERACTIVE)]
+        release.set()
+        for job in [first] + jobs:
+            job.wait_events(0, 5)
+            while not job.done:
+                job.wait_events(len(job.events), 5)
+        self.assertEqual(started, ["first", "interactive", "batch"])
+
+    def test_backpressure_and_cancel(self):
+        run, release, _ = self.blocked()
+        service = self.start(run, workers=1, max_queued=1)
+        running = service.submit('{"name": "running"}')
+        # Event 2 is the job starting
+        running.wait_events(1, 5)
+        waiting = service.submit('{"name": "waiting"}')
+        with self.assertRaises(ServiceBusyError):
+            service.submit('{"name": "refused"}')
+        self.assertTrue(service.cancel(waiting.job_id))
+        self.assertEqual(waiting.status, "cancelled")
+        service.submit('{"name": "accepted"}')
+        release.set()
+
+class TestServiceHTTP(unittest.TestCase):
+    def setUp(self):
+        self.service = JobService(workers=2, run=fake_pipeline)
+        self.server = ServiceServer(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.service.close)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, path):
+        return self.server.url + path
+
+    def test_submit_progress_and_result(self):
+        response = requests.post(self.url("/jobs"), json={"data": {"nodes": []}, "priority": "batch"})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+        self.assertEqual(response.headers["Location"], f"/jobs/{job_id}")
+
+        # The event stream ends once the job is finished
+        with requests.get(self.url(f"/jobs/{job_id}/events"), stream=True, timeout=10) as stream:
+            events = [json.loads(line[len(b"data: "):]) for line in stream.iter_lines()
+                      if line.startswith(b"data: ")]
+        stages = [(event["stage"], event["status"]) for event in events if event["event"] == "stage"]
+        self.assertIn(("analyse", "done"), stages)
+        self.assertLess(stages.index(("analyse", "done")), stages.index(("design", "running")))
+        self.assertEqual(events[-1], dict(events[-1], event="job", status="done"))
+        self.assertEqual([event["seq"] for event in events], list(range(1, len(events) + 1)))
+
+        status = requests.get(self.url(f"/jobs/{job_id}")).json()
+        self.assertEqual(status["stages"], {"analyse": "done", "design": "done"})
+        result = requests.get(self.url(f"/jobs/{job_id}/result")).json()
+        self.assertEqual(result["graph_design"], {"size": len('{"nodes": []}')})
+        self.assertEqual(result["priority"], PRIORITY_BATCH)
+
+        # Reconnecting after the last event only returns the end of the stream
+        with requests.get(self.url(f"/jobs/{job_id}/events"), headers={"Last-Event-ID": str(len(events))},
+                          stream=True, timeout=10) as stream:
+            self.assertEqual([line for line in stream.iter_lines() if line.startswith(b"data: ")], [])
+
+    def test_errors(self):
+        self.assertEqual(requests.post(self.url("/jobs"), json={"priority": "batch"}).status_code, 400)
+        self.assertEqual(requests.post(self.url("/jobs"), json={"data": {}, "priority": "urgent"}).status_code, 400)
+        self.assertEqual(requests.get(self.url("/jobs/abc123")).status_code, 404)
+        job_id = requests.post(self.url("/jobs"), json={"data": {"fail": True}}).json()["id"]
+        job = self.service.get(job_id)
+        while not job.done:
+            job.wait_events(len(job.events), 5)
+        response = requests.get(self.url(f"/jobs/{job_id}/result"))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["error"], "bad input")
+        self.assertEqual(requests.get(self.url("/health")).json()["workers"], 2)
+        # A malformed event cursor is refused; the server keeps answering
+        self.assertEqual(requests.get(self.url(f"/jobs/{job_id}/events"), headers={"Last-Event-ID": "abc"},
+                                      timeout=10).status_code, 400)
+        self.assertEqual(requests.get(self.url(f"/jobs/{job_id}/events?after=-1"), timeout=10).status_code, 400)
+        self.assertEqual(requests.get(self.url(f"/jobs/{job_id}")).status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import json
+import random
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from http_client import HttpTransport, set_transport
+from mock_api_server import MockAPIServer
+from streaming import IncrementalJSONParser, StreamError, claude_deltas, deepseek_deltas, iter_sse_data
+
+DOCUMENT = {
+    "nœuds": [{"id": "a", "label": "Début {\"x\"}"}, {"id": "b", "label": "fin]\\"}],
+    "arêtes": [{"source": "a", "target": "b"}],
+    "style": {"couleurs": ["#fff", "#000"], "vide": {}},
+    "total": 2,
+    "actif": True,
+}
+
+def split_randomly(text, rng):
+    pieces, start = [], 0
+    while start < len(text):
+        size = rng.randint(1, 7)
+        pieces.append(text[start:start + size])
+        start += size
+    return pieces
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def test_fields_survive_any_chunking(self):
+        text = "```json\n" + json.dumps(DOCUMENT, ensure_ascii=False, indent=2) + "\n```"
+        rng = random.Random(0)
+        for _ in range(50):
+            parser = IncrementalJSONParser()
+            fields = []
+            for piece in split_randomly(text, rng):
+                fields.extend(parser.feed(piece))
+            self.assertEqual(dict(fields), DOCUMENT)
+            self.assertEqual([key for key, _ in fields], list(DOCUMENT))
+            self.assertTrue(parser.done)
+
+    def test_field_is_returned_once_complete(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"nœuds": [1, 2'), [])
+        self.assertEqual(parser.feed('], "arê'), [("nœuds", [1, 2])])
+        self.assertEqual(parser.feed('tes": []}'), [("arêtes", [])])
+
+    def test_invalid_json_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            IncrementalJSONParser().feed('{"a": nope, "b": 1}')
+
+class TestServerSentEvents(unittest.TestCase):
+    def test_events_until_done(self):
+        lines = ["event: message", 'data: {"a": 1}', "", ": comment", 'data: {"b":', 'data: 2}', "",
+                 "data: [DONE]", "", 'data: {"c": 3}', ""]
+        self.assertEqual(list(iter_sse_data(lines)), ['{"a": 1}', '{"b":\n2}'])
+
+    def test_provider_deltas(self):
+        deepseek = ['{"choices": [{"delta": {"role": "assistant"}}]}', '{"choices": [{"delta": {"content": "ab"}}]}']
+        claude = ['{"type": "message_start"}', '{"type": "content_block_delta", "delta": {"text": "cd"}}']
+        self.assertEqual(list(deepseek_deltas(deepseek)), ["ab"])
+        self.assertEqual(list(claude_deltas(claude)), ["cd"])
+        with self.assertRaises(StreamError):
+            list(claude_deltas(['{"type": "error", "error": {"type": "overloaded_error"}}']))
+
+class TestStreamingAgent(unittest.TestCase):
+    def setUp(self):
+        import main
+        self.main = main
+        self.transport = HttpTransport()
+        set_transport(self.transport)
+
+    def tearDown(self):
+        self.transport.close()
+        set_transport(None)
+
+    def test_agent_hands_fields_over_while_streaming(self):
+        content = json.dumps(DOCUMENT, ensure_ascii=False)
+        fields = []
+        with MockAPIServer(content=content, stream_chunk_size=5) as server:
+            with patch.object(self.main, "DEEPSEEK_API_URL", server.url), patch.object(self.main, "API_STREAM", True), \
+                    patch.object(self.main, "response_cache", None):
+                agent = self.main.Agent("test", "template")
+                text = agent.run("data", on_field=lambda key, value: fields.append(key))
+        self.assertEqual(json.loads(text), DOCUMENT)
+        self.assertEqual(fields, list(DOCUMENT))
+
+    def test_design_elements_are_published_before_the_answer_is_complete(self):
+        from routing import Route
+        from scheduler import Stage, run_stages
+
+        design = {"nœuds": [{"id": "a"}, {"id": "b"}], "arêtes": [{"source": "a", "target": "b"}],
+                  "style": {"notes": "x" * 400}}
+        designer = self.main.Agent("graph_designer", "template", routes=[Route("deepseek", "model")],
+                                   validate=self.main.output_validator("graph_designer"))
+        finished = []
+
+        def run_designer(inputs):
+            output = self.main.run_graph_designer(inputs)
+            finished.append(True)
+            return output
+
+        stages = [
+            Stage("graph_designer", run_designer, deps=["data_analyzer"],
+                  fields={"elements": self.main.design_elements}),
+            # Layout starts from the nodes and edges while the rest of the design streams in
+            Stage("layout", lambda inputs: (inputs["graph_designer.elements"], bool(finished)),
+                  deps=["graph_designer.elements"]),
+        ]
+        content = json.dumps(design, ensure_ascii=False)
+        with MockAPIServer(content=content, stream_chunk_size=8, stream_delay=0.005) as server:
+            with patch.object(self.main, "DEEPSEEK_API_URL", server.url), patch.object(self.main, "API_STREAM", True), \
+                    patch.object(self.main, "response_cache", None), \
+                    patch.dict(self.main.agents, {"graph_designer": designer}):
+                results = run_stages(stages, {"data_analyzer": {"éléments_clés": ["a", "b"], "relations": []}})
+        self.assertEqual(results["layout"], ((["a", "b"], [("a", "b")]), False))
+        self.assertEqual(results["graph_designer"], design)
+
+    def test_claude_stream_and_plain_response_agree(self):
+        with MockAPIServer(content='{"ok": true}') as server:
+            with patch.object(self.main, "CLAUDE_API_URL", server.url):
+                with patch.object(self.main, "API_STREAM", True):
+                    streamed = self.main.call_claude_api([{"role": "user", "content": "x"}])
+                with patch.object(self.main, "API_STREAM", False):
+                    plain = self.main.call_claude_api([{"role": "user", "content": "x"}])
+        self.assertEqual(streamed, plain)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import json
+import tempfile
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from http_client import HttpTransport, set_transport
+from mock_api_server import MockAPIServer
+from rate_limit import ApiGate, TokenBucket
+from scheduler import Stage, run_stages
+from tracing import Tracer, current_span, set_tracer, span
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        set_tracer(self.tracer)
+
+    def tearDown(self):
+        set_tracer(None)
+
+    def spans_by_name(self):
+        return {span.name: span for span in self.tracer.spans}
+
+    def test_stage_spans_nest_under_the_caller(self):
+        stages = [
+            Stage("first", lambda inputs: 1),
+            Stage("second", lambda inputs: inputs["first"] + 1, deps=["first"]),
+        ]
+        with span("pipeline"):
+            run_stages(stages)
+        spans = self.spans_by_name()
+        self.assertEqual(spans["stage:first"].parent, spans["pipeline"].span_id)
+        self.assertEqual(spans["stage:second"].parent, spans["pipeline"].span_id)
+        self.assertIn("queue_ms", spans["stage:second"].attrs)
+        self.assertGreaterEqual(spans["stage:second"].start, spans["stage:first"].start)
+
+    def test_failed_span_records_the_error(self):
+        with self.assertRaises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+        self.assertEqual(self.spans_by_name()["failing"].attrs["error"], "ValueError")
+
+    def test_gate_reports_retries_on_the_current_span(self):
+        responses = iter([FakeResponse(503), FakeResponse(200)])
+        gate = ApiGate("test", TokenBucket(1000), sleep=lambda seconds: None)
+        with span("api:test"):
+            gate.call(lambda: next(responses))
+        attrs = self.spans_by_name()["api:test"].attrs
+        self.assertEqual(attrs["retries"], 1)
+        self.assertIn("rate_wait_ms", attrs)
+
+    def test_exports(self):
+        with span("outer", "pipeline", size=3):
+            with span("inner"):
+                pass
+        with tempfile.TemporaryDirectory() as tmp:
+            chrome_path, jsonl_path = os.path.join(tmp, "trace.json"), os.path.join(tmp, "trace.jsonl")
+            self.tracer.write(chrome_path)
+            self.tracer.write(jsonl_path)
+            with open(chrome_path) as file:
+                events = json.load(file)["traceEvents"]
+            with open(jsonl_path) as file:
+                lines = [json.loads(line) for line in file]
+        complete = [event for event in events if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in complete], ["outer", "inner"])
+        self.assertEqual(complete[0]["args"], {"size": 3})
+        self.assertTrue(any(event["ph"] == "M" for event in events))
+        self.assertEqual(lines[1]["parent"], lines[0]["id"])
+        self.assertEqual(set(self.tracer.summary()), {"outer", "inner"})
+
+    def test_agent_call_records_bytes_and_tokens(self):
+        import main
+
+        transport = HttpTransport()
+        set_transport(transport)
+        try:
+            with MockAPIServer(content='{"a": 1}') as server, \
+                    patch.object(main, "DEEPSEEK_API_URL", server.url), patch.object(main, "response_cache", None):
+                for stream in (True, False):
+                    with patch.object(main, "API_STREAM", stream):
+                        main.Agent("tracing", "template").run("data")
+        finally:
+            set_transport(None)
+        by_id = {span.span_id: span for span in self.tracer.spans}
+        api_spans = [span for span in self.tracer.spans if span.name == "api:deepseek"]
+        self.assertEqual(len(api_spans), 2)
+        for api_span in api_spans:
+            self.assertGreater(api_span.attrs["request_bytes"], 0)
+            self.assertGreater(api_span.attrs["response_bytes"], 0)
+            self.assertGreater(api_span.attrs["input_tokens"], 0)
+            self.assertEqual(api_span.attrs["output_tokens"], 2)
+            self.assertEqual(by_id[api_span.parent].name, "agent:tracing")
+
+class TestTracingOff(unittest.TestCase):
+    def test_spans_are_no_ops(self):
+        set_tracer(None)
+        with span("ignored") as ignored:
+            ignored.set(value=1)
+            current_span().add(retries=1)
+        self.assertEqual(current_span().attrs, {})
+
+if __name__ == '__main__':
+    unittest.main()
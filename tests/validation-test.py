@@ -0,0 +1,93 @@
+import unittest
+import json
+import re
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from cache import ResponseCache
+from http_client import set_transport
+from mock_api_server import MockAPIServer
+from routing import Route, reset_route_stats
+from validation import OutputError, check_schema, parse_output, repair_json
+
+import main
+
+class TestRepair(unittest.TestCase):
+    def test_usual_defects_are_repaired(self):
+        cases = {
+            '```json\n{"a": [1, 2,], "b": {"c": "x"},}\n```': {"a": [1, 2], "b": {"c": "x"}},
+            'Voici le résultat : {"a": "[1,]"} En espérant que cela aide.': {"a": "[1,]"},
+            '{"a": [{"id": 1}, {"id": 2}], "b": [{"id": "tron': {"a": [{"id": 1}, {"id": 2}]},
+            '{"a": 1, "b": {"c": [1, 2, 3': {"a": 1, "b": {"c": [1, 2]}},
+            '{"s": "```"}': {"s": "```"},
+        }
+        for text, expected in cases.items():
+            self.assertEqual(json.loads(repair_json(text)), expected)
+
+    def test_unrepairable_answers_are_reported(self):
+        for text in ("Je ne peux pas répondre.", '{"a": "cut', '{"a": [1}'):
+            with self.assertRaises(OutputError):
+                parse_output(text)
+        self.assertEqual(parse_output('{"a": 1}'), ({"a": 1}, False))
+        self.assertEqual(parse_output('{"a": 1,}'), ({"a": 1}, True))
+
+    def test_schema(self):
+        schema = main.AGENT_SCHEMAS["image_generator"]
+        check_schema({"images": [{"id": 1, "content": "data:", "alt": None}], "notes": "x"}, schema)
+        for value, path in (([], "$"), ({}, "$"), ({"images": [{"id": 1, "content": 2}]}, "$.images[0].content"),
+                            ({"images": [{"content": ""}]}, "$.images[0]")):
+            with self.assertRaisesRegex(OutputError, f"^{re.escape(path)}:"):
+                check_schema(value, schema)
+
+class TestTargetedRetries(unittest.TestCase):
+    def test_only_the_failing_agent_is_asked_again(self):
+        agent = MagicMock(answer=MagicMock(side_effect=[('{"images": [', None), ('{"images": []}', None)]))
+        with patch.dict(main.agents, {"image_generator": agent}), main.answer_attempts(3):
+            self.assertEqual(main.ask_json("image_generator", {"design": 1}), {"images": []})
+        self.assertEqual(agent.answer.call_count, 2)
+        feedback = agent.answer.call_args_list[1].kwargs["feedback"]
+        self.assertEqual(feedback[0], {"role": "assistant", "content": '{"images": ['})
+        self.assertIn("invalid JSON", feedback[1]["content"])
+
+    def test_attempts_follow_max_iterations(self):
+        agent = MagicMock(answer=MagicMock(return_value=('{"plan": "pas de code optimisé"}', None)))
+        with patch.dict(main.agents, {"performance_optimizer": agent}), main.answer_attempts(2):
+            with self.assertRaisesRegex(main.LearnEverythingError, "after 2 attempts.*code_optimisé"):
+                main.ask_json("performance_optimizer", {})
+        self.assertEqual(agent.answer.call_count, 2)
+
+    def test_retry_bypasses_and_replaces_the_cached_answer(self):
+        reset_route_stats()
+        requests = []
+
+        def respond(request):
+            requests.append(request["messages"])
+            return '{"plan": []}' if len(request["messages"]) > 2 else "Je réfléchis..."
+
+        cache = ResponseCache()
+        agent = main.Agent("orchestrator", "template", routes=[Route("deepseek", "model")],
+                           validate=main.output_validator("orchestrator"))
+        try:
+            with MockAPIServer(respond=respond) as server, patch.object(main, "DEEPSEEK_API_URL", server.url), \
+                    patch.object(main, "response_cache", cache), patch.dict(main.agents, {"orchestrator": agent}), \
+                    patch.object(main, "parse_output", wraps=main.parse_output) as parse:
+                fields = []
+                self.assertEqual(main.ask_json("orchestrator", "data", on_field=lambda key, value: fields.append(key)),
+                                 {"plan": []})
+                # The usable answer is only parsed by the agent's validator (the rejected one once more, for the
+                # error sent back), and the rejected one hands no field on
+                self.assertEqual(parse.call_count, 3)
+                self.assertEqual(fields, ["plan"])
+                # The next run is served the usable answer from the cache
+                self.assertEqual(main.ask_json("orchestrator", "data"), {"plan": []})
+        finally:
+            set_transport(None)
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[1][2], {"role": "assistant", "content": "Je réfléchis..."})
+
+if __name__ == '__main__':
+    unittest.main()